@@ -0,0 +1,156 @@
+import json
+import os
+import time
+import zipfile
+
+# Local cache of downloaded binary archives. Archives are named after the commit
+# they were built from and never change, so switching back to a recently synced
+# commit extracts the archive from disk instead of downloading it again. The
+# cache is capped in size and evicts the least recently used archives first.
+#
+# Layout of the cache folder:
+#   <commit id>.zip        complete archives
+#   <commit id>.zip.part   downloads in progress
+#   <commit id>.zip.stream archives written while a streaming pull extracts them
+#   cache_index.json       {name: {size, mtime, etag, last_used}}
+
+INDEX_FILE_NAME = "cache_index.json"
+DEFAULT_MAX_SIZE_GB = 10
+# Interrupted downloads are resumed on the next pull, abandoned ones are removed after a week
+STALE_DOWNLOAD_SECONDS = 7 * 24 * 60 * 60
+
+
+def get_default_cache_dir():
+    base_dir = os.environ.get("LOCALAPPDATA") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "Anchorpoint", "unreal_binary_sync", "archives")
+
+
+def parse_max_size(value):
+    """Returns the cache size in bytes from the GB value stored in the settings"""
+    try:
+        return max(0, int(float(value) * 1024 * 1024 * 1024))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_SIZE_GB * 1024 * 1024 * 1024
+
+
+class ArchiveCache:
+    """
+    Size capped folder of archives with least recently used eviction.
+
+    Args:
+        cache_dir (str): Folder the archives are stored in
+        max_size (int): Maximum size of all archives in bytes, 0 disables the cache
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._index_path = os.path.join(cache_dir, INDEX_FILE_NAME)
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        temp_path = f"{self._index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temp_path, self._index_path)
+
+    def get_path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def get_temp_path(self, name, suffix=".part"):
+        """Returns the path a new archive is downloaded to before it is added with add()"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return f"{self.get_path(name)}{suffix}"
+
+    def get(self, name, etag=None):
+        """
+        Returns the path of a cached archive, or None if it is not cached or fails
+        the integrity check. The archive becomes the most recently used one.
+        """
+        if not self.enabled:
+            return None
+        index = self._read_index()
+        entry = index.get(name)
+        path = self.get_path(name)
+        if not entry:
+            return None
+
+        # A changed size or modification time means the file was touched outside
+        # of the cache, reading the central directory catches truncated files
+        valid = etag is None or entry.get("etag") == etag
+        try:
+            stat = os.stat(path)
+            valid = valid and stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime"]
+            if valid:
+                with zipfile.ZipFile(path, "r"):
+                    pass
+        except (OSError, zipfile.BadZipFile):
+            valid = False
+
+        if not valid:
+            print(f"Removing invalid cached archive {name}")
+            self._remove(index, name)
+            self._write_index(index)
+            return None
+
+        entry["last_used"] = time.time()
+        self._write_index(index)
+        return path
+
+    def add(self, name, temp_path, etag=None):
+        """Moves a downloaded archive into the cache and evicts old archives. Returns the new path"""
+        path = self.get_path(name)
+        os.replace(temp_path, path)
+        stat = os.stat(path)
+        index = self._read_index()
+        index[name] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "etag": etag,
+            "last_used": time.time()
+        }
+        self._evict(index, keep=name)
+        self._write_index(index)
+        return path
+
+    def _remove(self, index, name):
+        index.pop(name, None)
+        try:
+            os.remove(self.get_path(name))
+        except OSError:
+            pass
+
+    def _evict(self, index, keep=None):
+        # Drop entries of archives that were deleted by hand
+        for name in [name for name in index if not os.path.exists(self.get_path(name))]:
+            index.pop(name)
+
+        for file_name in os.listdir(self.cache_dir):
+            path = self.get_path(file_name)
+            if (".part" in file_name or file_name.endswith(".stream")) and time.time() - os.path.getmtime(path) > STALE_DOWNLOAD_SECONDS:
+                print(f"Removing abandoned download {file_name}")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        total_size = sum(entry["size"] for entry in index.values())
+        for name, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if total_size <= self.max_size:
+                break
+            if name == keep:
+                continue
+            print(f"Evicting cached archive {name}")
+            total_size -= entry["size"]
+            self._remove(index, name)
@@ -0,0 +1,489 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+import binaries_scan
+import binary_manifest
+import content_store
+import parallel_unzip
+import parallel_zip
+import remote_zip
+import s3_transfer
+import storage_backends
+import zip_codecs
+
+# Benchmark of the binary sync without Anchorpoint. It generates a synthetic
+# Unreal project with Binaries folders and a deep Content tree, pushes its
+# binaries to a binary location and pulls them into an empty project, using the
+# same modules as the actions. Every phase is measured with its wall time,
+# throughput and the peak of the memory allocated by Python. The S3 phases run
+# against LocalS3Client, a stand-in that keeps the bucket in a local folder, so
+# the numbers show the cost of the code and the disk, not of the network.
+#
+# Usage:
+#   python benchmark.py --binaries-folders 20 --files 40 --backends folder,s3 --json results.json
+
+# Weights and size ranges in bytes of the generated binaries, roughly the mix of
+# an editor build: many small files, some DLLs of a few MB and a few large modules
+SIZE_PROFILES = {
+    "small": [(1.0, 1024, 64 * 1024)],
+    "editor": [(0.6, 1024, 256 * 1024), (0.35, 256 * 1024, 8 * 1024 * 1024),
+               (0.05, 8 * 1024 * 1024, 64 * 1024 * 1024)],
+    "large": [(0.5, 1024 * 1024, 16 * 1024 * 1024), (0.5, 16 * 1024 * 1024, 128 * 1024 * 1024)],
+}
+BINARY_EXTENSIONS = [".dll", ".dll", ".dll", ".modules", ".target", ".exe", ".pdb"]
+
+
+class LocalS3Error(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class _LocalS3Exceptions:
+    ClientError = LocalS3Error
+
+
+class LocalS3Client:
+    """
+    Subset of the boto3 S3 client used by the binary sync, storing the objects of
+    one bucket in a local folder. Multipart uploads and ETags behave like S3.
+    """
+
+    exceptions = _LocalS3Exceptions
+
+    def __init__(self, root):
+        self.root = root
+        self.requests = 0
+        self._etags = {}
+        self._metadata = {}
+        self._uploads = {}
+        self._upload_metadata = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def _store(self, key, data, etag, metadata=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            self._etags[key] = etag
+            self._metadata[key] = metadata or {}
+
+    def put_object(self, Bucket, Key, Body):
+        self._count()
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        etag = hashlib.md5(data).hexdigest()
+        self._store(Key, data, etag)
+        return {"ETag": f'"{etag}"'}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, "rb") as f:
+            self.put_object(Bucket, Key, f.read())
+
+    def head_object(self, Bucket, Key):
+        self._count()
+        path = self._path(Key)
+        if not os.path.isfile(path):
+            raise LocalS3Error("404")
+        return {"ContentLength": os.path.getsize(path), "ETag": f'"{self._etags[Key]}"',
+                "Metadata": self._metadata[Key]}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        head = self.head_object(Bucket, Key)
+        if IfMatch and IfMatch != head["ETag"]:
+            raise LocalS3Error("PreconditionFailed")
+        f = open(self._path(Key), "rb")
+        if Range:
+            start, end = (int(value) for value in Range[len("bytes="):].split("-"))
+            f.seek(start)
+            data = f.read(end - start + 1)
+            f.close()
+            return {"Body": _LocalBody(data)}
+        return {"Body": _LocalBody(f)}
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None):
+        self._count()
+        with self._lock:
+            upload_id = str(len(self._uploads) + 1)
+            self._uploads[upload_id] = {}
+            self._upload_metadata[upload_id] = Metadata
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._count()
+        data = bytes(Body)
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._count()
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+            metadata = self._upload_metadata.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        etag = s3_transfer.get_multipart_etag(
+            [hashlib.md5(parts[number]).digest() for number in numbers])
+        self._store(Key, b"".join(parts[number] for number in numbers), etag, metadata)
+        return {"ETag": f'"{etag}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._count()
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+
+    def get_paginator(self, name):
+        return _LocalPaginator(self, name)
+
+
+class _LocalBody:
+    def __init__(self, source):
+        self._file = source if hasattr(source, "read") else None
+        self._data = None if self._file else source
+        self._position = 0
+
+    def read(self, size=None):
+        if self._file:
+            return self._file.read(-1 if size is None else size)
+        end = len(self._data) if size is None or size < 0 else self._position + size
+        chunk = self._data[self._position:end]
+        self._position += len(chunk)
+        return chunk
+
+    def iter_chunks(self, chunk_size):
+        while chunk := self.read(chunk_size):
+            yield chunk
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class _LocalPaginator:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def paginate(self, Bucket, Prefix="", Key=None, UploadId=None):
+        self._client._count()
+        if self._name == "list_parts":
+            parts = self._client._uploads.get(UploadId, {})
+            yield {"Parts": [{"PartNumber": number, "ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+                             for number, data in parts.items()]}
+            return
+        with self._client._lock:
+            keys = sorted(key for key in self._client._etags if key.startswith(Prefix))
+        yield {"Contents": [{"Key": key} for key in keys]}
+
+
+class PhaseResult:
+    def __init__(self, backend, name, seconds, num_bytes, files, peak_memory, details=""):
+        self.backend = backend
+        self.name = name
+        self.seconds = seconds
+        self.bytes = num_bytes
+        self.files = files
+        self.peak_memory = peak_memory
+        self.details = details
+
+    def throughput(self):
+        """Returns the processed data in MB per second"""
+        if not self.seconds:
+            return 0.0
+        return self.bytes / (1024 * 1024) / self.seconds
+
+    def to_dict(self):
+        return {
+            "backend": self.backend, "phase": self.name, "seconds": round(self.seconds, 4),
+            "bytes": self.bytes, "files": self.files, "mb_per_second": round(self.throughput(), 2),
+            "peak_memory": self.peak_memory, "details": self.details
+        }
+
+
+class Benchmark:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, backend, name, function, num_bytes=0, files=0):
+        """Run a phase and record its duration and the peak memory allocated by Python"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_time = time.perf_counter()
+        details = function()
+        seconds = time.perf_counter() - start_time
+        peak_memory = tracemalloc.get_traced_memory()[1] - start_memory if self.trace_memory else None
+        result = PhaseResult(backend, name, seconds, num_bytes, files, peak_memory, details or "")
+        self.results.append(result)
+        memory = f"{peak_memory / (1024 * 1024):8.1f} MB" if peak_memory is not None else "       -"
+        print(f"{backend:8} {name:22} {seconds:8.2f}s {result.throughput():9.1f} MB/s "
+              f"{memory} {result.details}")
+        return result
+
+
+def pick_size(rng, profile):
+    weights = [weight for weight, _, _ in profile]
+    _, low, high = rng.choices(profile, weights)[0]
+    # Log uniform, so small sizes within a range are as likely as large ones
+    return int(low * (high / low) ** rng.random())
+
+
+def write_binary(path, size, rng):
+    """Write data that compresses like machine code: random blocks mixed with repeated ones"""
+    block = rng.randbytes(64 * 1024)
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            length = min(64 * 1024, size - written)
+            if rng.random() < 0.5:
+                f.write(block[:length])
+            else:
+                f.write(rng.randbytes(length // 4) * 4 + rng.randbytes(length % 4))
+            written += length
+
+
+def generate_project(root, binaries_folders, files_per_folder, size_profile, content_depth,
+                     content_breadth, seed=0):
+    """
+    Generate a synthetic Unreal project.
+
+    Args:
+        root (str): Folder of the project, created if missing
+        binaries_folders (int): Number of Binaries folders, the first one belongs to the
+            project, all others to plugins
+        files_per_folder (int): Number of files in every Binaries folder
+        size_profile (str): Key of SIZE_PROFILES
+        content_depth (int): Depth of the Content tree
+        content_breadth (int): Number of subfolders of every Content folder
+
+    Returns:
+        tuple: (files, bytes) of the generated binaries
+    """
+    rng = random.Random(seed)
+    profile = SIZE_PROFILES[size_profile]
+    with open(os.path.join(root, "Benchmark.uproject"), "w") as f:
+        json.dump({"FileVersion": 3, "Modules": [{"Name": "Benchmark"}]}, f)
+
+    total_files = 0
+    total_bytes = 0
+    for index in range(binaries_folders):
+        base = root if index == 0 else os.path.join(root, "Plugins", f"Plugin{index:03d}")
+        binaries_dir = os.path.join(base, "Binaries", "Win64")
+        os.makedirs(binaries_dir, exist_ok=True)
+        for file_index in range(files_per_folder):
+            size = pick_size(rng, profile)
+            extension = rng.choice(BINARY_EXTENSIONS)
+            write_binary(os.path.join(binaries_dir, f"UnrealEditor-Module{file_index:04d}{extension}"),
+                         size, rng)
+            total_files += 1
+            total_bytes += size
+        # Plugins come with content and intermediate files that the scan has to skip
+        os.makedirs(os.path.join(base, "Intermediate", "Build"), exist_ok=True)
+        os.makedirs(os.path.join(base, "Source", "Private"), exist_ok=True)
+
+    # Deep Content tree of small assets, which is never searched for binaries
+    pending = [(os.path.join(root, "Content"), 0)]
+    while pending:
+        folder, depth = pending.pop()
+        os.makedirs(folder, exist_ok=True)
+        for asset_index in range(3):
+            with open(os.path.join(folder, f"Asset{asset_index}.uasset"), "wb") as f:
+                f.write(b"\0" * 128)
+        if depth < content_depth:
+            pending.extend((os.path.join(folder, f"Folder{child}"), depth + 1)
+                           for child in range(content_breadth))
+
+    # Date the folders back, the scan does not cache folders that were modified just now
+    past = time.time() - 60
+    for folder, _, _ in os.walk(root):
+        os.utime(folder, (past, past))
+    return total_files, total_bytes
+
+
+def get_pushed_files(project_dir):
+    _, files = binaries_scan.scan_binaries(project_dir, use_cache=False)
+    return [os.path.join(project_dir, file_path) for file_path in files
+            if os.path.splitext(file_path)[1].lower() not in (".pdb", ".exp")]
+
+
+def run_zip_phases(benchmark, backend_name, backend, project_dir, work_dir, files, total_bytes, policy):
+    pull_dir = os.path.join(work_dir, f"pull-{backend_name}")
+    zip_name = "benchmark.zip"
+    local_zip = os.path.join(work_dir, f"{backend_name}-{zip_name}")
+    arc_files = [(path, os.path.relpath(path, project_dir)) for path in files]
+
+    def compress():
+        with zipfile.ZipFile(local_zip, "w") as zip_file:
+            return str(parallel_zip.write_files(zip_file, arc_files, policy))
+
+    benchmark.measure(backend_name, "compress", compress, total_bytes, len(files))
+    zip_size = os.path.getsize(local_zip)
+    def upload():
+        backend.upload_file(zip_name, local_zip)
+
+    benchmark.measure(backend_name, "upload", upload, zip_size)
+
+    if isinstance(backend, storage_backends.S3Backend):
+        def stream_upload():
+            writer = s3_transfer.S3MultipartWriter(
+                backend.s3_client, backend.bucket_name, "streamed.zip",
+                backend.workers, backend.part_size)
+            with zipfile.ZipFile(writer, "w") as zip_file:
+                parallel_zip.write_files(zip_file, arc_files, policy)
+            writer.close()
+
+        benchmark.measure(backend_name, "compress+upload", stream_upload, total_bytes, len(files))
+
+    downloaded_zip = os.path.join(work_dir, f"{backend_name}-downloaded.zip")
+
+    def download():
+        backend.download_file(zip_name, downloaded_zip)
+
+    benchmark.measure(backend_name, "download", download, zip_size)
+
+    def extract():
+        parallel_unzip.extract_members(downloaded_zip, pull_dir)
+
+    benchmark.measure(backend_name, "extract", extract, total_bytes, len(files))
+
+    def compare():
+        with zipfile.ZipFile(downloaded_zip) as zip_file:
+            infos = zip_file.infolist()
+        _, manifest_entries = binary_manifest.read_manifest(pull_dir)
+        to_extract, _, entries = binary_manifest.compute_delta(infos, manifest_entries, pull_dir)
+        binary_manifest.write_manifest(pull_dir, zip_name, entries)
+        return f"{len(to_extract)} of {len(entries)} files differ"
+
+    benchmark.measure(backend_name, "compare (first)", compare, total_bytes, len(files))
+    benchmark.measure(backend_name, "compare (no change)", compare, 0, len(files))
+
+    if isinstance(backend, storage_backends.S3Backend):
+        stream_dir = os.path.join(work_dir, f"pull-{backend_name}-streamed")
+
+        def stream_extract():
+            remote_archive = remote_zip.RemoteZip(
+                backend.s3_client, backend.bucket_name, zip_name)
+            remote_archive.extract_members(stream_dir, None, backend.workers, backend.part_size)
+
+        benchmark.measure(backend_name, "download+extract", stream_extract, total_bytes, len(files))
+
+
+def run_content_store_phases(benchmark, backend_name, backend, project_dir, work_dir, files, total_bytes):
+    pull_dir = os.path.join(work_dir, f"pull-{backend_name}-store")
+
+    def push():
+        uploaded, reused = content_store.push_files(backend, "benchmark", files, project_dir)
+        return f"{uploaded} uploaded, {reused} reused"
+
+    benchmark.measure(backend_name, "store push", push, total_bytes, len(files))
+    benchmark.measure(backend_name, "store push (again)", push, total_bytes, len(files))
+
+    def pull():
+        manifest = content_store.get_manifest(backend, "benchmark")
+        content_store.pull_files(backend, manifest, list(manifest["files"]), pull_dir)
+
+    benchmark.measure(backend_name, "store pull", pull, total_bytes, len(files))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Unreal binary sync")
+    parser.add_argument("--work-dir", help="Folder for the generated data, a temporary folder by default")
+    parser.add_argument("--binaries-folders", type=int, default=10)
+    parser.add_argument("--files", type=int, default=30, help="Files per Binaries folder")
+    parser.add_argument("--size-profile", choices=sorted(SIZE_PROFILES), default="editor")
+    parser.add_argument("--content-depth", type=int, default=4)
+    parser.add_argument("--content-breadth", type=int, default=4)
+    parser.add_argument("--backends", default="folder,s3", help="Comma separated: folder, s3")
+    parser.add_argument("--codec", choices=sorted(zip_codecs.CODECS), default="deflate")
+    parser.add_argument("--level", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=s3_transfer.DEFAULT_WORKERS)
+    parser.add_argument("--part-size-mb", type=int, default=s3_transfer.DEFAULT_PART_SIZE_MB)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Do not trace memory, which slows down Python code")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the generated data")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="binary_sync_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    project_dir = os.path.join(work_dir, "project")
+    os.makedirs(project_dir, exist_ok=True)
+
+    print(f"Generating project in {project_dir}...")
+    total_files, total_bytes = generate_project(
+        project_dir, args.binaries_folders, args.files, args.size_profile,
+        args.content_depth, args.content_breadth, args.seed)
+    print(f"Generated {total_files} binaries with {total_bytes / (1024 * 1024):.1f} MB")
+
+    benchmark = Benchmark(trace_memory=not args.no_memory)
+    if benchmark.trace_memory:
+        tracemalloc.start()
+
+    def scan(use_cache):
+        def run():
+            binaries_dirs, files = binaries_scan.scan_binaries(project_dir, use_cache)
+            return f"{len(binaries_dirs)} Binaries folders, {len(files)} files"
+        return run
+
+    # The first run fills the scan cache, the second one reuses it
+    benchmark.measure("local", "scan (uncached)", scan(False))
+    benchmark.measure("local", "scan (cold cache)", scan(True))
+    benchmark.measure("local", "scan (warm cache)", scan(True))
+    files = get_pushed_files(project_dir)
+    pushed_bytes = sum(os.path.getsize(path) for path in files)
+    policy = parallel_zip.CompressionPolicy(args.codec, args.level)
+    part_size = max(s3_transfer.MIN_PART_SIZE, args.part_size_mb * 1024 * 1024)
+
+    for backend_name in [name.strip() for name in args.backends.split(",") if name.strip()]:
+        if backend_name == "folder":
+            backend = storage_backends.FolderBackend(os.path.join(work_dir, "shared-folder"))
+        elif backend_name == "s3":
+            backend = storage_backends.S3Backend(
+                LocalS3Client(os.path.join(work_dir, "bucket")), "benchmark",
+                args.workers, part_size)
+        else:
+            parser.error(f"Unknown backend {backend_name}")
+        run_zip_phases(benchmark, backend_name, backend, project_dir, work_dir,
+                       files, pushed_bytes, policy)
+        run_content_store_phases(benchmark, backend_name, backend, project_dir, work_dir,
+                                 files, pushed_bytes)
+        if backend_name == "s3":
+            print(f"S3 requests: {backend.s3_client.requests}")
+
+    if benchmark.trace_memory:
+        tracemalloc.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "project": {"files": total_files, "bytes": total_bytes,
+                            "binaries_folders": args.binaries_folders,
+                            "size_profile": args.size_profile, "codec": args.codec},
+                "phases": [result.to_dict() for result in benchmark.results]
+            }, f, indent=1)
+        print(f"Results written to {args.json}")
+
+    if not args.keep and not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
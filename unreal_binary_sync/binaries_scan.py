@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+# Discovery of the Binaries folders of a project and the files inside of them.
+# The traversal never descends into folders that cannot contain binaries we push,
+# like Content or DerivedDataCache. The listing of every visited folder is cached
+# with the modification time of the folder, which changes whenever an entry is
+# added, removed or renamed in it. On the next push a folder with an unchanged
+# modification time is not listed again, only stat'ed.
+
+EXCLUDED_FOLDERS = {"Content", "Intermediate", "Saved",
+                    "DerivedDataCache", "Source", "Config", ".git"}
+BINARIES_FOLDER = "Binaries"
+CACHE_VERSION = 1
+# Folders modified this recently are not cached, as a change within the same
+# timestamp resolution would go unnoticed
+RACY_SECONDS = 2
+
+
+def get_cache_path(project_dir):
+    return os.path.join(project_dir, "Intermediate", "AnchorpointBinarySync", "binaries_scan.json")
+
+
+class BinariesScanner:
+    """
+    Lists Binaries folders and their files, reusing the listings of folders that did not change.
+
+    Args:
+        project_dir (str): Root of the Unreal project
+        cache_path (str): File the listings are stored in, None to not persist them
+    """
+
+    def __init__(self, project_dir, cache_path=None):
+        self.project_dir = os.fspath(project_dir)
+        self.cache_path = cache_path
+        self.listed_dirs = 0
+        self.reused_dirs = 0
+        self._cache = {}
+        self._entries = {}
+        if cache_path:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self._cache = data["dirs"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def _list_dir(self, rel_path):
+        """Returns (subdirectories, files) of a folder relative to the project"""
+        path = os.path.join(self.project_dir, rel_path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return [], []
+
+        cached = self._cache.get(rel_path)
+        if cached and cached[0] == mtime:
+            self.reused_dirs += 1
+            self._entries[rel_path] = cached
+            return cached[1], cached[2]
+
+        self.listed_dirs += 1
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+        except OSError:
+            return [], []
+
+        racy = time.time_ns() - mtime < RACY_SECONDS * 1_000_000_000
+        self._entries[rel_path] = [None if racy else mtime, subdirs, files]
+        return subdirs, files
+
+    def _collect_files(self, rel_dir, files):
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            subdirs, names = self._list_dir(current)
+            files.extend(os.path.join(current, name) for name in names)
+            pending.extend(os.path.join(current, name) for name in subdirs)
+
+    def scan(self):
+        """
+        Returns:
+            tuple: (binaries_dirs, files) relative to the project, files sorted by path
+        """
+        binaries_dirs = []
+        files = []
+        pending = [""]
+        while pending:
+            current = pending.pop()
+            subdirs, _ = self._list_dir(current)
+            for name in subdirs:
+                if name in EXCLUDED_FOLDERS:
+                    continue
+                rel_path = os.path.join(current, name)
+                if name == BINARIES_FOLDER:
+                    binaries_dirs.append(rel_path)
+                    self._collect_files(rel_path, files)
+                else:
+                    pending.append(rel_path)
+        binaries_dirs.sort()
+        files.sort()
+        return binaries_dirs, files
+
+    def save(self):
+        """Stores the listings of the last scan, folders that were not visited are dropped"""
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "dirs": self._entries}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not store the binaries scan cache: {str(e)}")
+
+
+def scan_binaries(project_dir, use_cache=True):
+    """
+    Find all folders named "Binaries" in a project and the files inside of them.
+
+    Returns:
+        tuple: (binaries_dirs, files) with paths relative to the project
+    """
+    scanner = BinariesScanner(
+        project_dir, get_cache_path(project_dir) if use_cache else None)
+    binaries_dirs, files = scanner.scan()
+    scanner.save()
+    print(
+        f"Scanned project folders: {scanner.listed_dirs} listed, {scanner.reused_dirs} unchanged")
+    return binaries_dirs, files
@@ -0,0 +1,172 @@
+import os
+import zlib
+
+# Local record of the binaries that were extracted into the project. It keeps the
+# original "extracted_binaries.txt" layout (header, separator, one path per line)
+# and appends the size, CRC32 and modification time of every file, separated by
+# tabs. A pull compares the archive against the files on disk without extracting
+# anything, and can tell with a stat per file whether the binaries on disk are
+# still the ones that were synced, before anything is downloaded.
+
+MANIFEST_FILE_NAME = "extracted_binaries.txt"
+HEADER_PREFIX = "Binary sync from "
+SEPARATOR = "=" * 50
+
+
+def get_manifest_path(project_path):
+    return os.path.join(project_path, MANIFEST_FILE_NAME)
+
+
+def read_manifest(project_path):
+    """
+    Read the manifest of previously extracted binaries.
+
+    Args:
+        project_path (str): Root of the project
+
+    Returns:
+        tuple: (source, entries) where source is the archive name of the last sync
+        and entries maps relative paths to (size, crc, mtime_ns). Values are None
+        for lines written by older versions that did not store them.
+    """
+    manifest_path = get_manifest_path(project_path)
+    entries = {}
+    source = None
+    if not os.path.exists(manifest_path):
+        return source, entries
+
+    with open(manifest_path, "r") as file:
+        first_line = file.readline().strip()
+        if first_line.startswith(HEADER_PREFIX):
+            source = first_line[len(HEADER_PREFIX):]
+        file.readline()  # Skip separator line
+        for line in file:
+            parts = line.rstrip("\n").split("\t")
+            if not parts[0]:
+                continue
+            size = crc = mtime = None
+            if len(parts) >= 3:
+                try:
+                    size = int(parts[1])
+                    crc = int(parts[2], 16)
+                    if len(parts) >= 4:
+                        mtime = int(parts[3])
+                except ValueError:
+                    size = crc = mtime = None
+            entries[parts[0]] = (size, crc, mtime)
+    return source, entries
+
+
+def write_manifest(project_path, source, entries):
+    """Write the manifest, the modification times are read from the files on disk"""
+    manifest_path = get_manifest_path(project_path)
+    with open(manifest_path, "w") as f:
+        f.write(f"{HEADER_PREFIX}{source}\n")
+        f.write(SEPARATOR + "\n")
+        for path in sorted(entries):
+            size, crc = entries[path][:2]
+            try:
+                mtime = os.stat(os.path.join(project_path, path)).st_mtime_ns
+            except OSError:
+                mtime = 0
+            f.write(f"{path}\t{size}\t{crc:08x}\t{mtime}\n")
+
+
+def get_source_commit(source):
+    """Returns the commit id of a manifest source, which is the archive or manifest name of a commit"""
+    return os.path.splitext(source)[0] if source else None
+
+
+def find_drifted_files(project_path, manifest_entries):
+    """
+    Returns the paths of the manifest whose file was deleted or has a different size
+    or modification time than after the sync. Only stats the files, nothing is read.
+    """
+    drifted = []
+    for path, (size, _, mtime) in manifest_entries.items():
+        try:
+            stat = os.stat(os.path.join(project_path, path))
+        except OSError:
+            drifted.append(path)
+            continue
+        if size is None or stat.st_size != size or (mtime is not None and stat.st_mtime_ns != mtime):
+            drifted.append(path)
+    return drifted
+
+
+def is_up_to_date(project_path, source, manifest_source, manifest_entries):
+    """True if the last sync was from source and none of its files changed on disk"""
+    return manifest_source == source and not find_drifted_files(project_path, manifest_entries)
+
+
+def file_crc32(file_path, chunk_size=1024 * 1024):
+    crc = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def is_file_current(project_path, path, size, crc, manifest_entry):
+    """
+    Check if the file on disk already matches the given size and CRC32.
+    Files recorded with size and crc are trusted when the size and modification
+    time on disk still match, all other files are verified by computing their CRC32.
+    """
+    full_path = os.path.join(project_path, path)
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return False
+    if stat.st_size != size:
+        return False
+
+    if manifest_entry is not None and manifest_entry[0] is not None:
+        if manifest_entry[:2] != (size, crc):
+            return False
+        # Manifests of older versions have no modification time, they are trusted as before
+        if manifest_entry[2] is None or manifest_entry[2] == stat.st_mtime_ns:
+            return True
+    return file_crc32(full_path) == crc
+
+
+def compute_entries_delta(target_entries, manifest_entries, project_path):
+    """
+    Compare the expected content of the project with the local manifest.
+
+    Args:
+        target_entries (dict): Relative paths mapped to (size, crc) of the target state
+        manifest_entries (dict): Entries returned by read_manifest
+        project_path (str): Root of the project
+
+    Returns:
+        tuple: (to_update, to_delete) relative paths that have to be written and
+        relative paths that are no longer part of the target state
+    """
+    to_update = [
+        path for path, (size, crc) in target_entries.items()
+        if not is_file_current(project_path, path, size, crc, manifest_entries.get(path))
+    ]
+    to_delete = [path for path in manifest_entries if path not in target_entries]
+    return to_update, to_delete
+
+
+def compute_delta(zip_infos, manifest_entries, project_path):
+    """
+    Compare the central directory of an archive with the local manifest.
+
+    Args:
+        zip_infos (list): ZipInfo objects of the archive
+        manifest_entries (dict): Entries returned by read_manifest
+        project_path (str): Root of the project
+
+    Returns:
+        tuple: (to_extract, to_delete, entries) with the ZipInfo objects that have to
+        be extracted, the relative paths that are no longer part of the archive and
+        the manifest entries describing the archive content.
+    """
+    infos = {info.filename: info for info in zip_infos if not info.is_dir()}
+    entries = {name: (info.file_size, info.CRC) for name, info in infos.items()}
+    to_update, to_delete = compute_entries_delta(
+        entries, manifest_entries, project_path)
+    return [infos[name] for name in to_update], to_delete, entries
@@ -0,0 +1,197 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+
+# Binaries are not written into the project while they are extracted or
+# downloaded. They go to a staging folder next to the project files, on the same
+# drive, and are moved into place in one pass once all of them are complete.
+# Replaced and removed files are moved to a backup folder inside the staging
+# folder instead of being deleted. Every move is written to a journal before it
+# happens, so if a file cannot be moved, e.g. because the Unreal Editor holds it
+# open, all previous moves are undone and the project keeps the old binaries.
+# A pull that was interrupted during the swap is rolled back on the next pull.
+#
+# The staging folders of finished swaps are deleted on a background thread.
+
+STAGING_DIR = os.path.join("Intermediate", "AnchorpointBinarySync", "staging")
+FILES_DIR = "files"
+BACKUP_DIR = "backup"
+JOURNAL_FILE_NAME = "journal.jsonl"
+COMMITTED = "committed"
+ROLLED_BACK = "rolled_back"
+
+
+class SwapFailedError(Exception):
+    """A file could not be moved into place, the project was rolled back"""
+
+    def __init__(self, path, error):
+        super().__init__(f"Could not replace {path}: {str(error)}")
+        self.path = path
+        self.error = error
+
+
+def get_staging_root(project_path):
+    return os.path.join(project_path, STAGING_DIR)
+
+
+def _get_path(root, relative_path):
+    path = os.path.normpath(os.path.join(root, *relative_path.replace("\\", "/").split("/")))
+    if os.path.commonpath([path, os.path.normpath(root)]) != os.path.normpath(root):
+        raise ValueError(f"Invalid path {relative_path}")
+    return path
+
+
+def _move(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(source, target)
+
+
+class StagingArea:
+    """
+    A staging folder for one pull.
+
+    Args:
+        project_path (str): Root of the project the files are swapped into
+        path (str): Existing staging folder, a new one is created if None
+    """
+
+    def __init__(self, project_path, path=None):
+        self.project_path = project_path
+        self.path = path or os.path.join(get_staging_root(project_path), uuid.uuid4().hex[:12])
+        self.files_dir = os.path.join(self.path, FILES_DIR)
+        self.backup_dir = os.path.join(self.path, BACKUP_DIR)
+        self.journal_path = os.path.join(self.path, JOURNAL_FILE_NAME)
+        os.makedirs(self.files_dir, exist_ok=True)
+
+    def swap(self, to_update, to_delete):
+        """
+        Move the staged files into the project and remove the deleted ones.
+
+        Args:
+            to_update (list): Relative paths of the staged files
+            to_delete (list): Relative paths of files to remove from the project
+
+        Raises:
+            SwapFailedError: If a file could not be moved. All files that were
+                moved before are restored.
+        """
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            def log(record):
+                # Flushed before the move, so a crash never leaves an unrecorded move
+                journal.write(json.dumps(record) + "\n")
+                journal.flush()
+
+            # Resolve all paths first, so an invalid path fails before anything is moved
+            deletions = [(relative_path, _get_path(self.project_path, relative_path))
+                         for relative_path in to_delete]
+            updates = [(relative_path, _get_path(self.project_path, relative_path))
+                       for relative_path in to_update]
+
+            done = []
+            try:
+                for relative_path, target in deletions:
+                    if not os.path.exists(target):
+                        continue
+                    record = {"op": "delete", "path": relative_path}
+                    log(record)
+                    _move(target, _get_path(self.backup_dir, relative_path))
+                    done.append(record)
+
+                for relative_path, target in updates:
+                    record = {"op": "replace", "path": relative_path,
+                              "existed": os.path.exists(target)}
+                    log(record)
+                    if record["existed"]:
+                        _move(target, _get_path(self.backup_dir, relative_path))
+                    _move(_get_path(self.files_dir, relative_path), target)
+                    done.append(record)
+            except OSError as e:
+                if self._rollback(done + [record]):
+                    try:
+                        log({"op": ROLLED_BACK})
+                    except OSError:
+                        pass
+                raise SwapFailedError(record["path"], e)
+
+            log({"op": COMMITTED})
+        # The replaced files are not needed anymore
+        self.discard()
+
+    def _rollback(self, records):
+        """Undo the moves of the given journal records in reverse order, returns False if a file could not be restored"""
+        restored = True
+        for record in reversed(records):
+            relative_path = record["path"]
+            target = _get_path(self.project_path, relative_path)
+            backup = _get_path(self.backup_dir, relative_path)
+            staged = _get_path(self.files_dir, relative_path)
+            try:
+                if record["op"] == "replace" and not os.path.exists(staged) and os.path.exists(target):
+                    _move(target, staged)
+                if os.path.exists(backup):
+                    _move(backup, target)
+            except OSError as e:
+                print(f"Could not restore {relative_path}: {str(e)}")
+                restored = False
+        return restored
+
+    def discard(self):
+        """Delete the staging folder in the background"""
+        delete_in_background([self.path])
+
+
+def _read_journal(journal_path):
+    records = []
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # The last line of an interrupted swap can be incomplete
+                    break
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def recover(project_path):
+    """
+    Roll back swaps that were interrupted, e.g. by a crash or a closed
+    Anchorpoint, and delete the staging folders of previous pulls in the
+    background. Call this before a new pull.
+
+    Returns:
+        int: Number of rolled back swaps
+    """
+    staging_root = get_staging_root(project_path)
+    try:
+        staging_dirs = [entry.path for entry in os.scandir(staging_root) if entry.is_dir()]
+    except FileNotFoundError:
+        return 0
+
+    rolled_back = 0
+    stale_dirs = []
+    for staging_dir in staging_dirs:
+        records = _read_journal(os.path.join(staging_dir, JOURNAL_FILE_NAME))
+        if records and records[-1].get("op") not in (COMMITTED, ROLLED_BACK):
+            print(f"Rolling back the interrupted binary update in {staging_dir}")
+            rolled_back += 1
+            if not StagingArea(project_path, staging_dir)._rollback(records):
+                # Keep the backup of files that are still locked for the next attempt
+                continue
+        stale_dirs.append(staging_dir)
+    delete_in_background(stale_dirs)
+    return rolled_back
+
+
+def delete_in_background(paths):
+    """Delete folders on a background thread, folders that cannot be deleted are retried on the next pull"""
+    def delete():
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if paths:
+        threading.Thread(target=delete, name="binary-sync-cleanup", daemon=True).start()
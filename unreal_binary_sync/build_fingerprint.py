@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import time
+import git_helper
+
+# Fingerprint of everything that goes into a build of the project binaries: the
+# source files of the project and its plugins, the .uproject file, the engine
+# version and the built targets. Every published build records its fingerprint
+# in the binary location. A push whose fingerprint was published before does not
+# compile and package again, the new commit is pointed at the existing binaries.
+#
+# An installed engine is identified by its version. Engines built from source
+# change without a new version, so their commit and the build ids of their
+# compiled modules are part of the fingerprint as well. A source built engine
+# without git cannot be identified and is always built.
+#
+# The source files are hashed once, the hashes are cached with the size and
+# modification time of every file, so an unchanged source tree is only stat'ed.
+#
+# Layout inside the binary location:
+#   fingerprints/<fingerprint>.json   {"commit": commit id, "format": storage format}
+#   aliases/<commit id>.json          {"commit": commit id of the published ZIP archive}
+
+FINGERPRINT_VERSION = 1
+CACHE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Plugins keep their code in Source folders, everything else in them does not affect the build
+SKIPPED_PLUGIN_FOLDERS = {"Binaries", "Intermediate", "Content", "Saved",
+                          "Resources", "Config", "Documentation", ".git"}
+# Files modified this recently are not cached, as a change within the same
+# timestamp resolution would go unnoticed
+RACY_SECONDS = 2
+
+
+def get_cache_path(project_dir):
+    return os.path.join(project_dir, "Intermediate", "AnchorpointBinarySync", "source_hashes.json")
+
+
+def get_record_key(fingerprint):
+    return f"fingerprints/{fingerprint}.json"
+
+
+def get_alias_key(commit_id):
+    return f"aliases/{commit_id}.json"
+
+
+def list_input_files(project_dir):
+    """Returns the source files of the project and its plugins, relative to the project and sorted"""
+    files = []
+    pending = ["Source", "Plugins"]
+    while pending:
+        rel_dir = pending.pop()
+        in_plugins = rel_dir.split(os.sep)[0] == "Plugins"
+        try:
+            with os.scandir(os.path.join(project_dir, rel_dir)) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if not (in_plugins and entry.name in SKIPPED_PLUGIN_FOLDERS):
+                            pending.append(rel_path)
+                    elif entry.is_file():
+                        files.append(rel_path)
+        except OSError:
+            continue
+    files.sort()
+    return files
+
+
+class SourceHasher:
+    """
+    Hashes files relative to a project, reusing the hashes of files whose size
+    and modification time did not change.
+
+    Args:
+        project_dir (str): Root of the Unreal project
+        cache_path (str): File the hashes are stored in, None to not persist them
+    """
+
+    def __init__(self, project_dir, cache_path=None):
+        self.project_dir = os.fspath(project_dir)
+        self.cache_path = cache_path
+        self.hashed_files = 0
+        self.reused_files = 0
+        self._cache = {}
+        self._entries = {}
+        if cache_path:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self._cache = data["files"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def hash_file(self, rel_path):
+        path = os.path.join(self.project_dir, rel_path)
+        stat = os.stat(path)
+        cached = self._cache.get(rel_path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            self.reused_files += 1
+            self._entries[rel_path] = cached
+            return cached[2]
+
+        self.hashed_files += 1
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sha.update(chunk)
+        file_hash = sha.hexdigest()
+        if time.time_ns() - stat.st_mtime_ns >= RACY_SECONDS * 1_000_000_000:
+            self._entries[rel_path] = [stat.st_size, stat.st_mtime_ns, file_hash]
+        return file_hash
+
+    def save(self):
+        """Stores the hashes of this run, files that were not hashed are dropped"""
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "files": self._entries}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not store the source hash cache: {str(e)}")
+
+
+def get_engine_version(engine_dir):
+    """Returns the content of Build.version of the engine, which changes with every engine release"""
+    version_file = os.path.join(engine_dir, "Engine", "Build", "Build.version")
+    try:
+        with open(version_file, "r", encoding="utf-8") as f:
+            return json.dumps(json.load(f), sort_keys=True)
+    except (OSError, ValueError):
+        return None
+
+
+def is_source_engine(engine_dir):
+    """True if the engine was built from source instead of installed from a launcher build"""
+    return not os.path.isfile(os.path.join(engine_dir, "Engine", "Build", "InstalledBuild.txt"))
+
+
+def get_source_engine_state(engine_dir, platforms):
+    """
+    Returns the commit of a source built engine and the content of the .modules
+    files of its binaries, which carry the id of the last engine build. None if
+    the engine is not a git working tree.
+    """
+    if git_helper.get_git_dir(os.fspath(engine_dir)) is None:
+        return None
+    try:
+        commit = git_helper.read_head_commit(os.fspath(engine_dir))
+    except Exception as e:
+        print(f"Could not read the commit of the engine: {str(e)}")
+        return None
+    if not commit:
+        return None
+
+    modules = []
+    for platform_name in sorted(set(platforms)):
+        binaries_dir = os.path.join(engine_dir, "Engine", "Binaries", platform_name)
+        try:
+            file_names = sorted(name for name in os.listdir(binaries_dir) if name.endswith(".modules"))
+        except OSError:
+            continue
+        for file_name in file_names:
+            with open(os.path.join(binaries_dir, file_name), "rb") as f:
+                modules.append([platform_name, file_name, hashlib.sha256(f.read()).hexdigest()])
+    return [commit, modules]
+
+
+def compute_fingerprint(project_dir, project_file, engine_dir, build_jobs, use_cache=True):
+    """
+    Compute the fingerprint of a build.
+
+    Args:
+        project_dir (Path): Root of the Unreal project
+        project_file (Path): Path to the .uproject file
+        engine_dir (Path): Path to the engine installation
+        build_jobs (list): build_matrix.BuildJob for every target and configuration
+
+    Returns:
+        str: Hex digest, None if the engine version or the state of a source
+        built engine cannot be read
+    """
+    engine_version = get_engine_version(engine_dir)
+    if engine_version is None:
+        print(f"Could not read the engine version from {engine_dir}")
+        return None
+    engine_state = None
+    if is_source_engine(engine_dir):
+        engine_state = get_source_engine_state(engine_dir, [job.platform for job in build_jobs])
+        if engine_state is None:
+            print(f"Could not read the commit of the source built engine at {engine_dir}")
+            return None
+
+    hasher = SourceHasher(project_dir, get_cache_path(project_dir) if use_cache else None)
+    digest = hashlib.sha256()
+
+    def add(*values):
+        digest.update(json.dumps(values).encode("utf-8"))
+        digest.update(b"\n")
+
+    add("version", FINGERPRINT_VERSION)
+    add("engine", engine_version)
+    if engine_state is not None:
+        add("engine_state", engine_state)
+    add("jobs", sorted(job.name for job in build_jobs))
+    add("project", os.path.basename(project_file),
+        hasher.hash_file(os.path.relpath(project_file, project_dir)))
+    for rel_path in list_input_files(project_dir):
+        # Paths are stored with forward slashes, so the fingerprint does not depend on the OS
+        add(rel_path.replace(os.sep, "/"), hasher.hash_file(rel_path))
+    hasher.save()
+
+    print(
+        f"Fingerprinted sources: {hasher.hashed_files} hashed, {hasher.reused_files} unchanged")
+    return digest.hexdigest()
+
+
+def read_record(store, fingerprint):
+    """Returns the record of a published build with this fingerprint, or None"""
+    data = store.get_bytes(get_record_key(fingerprint))
+    if data is None:
+        return None
+    try:
+        return json.loads(data.decode("utf-8"))
+    except ValueError:
+        return None
+
+
+def write_record(store, fingerprint, commit_id, storage_format):
+    record = {"version": FINGERPRINT_VERSION, "commit": commit_id, "format": storage_format}
+    store.put_bytes(get_record_key(fingerprint), json.dumps(record).encode("utf-8"))
+
+
+def write_alias(store, commit_id, archive_commit_id):
+    store.put_bytes(get_alias_key(commit_id),
+                    json.dumps({"commit": archive_commit_id}).encode("utf-8"))
+
+
+def resolve_archive_commit(store, commit_id):
+    """Returns the commit id whose ZIP archive contains the binaries of a commit"""
+    data = store.get_bytes(get_alias_key(commit_id))
+    if data is None:
+        return commit_id
+    try:
+        return json.loads(data.decode("utf-8"))["commit"]
+    except (ValueError, KeyError):
+        return commit_id
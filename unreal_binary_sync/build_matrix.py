@@ -0,0 +1,192 @@
+import concurrent.futures
+import os
+import subprocess
+import threading
+import time
+import setup_pipeline
+
+# Compilation of several build targets and configurations with UnrealBuildTool.
+# Every combination of target and configuration is a job. Each job writes its own
+# log file and returns a result with its exit code and duration. All jobs build
+# into the Binaries folders of the project, so their output ends up in the same
+# binary package.
+#
+# The jobs of one target and platform share the code UnrealHeaderTool generates
+# in the Intermediate folder, so they always run one after another. Up to a
+# configurable number of different targets or platforms are built at the same
+# time, only then UnrealBuildTool is started without its single instance mutex.
+
+DEFAULT_PLATFORM = "Win64"
+DEFAULT_CONFIGURATIONS = ["Development"]
+
+
+class BuildFailedError(Exception):
+    pass
+
+
+class BuildJob:
+    def __init__(self, target, configuration, platform=DEFAULT_PLATFORM):
+        self.target = target
+        self.configuration = configuration
+        self.platform = platform
+
+    @property
+    def name(self):
+        return f"{self.target} {self.platform} {self.configuration}"
+
+    @property
+    def intermediate_key(self):
+        """Jobs with the same key write to the same Intermediate folders"""
+        return self.target.lower(), self.platform.lower()
+
+
+class BuildResult:
+    def __init__(self, job, returncode, seconds, log_path, canceled=False):
+        self.job = job
+        self.returncode = returncode
+        self.seconds = seconds
+        self.log_path = log_path
+        self.canceled = canceled
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0 and not self.canceled
+
+    def __str__(self):
+        if self.canceled:
+            state = "canceled"
+        elif self.succeeded:
+            state = "succeeded"
+        else:
+            state = f"failed with exit code {self.returncode}"
+        return f"{self.job.name} {state} in {self.seconds:.1f}s, log: {self.log_path}"
+
+
+def parse_list(value, default=None):
+    """Returns the entries of a comma separated setting, or default if it is empty"""
+    entries = [entry.strip() for entry in str(value or "").split(",") if entry.strip()]
+    return entries or list(default or [])
+
+
+def parse_concurrency(value):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+def get_build_jobs(targets, configurations, platform=DEFAULT_PLATFORM):
+    return [BuildJob(target, configuration, platform)
+            for target in targets for configuration in configurations]
+
+
+def group_jobs(jobs):
+    """Returns lists of the jobs that share their Intermediate folders, in the order of the jobs"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.intermediate_key, []).append(job)
+    return list(groups.values())
+
+
+def get_build_command(unreal_build_tool, project_file, job, parallel=False):
+    cmd = [
+        str(unreal_build_tool),
+        job.configuration,
+        job.platform,
+        job.target,
+        f"-project={project_file}",
+        "-useprecompiled"
+    ]
+    if parallel:
+        # UnrealBuildTool only allows one instance at a time unless told otherwise.
+        # Only jobs of different targets or platforms run at the same time, see group_jobs
+        cmd.append("-NoMutex")
+    return cmd
+
+
+def _run_job(unreal_build_tool, project_file, job, parallel, log_dir, on_output, cancel_event):
+    log_path = os.path.join(
+        log_dir, f"{job.target}-{job.platform}-{job.configuration}.log")
+    startupinfo = None
+    if os.name == "nt":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+    start_time = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        lock = threading.Lock()
+
+        def write_line(line):
+            with lock:
+                log.write(line + "\n")
+            if on_output and line.strip():
+                on_output(job, line)
+
+        try:
+            returncode = setup_pipeline.run_process(
+                get_build_command(unreal_build_tool, project_file, job, parallel),
+                os.path.dirname(str(project_file)), cancel_event, write_line, startupinfo)
+        except setup_pipeline.SetupCanceledException:
+            return BuildResult(job, None, time.perf_counter() - start_time, log_path, canceled=True)
+    return BuildResult(job, returncode, time.perf_counter() - start_time, log_path)
+
+
+def _run_group(unreal_build_tool, project_file, jobs, parallel, log_dir, on_output, cancel_event):
+    results = []
+    for job in jobs:
+        if cancel_event.is_set():
+            results.append(BuildResult(job, None, 0.0, None, canceled=True))
+        else:
+            results.append(_run_job(unreal_build_tool, project_file, job,
+                                    parallel, log_dir, on_output, cancel_event))
+    return results
+
+
+def run_builds(unreal_build_tool, project_file, jobs, concurrency, log_dir,
+               on_output=None, is_canceled=None):
+    """
+    Run build jobs with UnrealBuildTool.
+
+    Args:
+        unreal_build_tool (Path): Path to UnrealBuildTool.exe
+        project_file (Path): Path to the .uproject file
+        jobs (list): BuildJob objects
+        concurrency (int): Maximum number of builds at the same time, jobs of
+            the same target and platform always run one after another
+        log_dir (str): Folder for the log file of every build
+        on_output (callable): Called with (job, line) for every line of build output
+        is_canceled (callable): Returns True if the builds should stop
+
+    Returns:
+        list: BuildResult for every job, in the order of the jobs
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    groups = group_jobs(jobs)
+    parallel = concurrency > 1 and len(groups) > 1
+    cancel_event = threading.Event()
+    results = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = {
+            executor.submit(_run_group, unreal_build_tool, project_file, group,
+                            parallel, log_dir, on_output, cancel_event): group
+            for group in groups
+        }
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, timeout=setup_pipeline.WAIT_INTERVAL,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                for result in future.result():
+                    results[result.job] = result
+            if is_canceled and is_canceled() and not cancel_event.is_set():
+                cancel_event.set()
+                for future, group in pending.items():
+                    if future.cancel():
+                        for job in group:
+                            results[job] = BuildResult(job, None, 0.0, None, canceled=True)
+                pending = {future: group for future, group in pending.items()
+                           if not future.cancelled()}
+
+    return [results[job] for job in jobs]
@@ -0,0 +1,246 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+# Content addressed storage for binaries. Every file is stored once under the
+# SHA-256 of its content and every commit only gets a small manifest mapping the
+# relative paths to those hashes. Consecutive builds share most of their files,
+# so a push only uploads the objects that are not part of the store yet.
+#
+# Layout inside the binary location:
+#   objects/<first two hash characters>/<hash>   zlib compressed file content
+#   manifests/<commit id>.json                   {"files": {path: {hash, size, crc}}}
+#
+# Objects are uploaded and downloaded on a thread pool with the number of
+# parallel requests of the backend. Downloaded files are checked against the
+# size and hash of the manifest before they are moved into place.
+
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+class StoreCanceledException(Exception):
+    pass
+
+
+class StoreVerificationError(Exception):
+    """A downloaded object does not match the manifest"""
+
+
+def get_object_key(file_hash):
+    return f"objects/{file_hash[:2]}/{file_hash}"
+
+
+def get_manifest_key(commit_id):
+    return f"manifests/{commit_id}.json"
+
+
+def hash_file(file_path):
+    """Returns the SHA-256 hex digest and the CRC32 of a file in a single read"""
+    sha = hashlib.sha256()
+    crc = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+    return sha.hexdigest(), crc
+
+
+def compress_to_temp_file(file_path):
+    compressor = zlib.compressobj(6)
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".obj")
+    with open(file_path, "rb") as source, temp_file:
+        while chunk := source.read(CHUNK_SIZE):
+            temp_file.write(compressor.compress(chunk))
+        temp_file.write(compressor.flush())
+    return temp_file.name
+
+
+def _run_parallel(items, work, workers, progress_callback, is_canceled):
+    """
+    Run work for every item on a thread pool. The calling thread only waits for
+    the workers, reports the progress and checks for cancellation. work is called
+    with (item, is_canceled) and returns the progress text.
+    """
+    cancel_event = threading.Event()
+    total = len(items)
+    done_count = 0
+
+    def run(item):
+        if cancel_event.is_set():
+            raise StoreCanceledException()
+        return work(item, cancel_event.is_set)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {executor.submit(run, item) for item in items}
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                text = None
+                for future in done:
+                    text = future.result()
+                    done_count += 1
+                if progress_callback and text is not None:
+                    progress_callback(text, done_count, total)
+                if is_canceled and is_canceled():
+                    raise StoreCanceledException()
+        except BaseException:
+            cancel_event.set()
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def push_files(store, commit_id, files, base_dir, progress_callback=None, is_canceled=None):
+    """
+    Upload files to the store and publish the manifest for a commit.
+
+    Args:
+        store: Backend of the binary location, see storage_backends
+        commit_id (str): Commit the binaries belong to
+        files (list): Absolute paths of the files to publish
+        base_dir (Path): Directory the manifest paths are relative to
+        progress_callback (callable): Called with (text, done, total)
+        is_canceled (callable): Returns True if the user canceled the push
+
+    Returns:
+        tuple: (uploaded, reused) number of objects
+    """
+    manifest_files = {}
+    total_files = len(files)
+
+    # Hash all files, identical content is only uploaded once
+    hashes = {}
+    for index, file_path in enumerate(files):
+        if is_canceled and is_canceled():
+            raise StoreCanceledException()
+        file_hash, crc = hash_file(file_path)
+        arc_name = os.path.relpath(file_path, base_dir).replace(os.sep, "/")
+        manifest_files[arc_name] = {
+            "hash": file_hash,
+            "size": os.path.getsize(file_path),
+            "crc": crc
+        }
+        hashes.setdefault(file_hash, file_path)
+        if progress_callback:
+            progress_callback("Hashing files...", index + 1, total_files)
+
+    # The objects that are already stored are found with a batched check
+    if progress_callback:
+        progress_callback("Checking stored files...", 0, 1)
+    existing = store.exists_many([get_object_key(file_hash) for file_hash in hashes])
+
+    to_upload = [(file_hash, file_path) for file_hash, file_path in hashes.items()
+                 if get_object_key(file_hash) not in existing]
+
+    def upload(item, _is_canceled):
+        file_hash, file_path = item
+        temp_path = compress_to_temp_file(file_path)
+        try:
+            store.put_file(get_object_key(file_hash), temp_path)
+        finally:
+            os.remove(temp_path)
+        return "Uploading files..."
+
+    _run_parallel(to_upload, upload, store.workers, progress_callback, is_canceled)
+    uploaded = len(to_upload)
+    reused = len(hashes) - uploaded
+
+    # The manifest is written last, so a commit only becomes visible once all of
+    # its objects are available
+    manifest = {"version": MANIFEST_VERSION, "files": manifest_files}
+    store.put_bytes(get_manifest_key(commit_id),
+                    json.dumps(manifest, indent=1).encode("utf-8"))
+    return uploaded, reused
+
+
+def get_manifest(store, commit_id):
+    data = store.get_bytes(get_manifest_key(commit_id))
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+
+def get_manifest_entries(manifest):
+    """Returns the manifest files as {path: (size, crc)}, the format of binary_manifest"""
+    return {path: (info["size"], info["crc"]) for path, info in manifest["files"].items()}
+
+
+def download_object(store, file_hash, target_path, is_canceled=None, size=None):
+    """
+    Download and decompress an object. The content is hashed while it is written
+    and only moved to target_path if it matches the hash and the expected size.
+
+    Raises:
+        StoreVerificationError: If the object is truncated or does not match
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    decompressor = zlib.decompressobj()
+    sha = hashlib.sha256()
+    written = 0
+    temp_target = f"{target_path}.part"
+    stream = store.open_stream(get_object_key(file_hash))
+    try:
+        with open(temp_target, "wb") as f:
+            while chunk := stream.read(CHUNK_SIZE):
+                if is_canceled and is_canceled():
+                    raise StoreCanceledException()
+                data = decompressor.decompress(chunk)
+                sha.update(data)
+                written += len(data)
+                f.write(data)
+            data = decompressor.flush()
+            sha.update(data)
+            written += len(data)
+            f.write(data)
+
+        if not decompressor.eof:
+            raise StoreVerificationError(f"Object {file_hash} is truncated")
+        if size is not None and written != size:
+            raise StoreVerificationError(
+                f"Object {file_hash} has {written} bytes, expected {size}")
+        if sha.hexdigest() != file_hash:
+            raise StoreVerificationError(f"Object {file_hash} does not match its hash")
+    except BaseException:
+        if os.path.exists(temp_target):
+            os.remove(temp_target)
+        raise
+    finally:
+        stream.close()
+    os.replace(temp_target, target_path)
+
+
+def pull_files(store, manifest, paths, project_path, progress_callback=None, is_canceled=None):
+    """
+    Download the objects of the given manifest paths into the project.
+
+    Args:
+        store: Backend of the binary location, see storage_backends
+        manifest (dict): Manifest returned by get_manifest
+        paths (list): Relative paths that have to be downloaded
+        project_path (str): Root of the project
+        progress_callback (callable): Called with (text, done, total)
+        is_canceled (callable): Returns True if the user canceled the pull
+    """
+    files = manifest["files"]
+    # Resolve all paths first, so an invalid path fails before anything is downloaded
+    targets = []
+    for path in paths:
+        target_path = os.path.normpath(
+            os.path.join(project_path, *path.split("/")))
+        if os.path.commonpath([target_path, os.path.normpath(project_path)]) != os.path.normpath(project_path):
+            raise ValueError(f"Invalid path in manifest: {path}")
+        targets.append((path, target_path))
+
+    def download(item, worker_canceled):
+        path, target_path = item
+        info = files[path]
+        download_object(store, info["hash"], target_path, worker_canceled, info["size"])
+        return f"Downloading {path}"
+
+    _run_parallel(targets, download, store.workers, progress_callback, is_canceled)
@@ -0,0 +1,88 @@
+import concurrent.futures
+import os
+import psutil
+
+# Detects binaries that cannot be replaced because another process holds them
+# open, e.g. a running Unreal Editor. Windows refuses to open a file for writing
+# while an executable or a loaded DLL uses it, so every file is opened once for
+# writing and closed again. Other platforms do not lock open files.
+#
+# Unreal processes are looked up by name. The names are read for all processes
+# in one pass, processes that deny access are skipped instead of raising, and the
+# PIDs that were found are remembered, so the next check only has to confirm
+# that these processes still exist.
+
+UNREAL_PROCESS_NAMES = {
+    "unrealeditor", "unrealeditor-cmd", "ue4editor", "ue4editor-cmd",
+    "livecodingconsole", "shadercompileworker"
+}
+LOCK_CHECK_WORKERS = 16
+
+# PID mapped to the creation time of Unreal processes found by the last check
+_unreal_pids = {}
+
+
+def _normalize_name(name):
+    name = name.lower()
+    return name[:-len(".exe")] if name.endswith(".exe") else name
+
+
+def find_unreal_processes():
+    """Returns the PIDs of running Unreal processes"""
+    # A PID can be reused by another process, the creation time tells them apart
+    running = []
+    for pid, create_time in list(_unreal_pids.items()):
+        try:
+            if psutil.Process(pid).create_time() == create_time:
+                running.append(pid)
+                continue
+        except psutil.Error:
+            pass
+        del _unreal_pids[pid]
+    if running:
+        return running
+
+    for process in psutil.process_iter(["name", "create_time"]):
+        name = process.info["name"]
+        if name and _normalize_name(name) in UNREAL_PROCESS_NAMES:
+            _unreal_pids[process.pid] = process.info["create_time"]
+            running.append(process.pid)
+    return running
+
+
+def is_unreal_running():
+    return bool(find_unreal_processes())
+
+
+def is_file_locked(path):
+    try:
+        with open(path, "r+b"):
+            return False
+    except FileNotFoundError:
+        return False
+    except OSError:
+        # Read-only files cannot be opened for writing either, but they can be replaced
+        return os.access(path, os.F_OK) and os.access(path, os.W_OK)
+
+
+def find_locked_files(project_path, relative_paths, workers=LOCK_CHECK_WORKERS):
+    """
+    Check which files of the project are held open by another process.
+
+    Args:
+        project_path (str): Root of the project
+        relative_paths (list): Paths of the files that are going to be replaced or removed
+        workers (int): Number of files that are checked at the same time
+
+    Returns:
+        list: Relative paths of the locked files
+    """
+    if os.name != "nt" or not relative_paths:
+        return []
+
+    def check(relative_path):
+        return is_file_locked(os.path.join(project_path, relative_path))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(check, relative_paths)
+        return [path for path, locked in zip(relative_paths, results) if locked]
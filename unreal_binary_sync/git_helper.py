@@ -0,0 +1,148 @@
+import os
+import platform
+import subprocess
+
+# Small git layer shared by the push and pull actions. Every git process costs
+# hundreds of milliseconds with the bundled git on Windows, so information that
+# is available in the .git folder, like the current commit, is read from the files
+# directly and git is only spawned as a fallback.
+
+
+def get_git_executable():
+    import anchorpoint as ap
+
+    application_dir = ap.get_application_dir()
+    git_path = None
+    if platform.system() == "Windows":
+        git_path = os.path.join(application_dir, "plugins", "git")
+        git_exe = os.path.join(git_path, "cmd", "git.exe")
+    elif platform.system() == "Darwin":
+        git_path = os.path.join(application_dir, "..", "Resources", "git")
+        git_exe = os.path.join(git_path, "bin", "git")
+    else:
+        raise RuntimeError("Unsupported Platform")
+
+    if (git_path):
+        return os.path.normpath(git_exe)
+    else:
+        return "git"  # Fallback to system git that is installed on the system
+
+
+def run_git(args, cwd, git_exe=None, check=True):
+    """Runs git without a console window and returns the completed process with text output"""
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+    return subprocess.run(
+        [git_exe or get_git_executable(), *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        startupinfo=startupinfo,
+        check=check
+    )
+
+
+def get_git_dir(project_path):
+    """Returns the git directory of a working tree, following the .git file of linked worktrees"""
+    dot_git = os.path.join(project_path, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+    try:
+        with open(dot_git, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+    except OSError:
+        return None
+    if not content.startswith("gitdir:"):
+        return None
+    return os.path.normpath(os.path.join(project_path, content[len("gitdir:"):].strip()))
+
+
+def get_common_dir(git_dir):
+    """Returns the directory with the refs shared by all worktrees"""
+    try:
+        with open(os.path.join(git_dir, "commondir"), "r", encoding="utf-8") as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+def _read_packed_ref(common_dir, ref):
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+
+def _read_ref(git_dir, common_dir, ref):
+    # Per worktree refs like HEAD live in the git dir, everything else in the common dir
+    for base_dir in (git_dir, common_dir):
+        try:
+            with open(os.path.join(base_dir, *ref.split("/")), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return _read_packed_ref(common_dir, ref)
+
+
+def read_head_commit(project_path, git_exe=None):
+    """Returns the commit id of HEAD, read from the .git folder without spawning git if possible"""
+    git_dir = get_git_dir(project_path)
+    if git_dir:
+        common_dir = get_common_dir(git_dir)
+        value = _read_ref(git_dir, common_dir, "HEAD")
+        # Follow symbolic refs, HEAD usually points to a branch
+        for _ in range(5):
+            if not value or not value.startswith("ref:"):
+                break
+            value = _read_ref(git_dir, common_dir, value[len("ref:"):].strip())
+        if value and len(value) in (40, 64) and all(c in "0123456789abcdef" for c in value):
+            return value
+
+    return run_git(["rev-parse", "HEAD"], project_path, git_exe).stdout.strip()
+
+
+def get_tag_numbering(project_path, tag_prefix, head, git_exe=None):
+    """
+    Reads all tags with a single for-each-ref sorted by version, so the highest
+    numbered tag is the first one with the prefix.
+
+    Returns:
+        tuple: (next_tag, tags_on_head) with the next free numbered tag and the
+        names of all tags that already point to the head commit
+    """
+    output = run_git(
+        ["for-each-ref", "--sort=-version:refname",
+         "--format=%(refname:strip=2)%09%(objectname)%09%(*objectname)", "refs/tags"],
+        project_path, git_exe).stdout
+
+    highest_number = None
+    tags_on_head = []
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) != 3:
+            continue
+        name, object_id, peeled_id = parts
+        if head in (object_id, peeled_id):
+            tags_on_head.append(name)
+        if highest_number is None and name.startswith(tag_prefix):
+            number = name[len(tag_prefix):]
+            if number.isdigit():
+                highest_number = int(number)
+
+    return f"{tag_prefix}{(highest_number or 0) + 1}", tags_on_head
+
+
+def create_and_push_tag(project_path, tag, commit, git_exe=None):
+    run_git(["tag", tag, commit], project_path, git_exe)
+    run_git(["push", "origin", f"refs/tags/{tag}"], project_path, git_exe)
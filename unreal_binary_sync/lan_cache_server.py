@@ -0,0 +1,419 @@
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import threading
+import urllib.parse
+import uuid
+import storage_backends
+
+# Read through cache server for the binary sync in a local network. One computer
+# in the office runs this script, every workstation sets its address as the LAN
+# Cache in the project settings. Files are downloaded from the bucket once and
+# then served from the local disk of the server. Content addressed objects never
+# change, all other files are revalidated against the ETag in the bucket on every
+# request, so a re-pushed archive is fetched again. If the bucket cannot be
+# reached, cached files are served as they are.
+#
+# Layout of the cache folder, keys never become paths so they cannot collide
+# with the metadata:
+#   data/<xx>/<key hash>-<etag hash>-<id>   content of one version of a key
+#   meta/<xx>/<key hash>.json               {"key", "etag", "file"} of the served version,
+#                                           file is the path below the data folder
+#
+# A missing or outdated file is downloaded in the background, and the request that
+# caused it is answered from the file while it is written, so a client never waits
+# for a whole archive before it gets the first byte. HEAD requests are answered
+# from the bucket without downloading anything. Once a new version is complete,
+# the metadata is switched over and the old file is deleted when no request reads
+# it anymore. Windows does not allow deleting a file that is open, so files that
+# are still being served are retried on later requests.
+#
+# Usage:
+#   set AWS_ACCESS_KEY_ID=... and AWS_SECRET_ACCESS_KEY=...
+#   python lan_cache_server.py --cache-dir D:\BinaryCache --endpoint-url https://... --bucket my-binaries
+
+DEFAULT_PORT = 8765
+# Keys below this prefix are named after the hash of their content
+IMMUTABLE_PREFIXES = ("objects/",)
+DATA_DIR = "data"
+META_DIR = "meta"
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class BinaryCache:
+    """Files of the bucket mirrored into a local folder"""
+
+    def __init__(self, cache_dir, upstream):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.data_dir = os.path.join(self.cache_dir, DATA_DIR)
+        self.meta_dir = os.path.join(self.cache_dir, META_DIR)
+        self.upstream = upstream
+        # Key mapped to its metadata, read from the meta folder on first access
+        self._entries = {}
+        # Replaced versions that could not be deleted yet
+        self._stale_files = set()
+        self._stale_lock = threading.Lock()
+        # Key mapped to the _Fill that is downloading its current version
+        self._fills = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _get_meta_path(self, key_hash):
+        return os.path.join(self.meta_dir, key_hash[:2], f"{key_hash}.json")
+
+    def new_version_name(self, key, etag):
+        """Returns a new path below the data folder for a version of a key with the given ETag"""
+        key_hash = _hash(key)
+        return f"{key_hash[:2]}/{key_hash}-{_hash(etag)[:16]}-{uuid.uuid4().hex[:8]}"
+
+    def _get_data_path(self, name):
+        return os.path.join(self.data_dir, *name.split("/"))
+
+    def _open(self, entry, with_body=True):
+        path = self._get_data_path(entry["file"])
+        if not with_body:
+            return None, entry["etag"], os.path.getsize(path)
+        source = open(path, "rb")
+        return source, entry["etag"], os.fstat(source.fileno()).st_size
+
+    def _get_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            try:
+                with open(self._get_meta_path(_hash(key)), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if entry.get("key") != key:
+                return None
+            self._entries[key] = entry
+        if not os.path.exists(self._get_data_path(entry["file"])):
+            return None
+        return entry
+
+    def _set_entry(self, key, entry):
+        meta_path = self._get_meta_path(_hash(key))
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # The metadata is only read under the lock of its key, so nothing holds it open
+        temp_path = f"{meta_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, meta_path)
+        self._entries[key] = entry
+
+    def _discard(self, path):
+        with self._stale_lock:
+            self._stale_files.add(path)
+        self.remove_stale_files()
+
+    def remove_stale_files(self):
+        """Delete replaced versions, files that are still being served are retried later"""
+        with self._stale_lock:
+            for path in list(self._stale_files):
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    self._stale_files.discard(path)
+                except OSError:
+                    pass
+
+    def remove_unreferenced_files(self):
+        """Delete versions that no metadata points to, e.g. downloads of a server that was stopped"""
+        referenced = set()
+        for directory, _, file_names in os.walk(self.meta_dir):
+            for file_name in file_names:
+                try:
+                    with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+                        referenced.add(os.path.normcase(self._get_data_path(json.load(f)["file"])))
+                except (OSError, ValueError, KeyError):
+                    continue
+        for directory, _, file_names in os.walk(self.data_dir):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                if os.path.normcase(path) in referenced:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _start_fill(self, key, head):
+        name = self.new_version_name(key, head["etag"])
+        fill = _Fill(self, key, head, name, self._get_data_path(name))
+        self._fills[key] = fill
+        print(f"Fetching {key} ({head['size'] / (1024 * 1024):.1f} MB) from the bucket")
+        threading.Thread(target=fill.run, name="cache-fill", daemon=True).start()
+        return fill
+
+    def _finish_fill(self, fill):
+        """Called by a fill once its download is complete or failed"""
+        with self._lock(fill.key):
+            if self._fills.get(fill.key) is fill:
+                del self._fills[fill.key]
+            if fill.error is not None:
+                self._discard(fill.path)
+                return
+            entry = self._get_entry(fill.key)
+            self._set_entry(fill.key, {"key": fill.key, "etag": fill.etag, "file": fill.name})
+            if entry is not None and entry["file"] != fill.name:
+                self._discard(self._get_data_path(entry["file"]))
+
+    def fetch(self, key, with_body=True):
+        """
+        Returns (file, etag, size) of the current version of a file, or None if
+        the file does not exist. A missing or outdated file is downloaded in the
+        background and the returned file reads the data while it arrives. The file
+        is open for reading and has to be closed by the caller. Without a body,
+        nothing is downloaded and the file is None.
+        """
+        if not key:
+            raise ValueError(f"Invalid key {key}")
+        # Concurrent requests for the same file share a single download. Files
+        # are opened under the lock, so a version is never deleted before it is open
+        with self._lock(key):
+            entry = self._get_entry(key)
+            if entry is not None and key.startswith(IMMUTABLE_PREFIXES):
+                return self._open(entry, with_body)
+
+            try:
+                head = self.upstream.head(key)
+            except Exception as e:
+                if entry is None:
+                    raise
+                print(f"Bucket not available, serving cached {key}: {str(e)}")
+                return self._open(entry, with_body)
+            if head is None:
+                return None
+            if entry is not None and head["etag"] == entry["etag"]:
+                return self._open(entry, with_body)
+            if not with_body:
+                return None, head["etag"], head["size"]
+
+            fill = self._fills.get(key)
+            if fill is None or fill.etag != head["etag"]:
+                fill = self._start_fill(key, head)
+            return fill.open(), fill.etag, fill.size
+
+
+class _Fill:
+    """
+    Download of one version of a file into the cache. Requests read the file
+    while it is written, they wait for data that has not arrived yet.
+    """
+
+    def __init__(self, cache, key, head, name, path):
+        self.cache = cache
+        self.key = key
+        self.etag = head["etag"]
+        self.size = head["size"]
+        self.name = name
+        self.path = path
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Created before any request opens it
+        open(path, "wb").close()
+
+    def open(self):
+        return _FillReader(self)
+
+    def run(self):
+        try:
+            # The ETag makes the bucket fail the request if the file was replaced since the head request
+            stream = self.cache.upstream.open_stream(self.key, self.etag)
+            try:
+                with open(self.path, "r+b") as f:
+                    while chunk := stream.read(CHUNK_SIZE):
+                        f.write(chunk)
+                        f.flush()
+                        with self.condition:
+                            self.written += len(chunk)
+                            self.condition.notify_all()
+            finally:
+                stream.close()
+            if self.written != self.size:
+                raise OSError(f"Received {self.written} of {self.size} bytes of {self.key}")
+        except Exception as e:
+            print(f"Failed to fetch {self.key}: {str(e)}")
+            self.error = e
+        self.cache._finish_fill(self)
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+
+class _FillReader:
+    """File object on a file that is still being downloaded"""
+
+    def __init__(self, fill):
+        self._fill = fill
+        self._file = open(fill.path, "rb")
+        self._position = 0
+
+    def seek(self, position):
+        self._position = position
+        self._file.seek(position)
+
+    def read(self, size):
+        fill = self._fill
+        with fill.condition:
+            while fill.written <= self._position and fill.error is None and not fill.done:
+                fill.condition.wait(1.0)
+            if fill.error is not None:
+                raise OSError(f"Download of {fill.key} failed: {str(fill.error)}")
+            available = fill.written - self._position
+        if available <= 0:
+            return b""
+        data = self._file.read(min(size, available))
+        self._position += len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def parse_range(value, size):
+    """Returns (start, end) with an inclusive end for a single byte range header, None if it is not satisfiable"""
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    start, _, end = value[len("bytes="):].partition("-")
+    try:
+        if not start:
+            length = int(end)
+            return (max(0, size - length), size - 1) if length else None
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    return (start, end) if start <= end else None
+
+
+class CacheRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cache = None
+
+    def _send_file(self, with_body):
+        key = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path.lstrip("/"))
+        try:
+            result = self.cache.fetch(key, with_body)
+        except ValueError:
+            self.send_error(400)
+            return
+        except Exception as e:
+            print(f"Failed to fetch {key}: {str(e)}")
+            self.send_error(502)
+            return
+        if result is None:
+            self.send_error(404)
+            return
+
+        source, etag, size = result
+        if source is None:
+            self._send_body(None, etag, size)
+            return
+        with source:
+            self._send_body(source, etag, size)
+
+    def _send_body(self, source, etag, size):
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (not if_range or if_range == etag):
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start, end = byte_range
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if source is None:
+            return
+
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            try:
+                chunk = source.read(min(remaining, CHUNK_SIZE))
+            except OSError as e:
+                # The download from the bucket failed, the client sees a short response
+                print(str(e))
+                chunk = b""
+            if not chunk:
+                self.close_connection = True
+                break
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, e.g. a canceled pull
+                self.close_connection = True
+                return
+            remaining -= len(chunk)
+
+    def do_GET(self):
+        self._send_file(True)
+
+    def do_HEAD(self):
+        self._send_file(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LAN cache server for the Unreal binary sync")
+    parser.add_argument("--cache-dir", required=True, help="Folder the binaries are cached in")
+    parser.add_argument("--endpoint-url", required=True, help="Endpoint URL of the S3 storage")
+    parser.add_argument("--bucket", required=True, help="Bucket of the binaries")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args()
+
+    access_key = os.environ.get("AWS_ACCESS_KEY_ID", "")
+    secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
+    if not access_key or not secret_key:
+        parser.error("Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY")
+
+    s3_client = storage_backends.get_s3_client(access_key, secret_key, args.endpoint_url)
+    upstream = storage_backends.S3Backend(s3_client, args.bucket)
+    cache = BinaryCache(args.cache_dir, upstream)
+    cache.remove_unreferenced_files()
+    CacheRequestHandler.cache = cache
+
+    server = http.server.ThreadingHTTPServer((args.host, args.port), CacheRequestHandler)
+    print(f"Serving {args.bucket} from {args.cache_dir} on port {args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
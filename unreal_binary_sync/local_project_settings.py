@@ -36,6 +36,10 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
             project_path+"_enable_binary_push", False)
         engine_directory = local_settings.get(
             project_path+"_engine_directory", "")
+        archive_cache_gb = local_settings.get(
+            project_path+"_archive_cache_gb", "10")
+        lan_cache_url = local_settings.get(
+            project_path+"_lan_cache_url", "")
 
         self.shared_settings = aps.SharedSettings(
             ctx.workspace_id, "unreal_binary_sync")
@@ -57,6 +61,26 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
             self.dialog.add_info(
                 "The folder containing all the ZIP files named with commit IDs. Learn how to<br>properly <a href='https://docs.anchorpoint.app/git/binary-syncing/' >setup binary syncing</a>.")
 
+        if self.binary_location == "s3":
+            self.dialog.add_text("Archive Cache (GB)", width=110).add_input(
+                placeholder="10",
+                var="archive_cache_gb",
+                default=archive_cache_gb,
+                width=80,
+                callback=self.store_local_settings
+            )
+            self.dialog.add_info(
+                "Downloaded binaries are kept on this computer up to this size, so switching back<br>to a recently synced commit does not download them again. Set to 0 to disable.")
+            self.dialog.add_text("LAN Cache", width=110).add_input(
+                placeholder="http://buildcache:8765",
+                var="lan_cache_url",
+                default=lan_cache_url,
+                width=246,
+                callback=self.store_local_settings
+            )
+            self.dialog.add_info(
+                "Optional address of a cache server in your office network running<br>lan_cache_server.py. Binaries are downloaded from it instead of S3.")
+
         self.dialog.add_checkbox(
             text="Sync Setup Dependencies",
             var="sync_dependencies",
@@ -142,6 +166,11 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
         if self.binary_location == "folder":
             local_settings.set(project_path+"_binary_source",
                                dialog.get_value("binary_source"))
+        if self.binary_location == "s3":
+            local_settings.set(project_path+"_archive_cache_gb",
+                               dialog.get_value("archive_cache_gb").strip())
+            local_settings.set(project_path+"_lan_cache_url",
+                               dialog.get_value("lan_cache_url").strip())
         local_settings.set(project_path+"_sync_dependencies",
                            dialog.get_value("sync_dependencies"))
         local_settings.set(project_path+"_launch_project_display_name",
@@ -1,5 +1,6 @@
 import anchorpoint as ap
 import apsync as aps
+import parallel_zip
 
 ctx = ap.get_context()
 ui = ap.UI()
@@ -12,6 +13,18 @@ BINARY_LOCATIONS = {
     "s3": "S3 Cloud Storage"
 }
 
+COMPRESSION_CODECS = {
+    "deflate": "Deflate",
+    "store": "No Compression",
+    "lzma": "LZMA",
+    "zstd": "Zstandard"
+}
+
+STORAGE_FORMATS = {
+    "zip": "ZIP Archive per Commit",
+    "content_store": "Deduplicated File Store"
+}
+
 
 def apply_callback(dialog, value):
     # Get the selected value from the dropdown
@@ -19,6 +32,26 @@ def apply_callback(dialog, value):
 
     settings.set("tag_pattern", dialog.get_value("tag_pattern_var"))
 
+    storage_format_value = dialog.get_value("storage_format_var")
+    for key, display_name in STORAGE_FORMATS.items():
+        if storage_format_value == display_name:
+            settings.set("storage_format", key)
+
+    compression_codec_value = dialog.get_value("compression_codec_var")
+    for key, display_name in COMPRESSION_CODECS.items():
+        if compression_codec_value == display_name:
+            settings.set("compression_codec", key)
+    settings.set("compression_level", dialog.get_value(
+        "compression_level_var").strip())
+    settings.set("store_extensions", dialog.get_value("store_extensions_var"))
+    settings.set("skip_unchanged_builds", dialog.get_value(
+        "skip_unchanged_builds_var"))
+    settings.set("build_targets", dialog.get_value("build_targets_var").strip())
+    settings.set("build_configurations", dialog.get_value(
+        "build_configurations_var").strip())
+    settings.set("build_concurrency", dialog.get_value(
+        "build_concurrency_var").strip())
+
     if (binary_location_value == "S3 Cloud Storage"):
         settings.set("binary_location_type", "s3")
 
@@ -26,12 +59,24 @@ def apply_callback(dialog, value):
         dialog.set_enabled("secret_key_var", True)
         dialog.set_enabled("endpoint_url_var", True)
         dialog.set_enabled("bucket_name_var", True)
+        dialog.set_enabled("s3_transfer_workers_var", True)
+        dialog.set_enabled("s3_part_size_mb_var", True)
+        dialog.set_enabled("s3_streaming_upload_var", True)
+        dialog.set_enabled("s3_streaming_download_var", True)
         settings.set("access_key", dialog.get_value("access_key_var").strip())
         settings.set("secret_key", dialog.get_value("secret_key_var").strip())
         settings.set("endpoint_url", dialog.get_value(
             "endpoint_url_var").strip())
         settings.set("bucket_name", dialog.get_value(
             "bucket_name_var").strip())
+        settings.set("s3_transfer_workers", dialog.get_value(
+            "s3_transfer_workers_var").strip())
+        settings.set("s3_part_size_mb", dialog.get_value(
+            "s3_part_size_mb_var").strip())
+        settings.set("s3_streaming_upload", dialog.get_value(
+            "s3_streaming_upload_var"))
+        settings.set("s3_streaming_download", dialog.get_value(
+            "s3_streaming_download_var"))
     else:
         settings.set("binary_location_type", "folder")
 
@@ -39,6 +84,10 @@ def apply_callback(dialog, value):
         dialog.set_enabled("secret_key_var", False)
         dialog.set_enabled("endpoint_url_var", False)
         dialog.set_enabled("bucket_name_var", False)
+        dialog.set_enabled("s3_transfer_workers_var", False)
+        dialog.set_enabled("s3_part_size_mb_var", False)
+        dialog.set_enabled("s3_streaming_upload_var", False)
+        dialog.set_enabled("s3_streaming_download_var", False)
 
     settings.store()
 
@@ -85,10 +134,23 @@ def main():
 
     binary_location = settings.get("binary_location_type", "folder")
     tag_pattern = settings.get("tag_pattern", "")
+    storage_format = settings.get("storage_format", "zip")
+    compression_codec = settings.get("compression_codec", "deflate")
+    compression_level = str(settings.get("compression_level", ""))
+    store_extensions = settings.get(
+        "store_extensions", parallel_zip.DEFAULT_STORE_EXTENSIONS)
+    build_targets = settings.get("build_targets", "")
+    skip_unchanged_builds = settings.get("skip_unchanged_builds", True)
+    build_configurations = settings.get("build_configurations", "")
+    build_concurrency = str(settings.get("build_concurrency", "1"))
     access_key = settings.get("access_key", "")
     secret_key = settings.get("secret_key", "")
     endpoint_url = settings.get("endpoint_url", "")
     bucket_name = settings.get("bucket_name", "")
+    s3_transfer_workers = str(settings.get("s3_transfer_workers", "8"))
+    s3_part_size_mb = str(settings.get("s3_part_size_mb", "64"))
+    s3_streaming_upload = settings.get("s3_streaming_upload", True)
+    s3_streaming_download = settings.get("s3_streaming_download", True)
 
     dialog.add_text("Tag Pattern", width=110).add_input(
         placeholder="Editor",
@@ -106,6 +168,64 @@ def main():
     )
     dialog.add_info("Select where the binaries are stored in your studio. A shared folder can be something<br>like a Google Drive. An S3 Cloud Storage can be something like AWS S3 or Backblaze B2.")
 
+    dialog.add_text("Storage Format", width=110).add_dropdown(
+        default=STORAGE_FORMATS[storage_format],
+        values=list(STORAGE_FORMATS.values()),
+        var="storage_format_var",
+        callback=apply_callback
+    )
+    dialog.add_info("A deduplicated file store uploads every file only once and shares it between commits.<br>Pulling always supports both formats.")
+
+    dialog.start_section("Compression", foldable=True)
+    dialog.add_text("Codec", width=110).add_dropdown(
+        default=COMPRESSION_CODECS[compression_codec],
+        values=list(COMPRESSION_CODECS.values()),
+        var="compression_codec_var",
+        callback=apply_callback
+    )
+    dialog.add_text("Level", width=110).add_input(
+        default=compression_level,
+        placeholder="Default",
+        var="compression_level_var",
+        callback=apply_callback
+    )
+    dialog.add_text("Don't Compress", width=110).add_tag_input(
+        store_extensions, placeholder="pak", var="store_extensions_var", callback=apply_callback)
+    dialog.add_info(
+        "Only applicable when pushing ZIP archives. Deflate supports levels 0-9, Zstandard 1-22.<br>Files with the listed extensions are already compressed and are stored as they are.")
+    dialog.end_section()
+
+    dialog.start_section("Build", foldable=True)
+    dialog.add_text("Targets", width=110).add_input(
+        default=build_targets,
+        placeholder="MyProjectEditor, MyOtherEditor",
+        var="build_targets_var",
+        callback=apply_callback
+    )
+    dialog.add_text("Configurations", width=110).add_input(
+        default=build_configurations,
+        placeholder="Development",
+        var="build_configurations_var",
+        callback=apply_callback
+    )
+    dialog.add_text("Parallel Builds", width=110).add_input(
+        default=build_concurrency,
+        placeholder="1",
+        var="build_concurrency_var",
+        callback=apply_callback
+    )
+    dialog.add_info(
+        "Comma separated targets and configurations that are compiled before pushing. Every<br>target is built in every configuration. Leave empty to build the editor target of the project.<br>Parallel Builds compiles different targets at the same time. The configurations of a target<br>share its generated code in the Intermediate folder and are built one after another.")
+    dialog.add_checkbox(
+        text="Skip Unchanged Builds",
+        var="skip_unchanged_builds_var",
+        default=skip_unchanged_builds,
+        callback=apply_callback
+    )
+    dialog.add_info(
+        "Do not compile and upload again when the sources, the .uproject file, the engine<br>version and the targets did not change since a previous push. The new commit<br>is tagged and points to the binaries that were pushed before. Engines built from<br>source are compared by their git commit and engine build, uncommitted engine<br>changes that were not compiled yet are not detected.")
+    dialog.end_section()
+
     dialog.start_section("S3 Access Credentials", foldable=True)
     dialog.add_info(
         "Only applicable when using S3 Cloud Storage. Provide the access credentials to access<br>your S3 bucket where the binaries are stored.")
@@ -134,6 +254,38 @@ def main():
         var="bucket_name_var", enabled=(binary_location == "s3"),
         callback=apply_callback
     )
+    dialog.add_text("Parallel Transfers", width=110).add_input(
+        default=s3_transfer_workers,
+        placeholder="8",
+        var="s3_transfer_workers_var", enabled=(binary_location == "s3"),
+        callback=apply_callback
+    )
+    dialog.add_text("Part Size (MB)", width=110).add_input(
+        default=s3_part_size_mb,
+        placeholder="64",
+        var="s3_part_size_mb_var", enabled=(binary_location == "s3"),
+        callback=apply_callback
+    )
+    dialog.add_info(
+        "Binaries are uploaded and downloaded in parts of this size, several parts at the same<br>time. Interrupted transfers continue where they stopped.")
+    dialog.add_checkbox(
+        text="Upload while zipping",
+        var="s3_streaming_upload_var",
+        default=s3_streaming_upload,
+        enabled=(binary_location == "s3"),
+        callback=apply_callback
+    )
+    dialog.add_info(
+        "Streams the ZIP archive directly to S3 without a temporary file. Disable it to be able<br>to resume an interrupted upload on the next push.")
+    dialog.add_checkbox(
+        text="Extract while downloading",
+        var="s3_streaming_download_var",
+        default=s3_streaming_download,
+        enabled=(binary_location == "s3"),
+        callback=apply_callback
+    )
+    dialog.add_info(
+        "Extracts the binaries while the archive is downloading and only downloads the files<br>that changed. Disable it to download the complete ZIP archive first.")
     dialog.add_button("Test Connection",
                       callback=text_connection_callback, var="text_button_var", primary=False)
     dialog.end_section()
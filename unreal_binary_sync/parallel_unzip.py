@@ -0,0 +1,161 @@
+import concurrent.futures
+import os
+import threading
+import zipfile
+import zlib
+import zip_codecs
+
+# Multi threaded ZIP extraction. Entries are distributed over a thread pool where
+# every worker reads through its own ZipFile handle, as a single handle cannot be
+# shared between threads. zlib releases the GIL while inflating, so extraction
+# scales with the number of cores. Directories are created upfront in one pass.
+# Zstandard compressed entries written by parallel_zip are supported as well.
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+class ExtractionCanceledException(Exception):
+    pass
+
+
+def get_default_workers():
+    return min(32, os.cpu_count() or 4)
+
+
+def get_target_path(output_dir, filename):
+    """Returns the path an entry is extracted to, sanitized like ZipFile.extract does"""
+    arcname = filename.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_path_parts = ("", os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(
+        x for x in arcname.split(os.path.sep) if x not in invalid_path_parts)
+    if os.path.sep == "\\":
+        arcname = zipfile.ZipFile._sanitize_windows_name(arcname, os.path.sep)
+    return os.path.normpath(os.path.join(output_dir, arcname))
+
+
+def extract_raw_entry(fp, info, target, cancel_event):
+    """
+    Decompress an entry by reading its data directly from the archive file object.
+    Used for compressions zipfile cannot read, e.g. Zstandard, and for archives
+    that are only partially available, e.g. byte ranges of a remote archive.
+    The file object only has to support seeking forward.
+    """
+    decompressor = zip_codecs.get_decompressor(info.compress_type)
+    fp.seek(zip_codecs.get_data_offset(fp, info))
+    remaining = info.compress_size
+    crc = 0
+    while remaining and not cancel_event.is_set():
+        chunk = fp.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+        remaining -= len(chunk)
+        data = decompressor.decompress(chunk) if decompressor else chunk
+        crc = zlib.crc32(data, crc)
+        target.write(data)
+    if not cancel_event.is_set() and crc != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename}")
+
+
+def _extract_entry(zip_file, info, target_path, cancel_event):
+    with open(target_path, "wb") as target:
+        if info.compress_type == zip_codecs.ZIP_ZSTANDARD:
+            extract_raw_entry(zip_file.fp, info, target, cancel_event)
+        else:
+            with zip_file.open(info) as source:
+                while chunk := source.read(COPY_CHUNK_SIZE):
+                    if cancel_event.is_set():
+                        break
+                    target.write(chunk)
+    if cancel_event.is_set():
+        # Do not leave a truncated file behind
+        os.remove(target_path)
+
+
+def extract_members(zip_file_path, output_dir, members=None, workers=None,
+                    progress_callback=None, is_canceled=None):
+    """
+    Extract entries of a ZIP archive in parallel.
+
+    Args:
+        zip_file_path (str): Archive to extract
+        output_dir (str): Directory to extract to
+        members (list): ZipInfo objects to extract, all entries if None
+        workers (int): Number of threads, defaults to the number of cores
+        progress_callback (callable): Called with (done_files, total_files, done_bytes, total_bytes)
+        is_canceled (callable): Returns True if the extraction should stop
+
+    Returns:
+        list: Names of the extracted entries
+    """
+    if members is None:
+        with zipfile.ZipFile(zip_file_path, "r") as zip_file:
+            members = zip_file.infolist()
+
+    # Create all directories in one pass, so workers never race on makedirs
+    directories = set()
+    files = []
+    for info in members:
+        target_path = get_target_path(output_dir, info.filename)
+        if info.is_dir():
+            directories.add(target_path)
+        else:
+            directories.add(os.path.dirname(target_path))
+            files.append((info, target_path))
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+
+    # Start with the largest entries, so a big file does not end up last on a single thread
+    files.sort(key=lambda item: item[0].file_size, reverse=True)
+
+    total_files = len(files)
+    total_bytes = sum(info.file_size for info, _ in files)
+    done_files = 0
+    done_bytes = 0
+    cancel_event = threading.Event()
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def extract(info, target_path):
+        if cancel_event.is_set():
+            return
+        zip_file = getattr(local, "zip_file", None)
+        if zip_file is None:
+            zip_file = zipfile.ZipFile(zip_file_path, "r")
+            local.zip_file = zip_file
+            with handles_lock:
+                handles.append(zip_file)
+        _extract_entry(zip_file, info, target_path, cancel_event)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers or get_default_workers()) as executor:
+            pending = {
+                executor.submit(extract, info, target_path): info
+                for info, target_path in files
+            }
+            try:
+                while pending:
+                    done, _ = concurrent.futures.wait(
+                        pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        info = pending.pop(future)
+                        future.result()
+                        done_files += 1
+                        done_bytes += info.file_size
+                    if progress_callback:
+                        progress_callback(done_files, total_files, done_bytes, total_bytes)
+                    if is_canceled and is_canceled():
+                        raise ExtractionCanceledException()
+            except BaseException:
+                cancel_event.set()
+                for future in pending:
+                    future.cancel()
+                raise
+    finally:
+        for zip_file in handles:
+            zip_file.close()
+
+    return [info.filename for info in members]
@@ -0,0 +1,191 @@
+import collections
+import concurrent.futures
+import os
+import tempfile
+import time
+import zipfile
+import zlib
+import zip_codecs
+
+# Multi threaded ZIP creation. Files are compressed concurrently into spooled
+# temporary files (kept in memory up to SPOOL_SIZE) and the compressed data is
+# then written to the archive in the original order by the calling thread.
+
+SPOOL_SIZE = 32 * 1024 * 1024  # 32 MB
+READ_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Formats that are already compressed and do not get smaller when compressing them again
+DEFAULT_STORE_EXTENSIONS = [
+    "zip", "7z", "rar", "gz", "pak", "ucas", "utoc", "png", "jpg", "jpeg",
+    "mp4", "mov", "bk2", "bik", "ogg", "mp3"
+]
+
+
+class CompressionCanceledException(Exception):
+    pass
+
+
+class CompressionPolicy:
+    """
+    Decides how a file is compressed based on its extension.
+
+    Args:
+        codec (str): Default codec, one of zip_codecs.CODECS
+        level (int): Compression level of the default codec, None for the codec default
+        store_extensions (list): Extensions (without dot) that are stored uncompressed
+        extension_codecs (dict): Extensions (without dot) mapped to a codec name
+    """
+
+    def __init__(self, codec="deflate", level=None, store_extensions=None, extension_codecs=None):
+        if codec not in zip_codecs.CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        self.codec = codec
+        self.level = level
+        if store_extensions is None:
+            store_extensions = DEFAULT_STORE_EXTENSIONS
+        self.extension_codecs = {
+            ext.lower().lstrip("."): "store" for ext in store_extensions}
+        for ext, ext_codec in (extension_codecs or {}).items():
+            self.extension_codecs[ext.lower().lstrip(".")] = ext_codec
+
+    def get_compression(self, file_path):
+        """Returns (compress_type, level) for a file"""
+        ext = os.path.splitext(file_path)[1].lower().lstrip(".")
+        codec = self.extension_codecs.get(ext, self.codec)
+        level = self.level if codec == self.codec else None
+        return zip_codecs.CODECS[codec], level
+
+    def uses_zstandard(self):
+        return "zstd" in (self.codec, *self.extension_codecs.values())
+
+
+class CompressionStats:
+    def __init__(self):
+        self.files = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+    def throughput(self):
+        """Returns the processed input in MB per second"""
+        if not self.seconds:
+            return 0.0
+        return self.input_bytes / (1024 * 1024) / self.seconds
+
+    def __str__(self):
+        ratio = self.output_bytes / self.input_bytes * 100 if self.input_bytes else 100
+        return (
+            f"Compressed {self.files} files from {self.input_bytes / (1024 * 1024):.1f} MB "
+            f"to {self.output_bytes / (1024 * 1024):.1f} MB ({ratio:.0f}%) "
+            f"in {self.seconds:.1f}s, {self.throughput():.1f} MB/s")
+
+
+def _read_into_spool(file_path, compressor):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    crc = 0
+    size = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            spool.write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        spool.write(compressor.flush())
+    return spool, crc, size
+
+
+def compress_file(file_path, arcname, compress_type, level=None):
+    """
+    Compress a single file for an archive.
+
+    Returns:
+        tuple: (zinfo, spool) with the ZipInfo of the entry and a file object with
+        the compressed data, positioned at the start
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    compressor = zip_codecs.get_compressor(compress_type, level)
+    spool, crc, size = _read_into_spool(file_path, compressor)
+
+    if compressor and spool.tell() >= size:
+        # Incompressible data, store it instead of wasting space on compression overhead
+        spool.close()
+        compress_type = zipfile.ZIP_STORED
+        spool, crc, size = _read_into_spool(file_path, None)
+
+    zinfo.compress_type = compress_type
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = spool.tell()
+    spool.seek(0)
+    return zinfo, spool
+
+
+def write_files(zip_file, files, policy, workers=None, progress_callback=None, is_canceled=None):
+    """
+    Compress files on a thread pool and write them to an archive in order.
+
+    Args:
+        zip_file (ZipFile): Archive opened for writing
+        files (list): List of (file_path, arcname)
+        policy (CompressionPolicy): Decides the codec per file
+        workers (int): Number of threads, defaults to the number of cores
+        progress_callback (callable): Called with (done_files, total_files, arcname)
+        is_canceled (callable): Returns True if the compression should stop
+
+    Returns:
+        CompressionStats: Sizes and duration of the compression
+    """
+    workers = workers or min(32, os.cpu_count() or 4)
+    stats = CompressionStats()
+    start_time = time.perf_counter()
+    total_files = len(files)
+    pending_files = iter(files)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded window of compressed entries in flight, so memory and
+        # temporary disk usage do not grow with the size of the archive
+        queue = collections.deque()
+
+        def submit_next():
+            item = next(pending_files, None)
+            if item is not None:
+                file_path, arcname = item
+                compress_type, level = policy.get_compression(file_path)
+                queue.append(executor.submit(
+                    compress_file, file_path, arcname, compress_type, level))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        try:
+            while queue:
+                future = queue[0]
+                while not future.done():
+                    concurrent.futures.wait([future], timeout=0.1)
+                    if is_canceled and is_canceled():
+                        raise CompressionCanceledException()
+                queue.popleft()
+                zinfo, spool = future.result()
+                with spool:
+                    zip_codecs.write_raw_entry(zip_file, zinfo, spool)
+                stats.files += 1
+                stats.input_bytes += zinfo.file_size
+                stats.output_bytes += zinfo.compress_size
+                submit_next()
+                if progress_callback:
+                    progress_callback(stats.files, total_files, zinfo.filename)
+                if is_canceled and is_canceled():
+                    raise CompressionCanceledException()
+        except BaseException:
+            for future in queue:
+                future.cancel()
+            for future in queue:
+                if not future.cancelled():
+                    try:
+                        future.result()[1].close()
+                    except Exception:
+                        pass
+            raise
+
+    stats.seconds = time.perf_counter() - start_time
+    return stats
@@ -1,284 +1,438 @@
-from typing import cast
 import anchorpoint as ap
 import apsync as aps
 import os
 import subprocess
 import zipfile
-import psutil
 import tempfile
-import platform
+import archive_cache
+import binary_manifest
+import binary_swap
+import build_fingerprint
+import content_store
+import file_locks
+import parallel_unzip
+import remote_zip
+import s3_transfer
+import setup_pipeline
+import storage_backends
+import sync_telemetry
+import tag_index
+import zip_codecs
 
 
 def unzip_and_manage_files(zip_file_path, project_path, progress):
     print(f"Extracting from: {zip_file_path}")
     print(f"To project path: {project_path}")
 
-    ui = ap.UI()
+    def read_entries():
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            return zip_ref.infolist()
 
-    # Check if we're already at the latest state
-    binary_list_path = os.path.join(project_path, "extracted_binaries.txt")
+    def extract(members, output_dir, report, is_canceled):
+        parallel_unzip.extract_members(
+            zip_file_path, output_dir, members,
+            progress_callback=report, is_canceled=is_canceled)
 
-    add_local_settings_to_gitignore(project_path, "extracted_binaries.txt")
+    return extract_and_manage_files(
+        os.path.basename(zip_file_path), read_entries, extract, project_path, progress)
 
-    if os.path.exists(binary_list_path):
-        with open(binary_list_path, 'r') as file:
-            first_line = file.readline().strip()
-            current_zip = os.path.basename(zip_file_path)
-            if first_line == f"Binary sync from {current_zip}":
-                ui.show_info("Binaries up to date",
-                             "Editor Binaries are already at the latest state")
-                progress.finish()
-                return False
 
-    # Delete existing files from previous sync if extracted_binaries.txt exists
-    try:
-        if os.path.exists(binary_list_path):
-            with open(binary_list_path, 'r') as file:
-                # Skip the header lines
-                next(file)  # Skip "Binary sync from..." line
-                next(file)  # Skip separator line
-                for line in file:
-                    file_path = line.strip()
-                    full_path = os.path.join(project_path, file_path)
-                    if os.path.exists(full_path):
-                        os.remove(full_path)
-    except Exception as e:
-        # Check if Unreal Editor is running
-        if is_unreal_running():
-            print("Unreal Editor is running, cannot delete files")
-            ui.show_info("Unreal Editor is running",
-                         "Please close Unreal Engine before proceeding pulling the binaries")
+def stream_and_manage_files(zip_file_name, project_path, progress, backend, cache):
+    print(f"Extracting from: s3://{zip_file_name}")
+    print(f"To project path: {project_path}")
+
+    remote_archive = None
+
+    def read_entries():
+        # Only the central directory at the end of the archive is downloaded here
+        nonlocal remote_archive
+        progress.set_text(f"Reading {zip_file_name} from S3...")
+        remote_archive = remote_zip.RemoteZip(
+            backend.s3_client, backend.bucket_name, zip_file_name)
+        return remote_archive.infolist()
+
+    def extract(members, output_dir, report, is_canceled):
+        if not cache.enabled or not members:
+            remote_archive.extract_members(
+                output_dir, members, backend.workers, backend.part_size,
+                progress_callback=report, is_canceled=is_canceled)
+            return
+
+        # Keep the complete archive in the cache, so switching back to this commit needs no download.
+        # The file is preallocated and filled out of order, so it has its own name and is never
+        # resumed like a .part download, an interrupted one is rewritten from scratch
+        temp_path = cache.get_temp_path(zip_file_name, ".stream")
+        try:
+            remote_archive.extract_members(
+                output_dir, members, backend.workers, backend.part_size,
+                progress_callback=report, is_canceled=is_canceled, archive_path=temp_path)
+        except BaseException:
+            delete_temp_zip(temp_path)
+            raise
+        if is_streamed_archive_complete(temp_path, remote_archive.size):
+            cache.add(zip_file_name, temp_path, remote_archive.etag)
         else:
-            ui.show_error("File Deletion Error",
-                          f"Failed to delete existing binary files: {str(e)}")
+            print(f"The streamed copy of {zip_file_name} is incomplete, it is not cached")
+            delete_temp_zip(temp_path)
+
+    return extract_and_manage_files(
+        zip_file_name, read_entries, extract, project_path, progress)
 
-    # Create a list to store unzipped files
-    unzipped_files = []
+
+def is_streamed_archive_complete(archive_path, size):
+    try:
+        if os.path.getsize(archive_path) != size:
+            return False
+        with zipfile.ZipFile(archive_path, "r") as archive:
+            return all(info.header_offset + info.compress_size <= size for info in archive.infolist())
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def extract_and_manage_files(archive_name, read_entries, extract, project_path, progress):
+    ui = ap.UI()
+
+    # Check if we're already at the latest state
+    add_local_settings_to_gitignore(
+        project_path, binary_manifest.MANIFEST_FILE_NAME)
+
+    previous_source, manifest_entries = binary_manifest.read_manifest(
+        project_path)
+    if binary_manifest.is_up_to_date(project_path, archive_name, previous_source, manifest_entries):
+        ui.show_info("Binaries up to date",
+                     "Editor Binaries are already at the latest state")
+        sync_telemetry.set_run_status("skipped")
+        progress.finish()
+        return False
+
+    # Compare the central directory with the files on disk, so that only
+    # changed entries are extracted and only removed entries are deleted
+    with sync_telemetry.span("compare") as span:
+        infos = read_entries()
+        progress.set_text("Comparing binaries...")
+        to_extract, to_delete, entries = binary_manifest.compute_delta(
+            infos, manifest_entries, project_path)
+        span.add(files=len(entries))
+    print(
+        f"{len(to_extract)} file(s) changed, {len(to_delete)} file(s) removed, "
+        f"{len(entries) - len(to_extract)} file(s) unchanged")
+
+    # Archives pushed with Zstandard compression need the zstandard module
+    if zip_codecs.requires_zstandard(to_extract):
+        try:
+            import zstandard  # noqa: F401 # pyright: ignore[reportMissingImports]
+        except ImportError:
+            ap.get_context().install("zstandard")
 
     # Create a new progress object for extraction
     progress.finish()
-    extraction_progress = ap.Progress(
-        "Extracting Binaries", "Preparing to extract files...", infinite=False)
+    extraction_progress = sync_telemetry.ThrottledProgress(ap.Progress(
+        "Extracting Binaries", "Preparing to extract files...", infinite=False))
     extraction_progress.set_cancelable(True)
 
-    # Unzip the file
-    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        # Get the total number of files to unzip
-        total_files = len(zip_ref.infolist())
-        extraction_progress.set_text("Extracting files...")
-
-        # Extract all files, overwriting existing ones
-        for index, file_info in enumerate(zip_ref.infolist()):
-            # Stop process if cancel was hit by user
-            if extraction_progress.canceled:
-                ui.show_info("Process cancelled")
-                extraction_progress.finish()
-                return False
-
-            zip_ref.extract(file_info, project_path)
-            unzipped_files.append(file_info.filename)
-            extraction_progress.report_progress(
-                (index + 1) / total_files)  # Report the progress
+    extraction_progress.set_text(f"Extracting {len(to_extract)} files...")
+
+    def report(done_files, total_files, done_bytes, total_bytes):
+        extraction_progress.report_progress(
+            done_bytes / total_bytes if total_bytes else done_files / total_files)
+
+    # Extract changed files on all cores into a staging folder, the project is
+    # only touched once all of them are complete
+    staging = create_staging_area(project_path)
+    try:
+        with sync_telemetry.span("extract") as span:
+            extract(to_extract, staging.files_dir, report, lambda: extraction_progress.canceled)
+            span.add(sum(info.file_size for info in to_extract), len(to_extract))
+    except parallel_unzip.ExtractionCanceledException:
+        staging.discard()
+        ui.show_info("Process cancelled")
+        sync_telemetry.set_run_status("canceled")
+        extraction_progress.finish()
+        return False
+    except BaseException:
+        staging.discard()
+        raise
+
+    extraction_progress.set_text("Replacing binaries...")
+    staged_paths = [
+        os.path.relpath(parallel_unzip.get_target_path(staging.files_dir, info.filename), staging.files_dir)
+        for info in to_extract]
+    if not swap_binaries(staging, staged_paths, to_delete):
+        extraction_progress.finish()
+        return False
 
     # Write the list of unzipped files to extracted_binaries.txt
-    with open(binary_list_path, 'w') as f:
-        f.write(f"Binary sync from {os.path.basename(zip_file_path)}\n")
-        f.write("=" * 50 + "\n")
-        for file in sorted(unzipped_files):
-            f.write(f"{file}\n")
+    binary_manifest.write_manifest(project_path, archive_name, entries)
 
     extraction_progress.finish()
     return True  # Indicate success
 
 
-def run_setup(project_path, progress):
+def create_staging_area(project_path):
+    # Roll back an update that was interrupted and remove the staging folders of previous pulls
+    add_local_settings_to_gitignore(
+        project_path, binary_swap.STAGING_DIR.replace(os.sep, "/") + "/")
+    binary_swap.recover(project_path)
+    return binary_swap.StagingArea(project_path)
 
-    # Finish the incoming progress object
-    progress.finish()
+
+def swap_binaries(staging, to_update, to_delete):
+    """Move the staged binaries into the project, returns False if the project was rolled back"""
+    ui = ap.UI()
+    try:
+        with sync_telemetry.span("swap") as span:
+            staging.swap(to_update, to_delete)
+            span.add(files=len(to_update) + len(to_delete))
+        return True
+    except binary_swap.SwapFailedError as e:
+        print(str(e))
+        staging.discard()
+        # Check if Unreal Editor is running
+        if file_locks.is_unreal_running():
+            print("Unreal Editor is running, cannot replace files")
+            ui.show_info("Unreal Editor is running",
+                         "Please close Unreal Engine before proceeding pulling the binaries")
+        else:
+            ui.show_error("File Replace Error",
+                          f"Failed to replace the binary files, no files were changed: {str(e)}")
+        return False
+
+
+def sync_from_content_store(store, manifest, commit_id, project_path, progress):
     ui = ap.UI()
 
+    add_local_settings_to_gitignore(
+        project_path, binary_manifest.MANIFEST_FILE_NAME)
+
+    current_source = f"{commit_id}.json"
+    previous_source, manifest_entries = binary_manifest.read_manifest(
+        project_path)
+    if binary_manifest.is_up_to_date(project_path, current_source, previous_source, manifest_entries):
+        ui.show_info("Binaries up to date",
+                     "Editor Binaries are already at the latest state")
+        sync_telemetry.set_run_status("skipped")
+        progress.finish()
+        return False
+
+    # Only download the objects of files that differ from the files on disk
+    progress.set_text("Comparing binaries...")
+    with sync_telemetry.span("compare") as span:
+        entries = content_store.get_manifest_entries(manifest)
+        to_update, to_delete = binary_manifest.compute_entries_delta(
+            entries, manifest_entries, project_path)
+        span.add(files=len(entries))
+    print(
+        f"{len(to_update)} file(s) changed, {len(to_delete)} file(s) removed, "
+        f"{len(entries) - len(to_update)} file(s) unchanged")
+
+    progress.finish()
+    download_progress = sync_telemetry.ThrottledProgress(ap.Progress(
+        "Downloading Binaries", "Preparing to download files...", infinite=False))
+    download_progress.set_cancelable(True)
+
+    def report(text, done, total):
+        download_progress.set_text(text)
+        download_progress.report_progress(done / total)
+
+    staging = create_staging_area(project_path)
     try:
-        # Create a single progress object for all steps
-        progress = ap.Progress("Setting up Project",
-                               "Checking dependencies...", infinite=True)
-        progress.set_cancelable(True)
-
-        # Step 1: Run GitDependencies.exe
-        git_dependencies_path = os.path.join(
-            project_path, "Engine", "Binaries", "DotNET", "GitDependencies", "win-x64", "GitDependencies.exe")
-        if not os.path.exists(git_dependencies_path):
-            ui.show_error(
-                "Setup Error", "GitDependencies.exe not found. This is required for setting up the project.")
-            progress.finish()
-            return False
+        with sync_telemetry.span("download") as span:
+            content_store.pull_files(store, manifest, to_update, staging.files_dir,
+                                     report, lambda: download_progress.canceled)
+            span.add(sum(entries[path][0] for path in to_update), len(to_update))
+    except content_store.StoreCanceledException:
+        staging.discard()
+        ui.show_info("Process cancelled")
+        sync_telemetry.set_run_status("canceled")
+        download_progress.finish()
+        return False
+    except BaseException:
+        staging.discard()
+        raise
 
-        # Prepare startupinfo to hide the window
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    download_progress.set_text("Replacing binaries...")
+    if not swap_binaries(staging, to_update, to_delete):
+        download_progress.finish()
+        return False
 
-        # Run with --force parameter to avoid prompts
-        process = subprocess.Popen(
-            [
-                git_dependencies_path,
-                "--force",
-                "--exclude=osx64", "--exclude=osx32", "--exclude=TVOS", "--exclude=Mac",
-                "--exclude=mac-arm64", "--exclude=WinRT", "--exclude=Linux", "--exclude=Linux32",
-                "--exclude=Linux64", "--exclude=Unix", "--exclude=OpenVR", "--exclude=GoogleOboe",
-                "--exclude=GooglePlay", "--exclude=GoogleGameSDK", "--exclude=Documentation",
-                "--exclude=Samples", "--exclude=Templates", "--exclude=Android", "--exclude=HTML5",
-                "--exclude=IOS", "--exclude=GoogleVR", "--exclude=GoogleTest", "--exclude=LeapMotion",
-                "--exclude=Dingo", "--exclude=Switch"
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=project_path,
-            startupinfo=startupinfo
-        )
-
-        # Read and print output while checking for cancellation
-        while process.poll() is None:
-            # Check for cancellation
-            if progress.canceled:
-                process.terminate()
-                ui.show_info("Setup cancelled by user")
-                progress.finish()
-                return False
-
-            # Read output
-            output_line = process.stdout.readline()
-            if output_line:
-                # Parse progress percentage if present
-                if "Updating dependencies:" in output_line:
-                    try:
-                        # Extract percentage from strings like "Updating dependencies: 3% (3476/90939)"
-                        percent_str = output_line.split(
-                            "%")[0].split(": ")[1].strip()
-                        # Convert to 0-1 range
-                        percent = float(percent_str) / 100.0
-                        progress.set_text(output_line)
-                        progress.report_progress(percent)
-                    except (IndexError, ValueError) as e:
-                        # If parsing fails, just continue
-                        pass
-
-        # Get final return code
-        if process.returncode != 0:
-            ui.show_error("GitDependencies Error",
-                          "Failed to sync dependencies")
-            progress.finish()
-            return False
+    binary_manifest.write_manifest(project_path, current_source, entries)
 
-        # Step 2: Setup git hooks
-        git_hooks_path = os.path.join(project_path, ".git", "hooks")
-        if os.path.exists(git_hooks_path):
-            progress.set_text("Registering git hooks...")
+    download_progress.finish()
+    return True
 
-            # Create post-checkout hook
-            with open(os.path.join(git_hooks_path, "post-checkout"), 'w') as f:
-                f.write("#!/bin/sh\n")
-                f.write(
-                    "Engine/Binaries/DotNET/GitDependencies/win-x64/GitDependencies.exe\n")
 
-            # Create post-merge hook
-            with open(os.path.join(git_hooks_path, "post-merge"), 'w') as f:
+GIT_DEPENDENCIES_ARGS = [
+    "--force",
+    "--exclude=osx64", "--exclude=osx32", "--exclude=TVOS", "--exclude=Mac",
+    "--exclude=mac-arm64", "--exclude=WinRT", "--exclude=Linux", "--exclude=Linux32",
+    "--exclude=Linux64", "--exclude=Unix", "--exclude=OpenVR", "--exclude=GoogleOboe",
+    "--exclude=GooglePlay", "--exclude=GoogleGameSDK", "--exclude=Documentation",
+    "--exclude=Samples", "--exclude=Templates", "--exclude=Android", "--exclude=HTML5",
+    "--exclude=IOS", "--exclude=GoogleVR", "--exclude=GoogleTest", "--exclude=LeapMotion",
+    "--exclude=Dingo", "--exclude=Switch"
+]
+
+
+def run_setup(project_path, sync_binaries=None):
+    """
+    Set up an engine source build. GitDependencies and the git hooks run at the
+    same time, the prerequisites and the engine registration wait for the files
+    they need. sync_binaries is run as a step next to them, so downloading the
+    binaries does not wait for the dependencies.
+
+    Returns:
+        tuple: (setup_succeeded, result of sync_binaries)
+    """
+    ui = ap.UI()
+
+    # Create a single progress object for all steps
+    progress = sync_telemetry.ThrottledProgress(ap.Progress(
+        "Setting up Project", "Checking dependencies...", infinite=True))
+    progress.set_cancelable(True)
+
+    git_dependencies_path = os.path.join(
+        project_path, "Engine", "Binaries", "DotNET", "GitDependencies", "win-x64", "GitDependencies.exe")
+    if not os.path.exists(git_dependencies_path):
+        ui.show_error(
+            "Setup Error", "GitDependencies.exe not found. This is required for setting up the project.")
+        progress.finish()
+        return False, None
+
+    # Prepare startupinfo to hide the window
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+    def on_git_dependencies_output(output_line):
+        # Parse progress percentage if present
+        if "Updating dependencies:" in output_line:
+            try:
+                # Extract percentage from strings like "Updating dependencies: 3% (3476/90939)"
+                percent_str = output_line.split(
+                    "%")[0].split(": ")[1].strip()
+                # Convert to 0-1 range
+                percent = float(percent_str) / 100.0
+                progress.set_text(output_line)
+                progress.report_progress(percent)
+            except (IndexError, ValueError):
+                # If parsing fails, just continue
+                pass
+
+    def git_dependencies(cancel_event):
+        # Run with --force parameter to avoid prompts
+        returncode = setup_pipeline.run_process(
+            [git_dependencies_path, *GIT_DEPENDENCIES_ARGS], project_path,
+            cancel_event, on_git_dependencies_output, startupinfo)
+        if returncode != 0:
+            raise setup_pipeline.StepFailedError("Failed to sync dependencies")
+        print("Dependencies synced successfully")
+
+    def git_hooks(cancel_event):
+        git_hooks_path = os.path.join(project_path, ".git", "hooks")
+        if not os.path.exists(git_hooks_path):
+            return
+
+        # Create post-checkout and post-merge hooks
+        for hook in ("post-checkout", "post-merge"):
+            with open(os.path.join(git_hooks_path, hook), 'w') as f:
                 f.write("#!/bin/sh\n")
                 f.write(
                     "Engine/Binaries/DotNET/GitDependencies/win-x64/GitDependencies.exe\n")
 
-            print("Git hooks registered successfully")
-
-        # Check for cancellation
-        if progress.canceled:
-            ui.show_info("Setup cancelled by user")
-            progress.finish()
-            return False
+        print("Git hooks registered successfully")
 
-        # Step 3: Install prerequisites
+    def prerequisites(cancel_event):
+        # The installer is one of the files synced by GitDependencies
         prereq_path = os.path.join(
             project_path, "Engine", "Extras", "Redist", "en-us", "UEPrereqSetup_x64.exe")
-        if os.path.exists(prereq_path):
-            progress.set_text(
-                "Installing prerequisites. Make sure to accept the UAC prompt...")
-
-            # Prepare special startupinfo to suppress UAC dialog as much as possible
-            uac_startupinfo = None
-            if os.name == 'nt':
-                uac_startupinfo = subprocess.STARTUPINFO()
-                uac_startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                # Use SW_HIDE to hide the window
-                uac_startupinfo.wShowWindow = 0  # SW_HIDE
-
-            # Run the prerequisites installer with maximum silent flags
-            try:
-                # Try to run with administrator privileges without showing UAC prompt
-                process = subprocess.Popen(
-                    [prereq_path, "/quiet", "/norestart",
-                        "/SILENT", "/SUPPRESSMSGBOXES"],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    cwd=project_path,
-                    startupinfo=uac_startupinfo
-                )
-
-                # Wait for completion with cancellation support
-                while process.poll() is None:
-                    if progress.canceled:
-                        process.terminate()
-                        ui.show_info("Setup cancelled by user")
-                        progress.finish()
-                        return False
-
-                print("Prerequisites installed successfully")
-
-            except Exception as e:
-                print(
-                    f"Warning: Prerequisites installation encountered an issue: {str(e)}")
-                print("Continuing with next steps...")
-                # Continue anyway as this may not be critical
-
-        # Check for cancellation
-        if progress.canceled:
-            ui.show_info("Setup cancelled by user")
-            progress.finish()
-            return False
+        if not os.path.exists(prereq_path):
+            return
+        progress.set_text(
+            "Installing prerequisites. Make sure to accept the UAC prompt...")
+
+        # Prepare special startupinfo to suppress UAC dialog as much as possible
+        uac_startupinfo = None
+        if os.name == 'nt':
+            uac_startupinfo = subprocess.STARTUPINFO()
+            uac_startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            # Use SW_HIDE to hide the window
+            uac_startupinfo.wShowWindow = 0  # SW_HIDE
 
-        # Step 4: Register engine installation
+        # Run the prerequisites installer with maximum silent flags
+        try:
+            setup_pipeline.run_process(
+                [prereq_path, "/quiet", "/norestart", "/SILENT", "/SUPPRESSMSGBOXES"],
+                project_path, cancel_event, startupinfo=uac_startupinfo)
+            print("Prerequisites installed successfully")
+        except setup_pipeline.SetupCanceledException:
+            raise
+        except Exception as e:
+            # Continue anyway as this may not be critical
+            print(
+                f"Warning: Prerequisites installation encountered an issue: {str(e)}")
+
+    def register_engine(cancel_event):
         version_selector_path = os.path.join(
             project_path, "Engine", "Binaries", "Win64", "UnrealVersionSelector-Win64-Shipping.exe")
-        if os.path.exists(version_selector_path):
-            progress.set_text("Registering engine installation...")
-
-            # Register the engine
-            process = subprocess.Popen(
-                [version_selector_path, "/register", "/unattended"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=project_path,
-                startupinfo=startupinfo
-            )
-
-            # Wait for completion with cancellation support
-            while process.poll() is None:
-                if progress.canceled:
-                    process.terminate()
-                    ui.show_info("Setup cancelled by user")
-                    progress.finish()
-                    return False
-
-            print("Engine registered successfully")
-
-        progress.set_text("Setup completed successfully")
-        progress.finish()
-        return True
+        if not os.path.exists(version_selector_path):
+            return
+        progress.set_text("Registering engine installation...")
+        setup_pipeline.run_process(
+            [version_selector_path, "/register", "/unattended"],
+            project_path, cancel_event, startupinfo=startupinfo)
+        print("Engine registered successfully")
+
+    def timed(name, function, dependencies=None):
+        # The binaries step is not wrapped, it measures its own phases
+        def run(cancel_event):
+            with sync_telemetry.span("setup", step=name):
+                function(cancel_event)
+        return setup_pipeline.Step(name, run, dependencies)
+
+    binaries_result = [None]
+
+    def binaries(cancel_event):
+        binaries_result[0] = sync_binaries()
+
+    # The version selector is synced by GitDependencies or is part of the binaries
+    register_dependencies = ["GitDependencies"]
+    steps = [
+        timed("GitDependencies", git_dependencies),
+        timed("Git hooks", git_hooks),
+        timed("Prerequisites", prerequisites, ["GitDependencies"]),
+    ]
+    if sync_binaries:
+        steps.append(setup_pipeline.Step("Binaries", binaries))
+        register_dependencies.append("Binaries")
+    steps.append(timed(
+        "Register engine", register_engine, register_dependencies))
+
+    results = setup_pipeline.run_steps(steps, lambda: progress.canceled)
+    progress.finish()
 
-    except Exception as e:
-        ui.show_error("Setup Error", str(e))
-        return False
+    succeeded = True
+    for name, error in results.items():
+        if error is None or isinstance(error, setup_pipeline.StepSkippedError):
+            continue
+        succeeded = False
+        if isinstance(error, setup_pipeline.SetupCanceledException):
+            continue
+        print(f"Setup step {name} failed: {str(error)}")
+        if name == "GitDependencies":
+            ui.show_error("GitDependencies Error", str(error))
+        elif name == "Binaries":
+            ui.show_error("Sync failed", str(error))
+        else:
+            ui.show_error("Setup Error", str(error))
+    if any(isinstance(error, setup_pipeline.SetupCanceledException) for error in results.values()):
+        ui.show_info("Setup cancelled by user")
+        sync_telemetry.set_run_status("canceled")
+    elif not succeeded:
+        # A failed setup step fails the pull, even if the binaries were up to date
+        sync_telemetry.set_run_status("failed")
+
+    return succeeded, binaries_result[0]
 
 
 def add_local_settings_to_gitignore(project_path, file):
@@ -299,11 +453,25 @@ def add_local_settings_to_gitignore(project_path, file):
         print(f"Failed to update .git/info/exclude: {str(e)}")
 
 
-def is_unreal_running():
-    print("Checking if Unreal Editor is running by process name...")
+def check_binaries_in_use(project_path, manifest_entries):
+    """Returns True if none of the previously synced binaries is held open by another process"""
+    ui = ap.UI()
+    with sync_telemetry.span("lock check") as span:
+        locked_files = file_locks.find_locked_files(project_path, list(manifest_entries))
+        span.add(files=len(manifest_entries))
+    if not locked_files:
+        return True
 
-    # Check all running processes for UnrealEditor.exe
-    return "UnrealEditor.exe" in (p.name() for p in psutil.process_iter())
+    for locked_file in locked_files[:10]:
+        print(f"File in use: {locked_file}")
+    if file_locks.is_unreal_running():
+        print("Unreal Editor is running, cannot replace files")
+        ui.show_info("Unreal Editor is running",
+                     "Please close Unreal Engine before proceeding pulling the binaries")
+    else:
+        ui.show_info("Binaries in use",
+                     f"{len(locked_files)} binaries are opened by another application. Close it and pull again.")
+    return False
 
 
 def find_uproject_files(project_path):
@@ -335,95 +503,24 @@ def find_uproject_files(project_path):
     return uproject_files
 
 
-def get_git_executable():
-    application_dir = ap.get_application_dir()
-    git_path = None
-    if platform.system() == "Windows":
-        git_path = os.path.join(application_dir, "plugins", "git")
-        git_exe = os.path.join(git_path, "cmd", "git.exe")
-    elif platform.system() == "Darwin":
-        git_path = os.path.join(application_dir, "..", "Resources", "git")
-        git_exe = os.path.join(git_path, "bin", "git")
-    else:
-        raise RuntimeError("Unsupported Platform")
-
-    if (git_path):
-        return os.path.normpath(git_exe)
-    else:
-        return "git"  # Fallback to system git that is installed on the system
-
-
-def get_commit_history(project_path):
+def get_matching_commit_id(project_path, tag_pattern):
     ui = ap.UI()
-    commit_history = []
-    max_depth = 200
     try:
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        # Use bundled git instead of system git
-        git_exe = get_git_executable()
-
-        current_commit = subprocess.check_output(
-            [git_exe, 'rev-parse', 'HEAD'],
-            cwd=project_path,
-            text=True,
-            startupinfo=startupinfo
-        ).strip()
-
-        print(f"Current commit: {current_commit}")
-        print(f"Maximum depth: {max_depth} commits")
-
-        # Get commit history with tags
-        commit_history = subprocess.check_output(
-            [git_exe, 'log', '--pretty=format:%H %d', f'-{max_depth}'],
-            cwd=project_path,
-            text=True,
-            startupinfo=startupinfo
-        ).splitlines()
-
-        print(f"Found {len(commit_history)} commits to check\n")
-
+        commit_id, matching_tag = tag_index.find_matching_commit(
+            project_path, tag_pattern)
     except subprocess.CalledProcessError as e:
         ui.show_error(
             "Git Error", f"Failed to retrieve commit information: {str(e)}")
-        return None
-    return commit_history
-
-
-def get_matching_commit_id(commit_history, tag_pattern):
-    ui = ap.UI()
-    if not commit_history:
-        print("\nNo commits found in history")
-        ui.show_error("No commits found", "Failed to retrieve commit history")
         return None, None
 
-    # Process commits starting from current
-    for commit_line in commit_history:
-        parts = commit_line.split()
-        commit_id = parts[0]
-        tags = [tag.strip('()') for tag in parts[1:]] if len(parts) > 1 else []
-
-        print(f"\nChecking commit: {commit_id}")
-        if tags:
-            print(f"Tags: {', '.join(tags)}")
-        else:
-            print("No tags found")
-
-        # Check if any tag matches our pattern
-        matching_tag = next((tag for tag in tags if tag_pattern in tag), None)
-
-        if matching_tag:
-            print(f"Found matching tag: {matching_tag}")
-            return commit_id, matching_tag
+    if commit_id is None:
+        print("\nNo matching binaries found in the search")
+        ui.show_info("No compatible tag found",
+                     f"No tag found in your local commits with tag pattern '{tag_pattern}'")
+        return None, None
 
-    # If no matching tag was found
-    print("\nNo matching binaries found in the search")
-    ui.show_info("No compatible tag found",
-                 f"No tag found in your local commits with tag pattern '{tag_pattern}'")
-    return None, None
+    print(f"Found matching tag: {matching_tag} on commit {commit_id}")
+    return commit_id, matching_tag
 
 
 def launch_editor(project_path, launch_project_path):
@@ -445,85 +542,70 @@ def launch_editor(project_path, launch_project_path):
                          f"Failed to launch project: {str(e)}")
 
 
-def get_s3_credentials(ctx):
+def get_backend(ctx):
+    """Returns the backend of the binary location, None if the S3 credentials are missing"""
     shared_settings = aps.SharedSettings(
         ctx.workspace_id, "unreal_binary_sync")
+    return storage_backends.create_backend(
+        shared_settings, aps.Settings(), ctx.project_path, ctx.install)
 
-    access_key = shared_settings.get("access_key", "")
-    secret_key = shared_settings.get("secret_key", "")
-    endpoint_url = shared_settings.get("endpoint_url", "")
-    bucket_name = shared_settings.get("bucket_name", "")
-    if not all([access_key, secret_key, endpoint_url, bucket_name]):
-        return False
-    return access_key, secret_key, endpoint_url, bucket_name
+
+def get_archive_cache(ctx):
+    local_settings = aps.Settings()
+    max_size = archive_cache.parse_max_size(local_settings.get(
+        ctx.project_path + "_archive_cache_gb", archive_cache.DEFAULT_MAX_SIZE_GB))
+    return archive_cache.ArchiveCache(archive_cache.get_default_cache_dir(), max_size)
 
 
-def download_from_s3(zip_file_name, progress, ctx):
+def download_archive(zip_file_name, progress, backend, cache):
     ui = ap.UI()
-    try:
-        import boto3  # pyright: ignore[reportMissingImports]
-    except ImportError:
-        ctx.install("boto3")
-        import boto3  # pyright: ignore[reportMissingImports]
 
-    creds = get_s3_credentials(ctx)
-    if not creds:
-        ui.show_error("S3 Credentials Missing",
-                      "Please check your S3 settings in the action configuration.")
-        return None
-    access_key, secret_key, endpoint_url, bucket_name = creds
+    # Download into the archive cache, or to the temp folder if the cache is disabled
+    if cache.enabled:
+        local_zip_file_path = cache.get_temp_path(zip_file_name)
+    else:
+        local_zip_file_path = os.path.join(tempfile.gettempdir(), zip_file_name)
 
-    # Download to Windows temp folder
-    temp_dir = tempfile.gettempdir()
-    local_zip_file_path = os.path.join(temp_dir, zip_file_name)
+    try:
+        head = backend.head(zip_file_name)
+        if head is None:
+            print(f"{zip_file_name} not found in the {backend.name} binary location")
+            progress.finish()
+            return None
 
-    # Check if zip file already exists in temp
-    if os.path.exists(local_zip_file_path):
-        print(
-            f"Zip file already exists at {local_zip_file_path}, skipping download")
-        progress.report_progress(1.0)
-        return local_zip_file_path
+        # A file that is already there is never trusted by its size. The backend keeps
+        # its own .part file with the version it belongs to and resumes from that
+        progress.set_text(f"Downloading {zip_file_name} from {backend.name}...")
+        progress.report_progress(0.0)
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=endpoint_url
-    )
+        def download_callback(downloaded, total_size):
+            progress.report_progress(
+                min(downloaded / total_size, 1.0) if total_size else 1.0)
 
-    try:
-        # Get the size of the file to download
-        obj = s3_client.head_object(Bucket=bucket_name, Key=zip_file_name)
-        total_size = obj['ContentLength']
-        progress.set_text(f"Downloading {zip_file_name} from S3...")
-        progress.report_progress(0.0)
+        with sync_telemetry.span("download", backend=backend.name) as span:
+            backend.download_file(
+                zip_file_name, local_zip_file_path, download_callback, lambda: progress.canceled)
+            span.add(head["size"], 1)
+        print(f"Downloaded {zip_file_name} from {backend.name} to {local_zip_file_path}")
 
-        # Download with progress reporting
-        with open(local_zip_file_path, 'wb') as f:
-            response = s3_client.get_object(
-                Bucket=bucket_name, Key=zip_file_name)
-            chunk_size = 1024 * 1024  # 1 MB
-            downloaded = 0
-            for chunk in response['Body'].iter_chunks(chunk_size):
-                if progress.canceled:
-                    progress.finish()
-                    print("Download cancelled by user")
-                    return None
-                f.write(chunk)
-                downloaded += len(chunk)
-                percent = min(downloaded / total_size, 1.0)
-                progress.report_progress(percent)
-        print(f"Downloaded {zip_file_name} from S3 to {local_zip_file_path}")
-        progress.finish()
+        if cache.enabled:
+            local_zip_file_path = cache.add(
+                zip_file_name, local_zip_file_path, head["etag"])
+        progress.report_progress(1.0)
         return local_zip_file_path
+    except s3_transfer.TransferCanceledException:
+        print("Download cancelled by user, the download continues on the next pull")
+        sync_telemetry.set_run_status("canceled")
+        progress.finish()
+        return None
     except ValueError as e:
         if "Invalid endpoint" in str(e):
             ui.show_error("Your endpoint is not set correctly")
-        print(f"Failed to download {zip_file_name} from S3: {str(e)}")
+        print(f"Failed to download {zip_file_name}: {str(e)}")
         progress.finish()
         return None
     except Exception as e:
-        print(f"Failed to download {zip_file_name} from S3: {str(e)}")
+        print(f"Failed to download {zip_file_name}: {str(e)}")
         progress.finish()
         return None
 
@@ -538,16 +620,28 @@ def delete_temp_zip(local_zip_file_path):
 
 
 def pull_binaries_async(sync_dependencies, launch_project_path, ctx):
+    shared_settings = aps.SharedSettings(
+        ctx.workspace_id, "unreal_binary_sync")
+    sync_telemetry.start_run(
+        "pull", location=shared_settings.get("binary_location_type", "folder"),
+        setup=bool(sync_dependencies))
+    synced = False
+    try:
+        synced = pull_project(sync_dependencies, launch_project_path, ctx)
+    finally:
+        sync_telemetry.finish_run("ok" if synced else "failed")
+
 
+def pull_project(sync_dependencies, launch_project_path, ctx):
+    """Sync the binaries and set up the project, returns True if binaries were synced"""
     ui = ap.UI()
 
-    local_settings = aps.Settings()
     shared_settings = aps.SharedSettings(
         ctx.workspace_id, "unreal_binary_sync")
 
     # Start the progress
-    progress = ap.Progress(
-        "Syncing Binaries", "Initializing...", infinite=True)
+    progress = sync_telemetry.ThrottledProgress(ap.Progress(
+        "Syncing Binaries", "Initializing...", infinite=True))
     progress.set_cancelable(True)
 
     # Check for tag_pattern if needed
@@ -556,78 +650,172 @@ def pull_binaries_async(sync_dependencies, launch_project_path, ctx):
     # Get project path before closing dialog
     project_path = ctx.project_path
 
-    commit_history = get_commit_history(project_path)
-    if commit_history is None:
-        print("Failed to get commit history")
-        progress.finish()
-        return
-
-    matching_commit_id, matching_tag = get_matching_commit_id(
-        commit_history, tag_pattern)
+    with sync_telemetry.span("resolve"):
+        matching_commit_id, matching_tag = get_matching_commit_id(
+            project_path, tag_pattern)
     if matching_commit_id is None:
         print("No matching commit ID found")
         progress.finish()
-        return
+        return False
 
-    # Run the setup script if enabled
+    def sync():
+        return sync_binaries(ctx, project_path, matching_commit_id, matching_tag, progress)
+
+    # Run the setup script if enabled, the binaries are synced at the same time
     if sync_dependencies:
-        print(
-            f"{'Run setup script' if sync_dependencies else 'Skip setup script'}")
-        if not run_setup(project_path, progress):
+        print("Run setup script")
+        setup_succeeded, synced_message = run_setup(project_path, sync)
+        if not setup_succeeded:
             print("Setup script failed or was cancelled")
             progress.finish()
-            return
+            return False
+    else:
+        try:
+            synced_message = sync()
+        except Exception as e:
+            ui.show_error("Sync failed", str(e))
+            return False
+
+    if not synced_message:
+        return False  # Already up to date, canceled or failed
+
+    # Launch the selected uproject file if one was selected
+    if launch_project_path:
+        launch_editor(project_path, launch_project_path)
+    else:
+        ui.show_success("Binaries synced", synced_message)
+    return True
+
+
+def sync_binaries(ctx, project_path, matching_commit_id, matching_tag, progress):
+    """
+    Sync the binaries of the matching commit into the project.
+
+    Returns:
+        str: Message for the user if binaries were synced, None if they were
+        already up to date or the sync was canceled or failed
+    """
+    ui = ap.UI()
+    shared_settings = aps.SharedSettings(
+        ctx.workspace_id, "unreal_binary_sync")
+
+    backend = get_backend(ctx)
+    if not backend:
+        ui.show_error("S3 Credentials Missing",
+                      "Please check your S3 settings in the action configuration.")
+        progress.finish()
+        return None
+
+    # Commits pushed without source changes point to the archive of the commit
+    # that was built, the manifest names that archive as its source
+    archive_commit_id = matching_commit_id
+    try:
+        archive_commit_id = build_fingerprint.resolve_archive_commit(
+            backend, matching_commit_id)
+    except Exception as e:
+        print(f"Could not read the binary alias: {str(e)}")
+
+    # Compare the local manifest with the files on disk before anything is downloaded
+    previous_source, manifest_entries = binary_manifest.read_manifest(
+        project_path)
+    if binary_manifest.get_source_commit(previous_source) in (matching_commit_id, archive_commit_id):
+        drifted_files = binary_manifest.find_drifted_files(
+            project_path, manifest_entries)
+        if not drifted_files:
+            ui.show_info("Binaries up to date",
+                         "Editor Binaries are already at the latest state")
+            sync_telemetry.set_run_status("skipped")
+            progress.finish()
+            return None
+        # Only the files that were modified or deleted are restored
+        print(
+            f"{len(drifted_files)} binaries were modified or deleted since the last sync, repairing them")
+
+    # Tell the user about files held open by the editor before anything is downloaded
+    progress.set_text("Checking for binaries in use...")
+    if not check_binaries_in_use(project_path, manifest_entries):
+        progress.finish()
+        return None
+
+    # Binaries pushed to the deduplicated store come with a manifest per commit,
+    # older pushes and pushes in ZIP format fall back to the ZIP file
+    try:
+        manifest = content_store.get_manifest(backend, matching_commit_id)
+    except Exception as e:
+        print(f"Could not read the binary store manifest: {str(e)}")
+        manifest = None
+
+    if manifest:
+        print(f"Sync binaries from {matching_tag} using the file store")
+        if not sync_from_content_store(backend, manifest, matching_commit_id, project_path, progress):
+            return None
+        return f"Files synced from {matching_tag}"
 
     # Found a matching tag, check for zip file
-    zip_file_name = f"{matching_commit_id}.zip"
+    if archive_commit_id != matching_commit_id:
+        print(f"Binaries of {matching_tag} were pushed with commit {archive_commit_id}")
+    zip_file_name = f"{archive_commit_id}.zip"
+
+    # Archives on a shared folder are extracted in place, all others are downloaded
+    local_zip_file_path = backend.local_path(zip_file_name)
+    cache = get_archive_cache(ctx)
+    cached_zip_path = None
+    if local_zip_file_path is None and cache.enabled:
+        # An archive that was pushed again under the same name has a new ETag,
+        # the cached copy is only used if it is the current version
+        try:
+            head = backend.head(zip_file_name)
+        except Exception as e:
+            print(f"Could not check {zip_file_name} on {backend.name}, using the cached archive: {str(e)}")
+            cached_zip_path = cache.get(zip_file_name)
+        else:
+            if head is None:
+                ui.show_error("No compatible Zip file found")
+                print(f"{zip_file_name} not found in the {backend.name} binary location")
+                progress.finish()
+                return None
+            cached_zip_path = cache.get(zip_file_name, head["etag"])
 
-    binary_location_type = shared_settings.get(
-        "binary_location_type", "folder")
+    if isinstance(backend, storage_backends.S3Backend) and not cached_zip_path and shared_settings.get("s3_streaming_download", True):
+        # Extract the entries while their byte ranges are downloading
+        print(f"Extract binaries from {matching_tag} while downloading")
+        if not stream_and_manage_files(zip_file_name, project_path, progress, backend, cache):
+            return None
+        return f"Files extracted from {matching_tag}"
 
     zip_file_path = ""
-    if binary_location_type == "s3":
-        # Download the zip file from S3
-        zip_file_path = download_from_s3(zip_file_name, progress, ctx)
+    if local_zip_file_path:
+        zip_file_path = local_zip_file_path
+    elif cached_zip_path:
+        # Archives of recently synced commits are extracted without downloading them again
+        print(f"Using cached archive {cached_zip_path}")
+        zip_file_path = cached_zip_path
+    else:
+        # Download the zip file from S3 or the LAN cache
+        zip_file_path = download_archive(zip_file_name, progress, backend, cache)
         if not zip_file_path:
-            print("Failed to download zip file from S3")
+            print(f"Failed to download zip file from {backend.name}")
             progress.finish()
-            return
-    else:
-        source_path = cast(
-            str, local_settings.get(ctx.project_path + "_binary_source", "")
-        )
-        zip_file_path = os.path.join(source_path, zip_file_name)
+            return None
 
     if not os.path.exists(zip_file_path):
         ui.show_error("No compatible Zip file found")
         print(f"Zip file not found: {zip_file_path}")
         progress.finish()
-        return
+        return None
 
     print(f"Found matching zip file: {zip_file_path}")
 
     print(f"Extract binaries from {matching_tag}")
 
-    try:
-        unzip = unzip_and_manage_files(zip_file_path, project_path, progress)
-        if not unzip:
-            return  # If extraction was canceled or failed
+    if not unzip_and_manage_files(zip_file_path, project_path, progress):
+        return None  # If extraction was canceled or failed
 
-        if binary_location_type == "s3":
-            # Clean up the downloaded temp zip file
-            delete_temp_zip(zip_file_path)
+    if local_zip_file_path is None and not cache.enabled:
+        # Clean up the downloaded temp zip file
+        delete_temp_zip(zip_file_path)
 
-        # Launch the selected uproject file if one was selected
-        if launch_project_path:
-            launch_editor(project_path, launch_project_path)
-        else:
-            ui.show_success(
-                "Binaries synced", f"Files extracted from {matching_tag.replace(",", "")}")
-        return
-
-    except Exception as e:
-        ui.show_error("Extraction failed", str(e))
-        return
+    return f"Files extracted from {matching_tag}"
 
 
 def pull(ctx: ap.Context, silent=False):
@@ -654,7 +842,7 @@ def pull(ctx: ap.Context, silent=False):
     binary_source = local_settings.get(project_path+"_binary_source", "")
 
     # check if S3 credentials are set when using S3 and a folder is set when using folder
-    if binary_location_type == "s3" and get_s3_credentials(ctx) is False:
+    if binary_location_type == "s3" and storage_backends.get_s3_credentials(shared_settings) is None:
         ui.show_error("S3 Credentials Missing",
                       "Please check your S3 settings in the action configuration or inform your workspace admin.")
         return
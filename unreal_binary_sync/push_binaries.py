@@ -6,12 +6,37 @@ import zipfile
 import anchorpoint as ap
 import apsync as aps
 from pathlib import Path
-import re
-import platform
+import binaries_scan
+import build_fingerprint
+import build_matrix
+import content_store
+import git_helper
+import s3_transfer
+import storage_backends
+import sync_telemetry
+import parallel_zip
+import zip_codecs
+
+
+def compile_binaries(engine_dir, project_dir, project_name, build_jobs, progress):
+    """
+    Compile the build matrix with UnrealBuildTool.
 
+    Args:
+        engine_dir (Path): Path to the engine installation
+        project_dir (Path): Path to the project directory
+        project_name (str): Name of the project
+        build_jobs (list): build_matrix.BuildJob for every target and configuration
 
-def compile_binaries(engine_dir, project_dir, project_name, editor_target, progress):
-    ui = ap.UI()
+    Returns:
+        list: build_matrix.BuildResult for every job
+
+    Raises:
+        build_matrix.BuildFailedError: If a build failed or was canceled
+    """
+    ctx = ap.get_context()
+    shared_settings = aps.SharedSettings(
+        ctx.workspace_id, "unreal_binary_sync")
 
     print(
         f"Compiling Binaries for project {project_name} at {project_dir}, using Engine at {engine_dir}")
@@ -25,131 +50,60 @@ def compile_binaries(engine_dir, project_dir, project_name, editor_target, progr
 
     # Verify paths exist
     if not unreal_build_tool.exists():
-        print(
-            f"Error: UnrealBuildTool not found at {unreal_build_tool}", file=sys.stderr)
-        ui.show_error("UnrealBuildTool not found",
-                      "Check the console for more information")
-        sys.exit(1)
+        raise build_matrix.BuildFailedError(
+            f"UnrealBuildTool not found at {unreal_build_tool}")
 
     if not project_file.exists():
-        print(
-            f"Error: Project file not found at {project_file}", file=sys.stderr)
-        ui.show_error("Project file not found",
-                      "Check the console for more information")
-        sys.exit(1)
-
-    # Build the command
-    cmd = [
-        str(unreal_build_tool),
-        "Development",
-        "Win64",
-        editor_target,
-        f"-project={project_file}",
-        "-useprecompiled"
-    ]
-    progress.set_text("Compiling, see console for details...")
-
-    try:
-        # Execute the command and stream output line by line to the current console
-        # Hide the window on Windows by setting creationflags
-        creationflags = 0
-        if os.name == "nt":
-            creationflags = subprocess.CREATE_NO_WINDOW
-
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            creationflags=creationflags
-        )
-        # Stream each non-empty line to the console
-        for line in process.stdout:  # pyright: ignore[reportOptionalIterable]
-            if line.strip():  # Only print non-empty lines
-                print(line)
-        process.wait()
-        if process.returncode == 0:
-            print(
-                f"Build completed successfully with exit code {process.returncode}")
-        else:
-            raise subprocess.CalledProcessError(process.returncode, cmd)
-
-    except subprocess.CalledProcessError as e:
-        print(f"Build failed with exit code {e.returncode}", file=sys.stderr)
-        ui.show_error("Cannot create the build",
-                      "Check the console for more information")
-        sys.exit(e.returncode)
-
-    except FileNotFoundError:
-        print(f"Error: Could not execute {unreal_build_tool}", file=sys.stderr)
-        ui.show_error("UnrealBuildTool not found",
-                      "Check the console for more information")
-        sys.exit(1)
-
-
-def get_git_executable():
-    application_dir = ap.get_application_dir()
-    git_path = None
-    if platform.system() == "Windows":
-        git_path = os.path.join(application_dir, "plugins", "git")
-        git_exe = os.path.join(git_path, "cmd", "git.exe")
-    elif platform.system() == "Darwin":
-        git_path = os.path.join(application_dir, "..", "Resources", "git")
-        git_exe = os.path.join(git_path, "bin", "git")
-    else:
-        raise RuntimeError("Unsupported Platform")
+        raise build_matrix.BuildFailedError(
+            f"Project file not found at {project_file}")
 
-    if (git_path):
-        return os.path.normpath(git_exe)
-    else:
-        return "git"  # Fallback to system git that is installed on the system
+    concurrency = build_matrix.parse_concurrency(
+        shared_settings.get("build_concurrency", 1))
+    log_dir = project_dir / "Saved" / "Logs" / "AnchorpointBinarySync"
+    print(
+        f"Building {', '.join(job.name for job in build_jobs)} with up to {concurrency} build(s) at a time")
+    progress.set_text(
+        f"Compiling {len(build_jobs)} build(s), see console for details...")
+
+    def on_output(job, line):
+        # Prefix the lines, as the output of parallel builds is interleaved
+        print(f"[{job.name}] {line}" if len(build_jobs) > 1 else line)
+
+    with sync_telemetry.span("compile", jobs=len(build_jobs), concurrency=concurrency):
+        try:
+            results = build_matrix.run_builds(
+                unreal_build_tool, project_file, build_jobs, concurrency, log_dir,
+                on_output, lambda: progress.canceled)
+        except OSError as e:
+            raise build_matrix.BuildFailedError(
+                f"Could not execute {unreal_build_tool}: {str(e)}")
+
+        for result in results:
+            print(result)
+        failed = [result.job.name for result in results if not result.succeeded]
+        if failed:
+            raise build_matrix.BuildFailedError(
+                f"Build of {', '.join(failed)} did not succeed")
+    return results
 
 
 def add_incremental_git_tag(project_dir, tag_pattern):
     tag_prefix = tag_pattern+"-"
-    highest_number = 0
 
     # Use bundled git instead of system git
-    git_exe = get_git_executable()
+    git_exe = git_helper.get_git_executable()
+
+    with sync_telemetry.span("tag"):
+        create_incremental_git_tag(project_dir, tag_prefix, git_exe)
 
+
+def create_incremental_git_tag(project_dir, tag_prefix, git_exe):
     try:
-        # Get all tags and their commit hashes
-        result = subprocess.run(
-            [git_exe, 'tag', '--list', f'{tag_prefix}*'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        tags = result.stdout.strip().splitlines()
-
-        # Find highest Game-NUMBER tag
-        for tag in tags:
-            match = re.match(rf"{tag_prefix}(\d+)$", tag)
-            if match:
-                num = int(match.group(1))
-                if num > highest_number:
-                    highest_number = num
-
-        # Get the latest commit hash
-        result_commit = subprocess.run(
-            [git_exe, 'rev-parse', 'HEAD'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        latest_commit = result_commit.stdout.strip()
-
-        # Get tags pointing to the latest commit
-        result_tags_on_commit = subprocess.run(
-            [git_exe, 'tag', '--points-at', latest_commit],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        tags_on_commit = result_tags_on_commit.stdout.strip().splitlines()
+        latest_commit = git_helper.read_head_commit(project_dir, git_exe)
+
+        # The next tag number and the tags on the latest commit come from one query
+        new_tag, tags_on_commit = git_helper.get_tag_numbering(
+            project_dir, tag_prefix, latest_commit, git_exe)
 
         # If the latest commit already has a tag, skip tagging
         if tags_on_commit:
@@ -157,48 +111,20 @@ def add_incremental_git_tag(project_dir, tag_pattern):
                 f"Latest commit already has tag(s): {tags_on_commit}. Skipping tag creation.")
             return
 
-        # If no tags found, start with 1
-        if highest_number == 0:
-            new_tag = f"{tag_prefix}1"
-        else:
-            new_tag = f"{tag_prefix}{highest_number + 1}"
-
-        # Tag the latest commit
-        subprocess.run(
-            [git_exe, 'tag', new_tag],
-            cwd=project_dir,
-            check=True
-        )
+        # Tag the latest commit and push the tag to the remote repository
+        git_helper.create_and_push_tag(project_dir, new_tag, latest_commit, git_exe)
         print(f"Added new git tag: {new_tag}")
-
-        # Push the tag to the remote repository
-        subprocess.run(
-            [git_exe, 'push', 'origin', new_tag],
-            cwd=project_dir,
-            check=True
-        )
         print(f"Pushed tag {new_tag} to remote repository")
 
     except subprocess.CalledProcessError as e:
-        print(f"Error adding git tag: {e}", file=sys.stderr)
+        print(f"Error adding git tag: {e} {e.stderr or ''}", file=sys.stderr)
     except Exception as e:
         print(f"Unexpected error: {e}", file=sys.stderr)
 
 
 def get_git_commit_id(project_dir):
-    # Use bundled git instead of system git
-    git_exe = get_git_executable()
-
     try:
-        # Run git command to get the full commit hash
-        result = subprocess.run(
-            [git_exe, 'rev-parse', 'HEAD'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        commit_id = result.stdout.strip()
+        commit_id = git_helper.read_head_commit(project_dir)
         print(f"Latest commit ID: {commit_id}")
         return commit_id
     except subprocess.CalledProcessError:
@@ -230,32 +156,141 @@ def find_uproject_file(project_path):
     return None
 
 
-def find_all_binaries_dirs(project_dir):
+def find_binary_files(project_dir):
     """
-    Recursively find all folders named "Binaries" within the project directory.
-    Skips folders named "Content", "Intermediate", "Saved", "DerivedDataCache", "Source", and "Config".
+    Find all folders named "Binaries" within the project directory and the files to push.
+    Never descends into folders named "Content", "Intermediate", "Saved", "DerivedDataCache",
+    "Source" and "Config". Folders that did not change since the last push are not listed again.
 
     Args:
         project_dir (Path): Path to the project directory
 
     Returns:
-        list: List of Path objects pointing to Binaries directories
+        tuple: (all_binary_dirs, files) as lists of Path objects
     """
-    all_binary_dirs = []
-    excluded_folders = {"Content", "Intermediate",
-                        "Saved", "DerivedDataCache", "Source", "Config"}
+    # Files to exclude from the upload
+    excluded_extensions = {'.pdb', '.exp'}
 
-    # Recursively search for all "Binaries" folders
-    for binaries_dir in project_dir.rglob("Binaries"):
-        if binaries_dir.is_dir():
-            # Check if any parent directory is in the excluded list
-            if not any(part in excluded_folders for part in binaries_dir.parts):
-                all_binary_dirs.append(binaries_dir)
-                print(f"Found binaries: {binaries_dir}")
-            else:
-                print(f"Skipping binaries in excluded folder: {binaries_dir}")
+    with sync_telemetry.span("scan") as span:
+        binaries_dirs, files = binaries_scan.scan_binaries(project_dir)
+        files = [project_dir / file_path for file_path in files
+                 if os.path.splitext(file_path)[1].lower() not in excluded_extensions]
+        span.add(files=len(files))
+    all_binary_dirs = [project_dir / binaries_dir for binaries_dir in binaries_dirs]
+    for binaries_dir in all_binary_dirs:
+        print(f"Found binaries: {binaries_dir}")
+    return all_binary_dirs, files
 
-    return all_binary_dirs
+
+def push_to_content_store(project_dir, store, progress):
+    """
+    Upload the project's binaries to the deduplicated file store. Only files
+    that are not part of the store yet are uploaded, the commit itself only
+    gets a small manifest.
+
+    Args:
+        project_dir (Path): Path to the project directory
+        store: Backend of the binary location, see storage_backends
+    """
+    progress.set_text("Searching for Binaries folders...")
+    all_binary_dirs, files = find_binary_files(project_dir)
+
+    if not all_binary_dirs:
+        print("Warning: No binaries found to push")
+        return False
+
+    commit_id = get_git_commit_id(project_dir)
+    print(f"Total files to push: {len(files)}")
+
+    def report(text, done, total):
+        progress.set_text(text)
+        progress.report_progress(done / total)
+
+    try:
+        with sync_telemetry.span("store push") as span:
+            uploaded, reused = content_store.push_files(
+                store, commit_id, files, project_dir, report, lambda: progress.canceled)
+            span.add(files=len(files))
+            span.attributes.update(uploaded=uploaded, reused=reused)
+    except content_store.StoreCanceledException:
+        print("Push cancelled by user")
+        return False
+    except Exception as e:
+        print(f"Error pushing to the file store: {e}", file=sys.stderr)
+        return False
+
+    print(
+        f"Uploaded {uploaded} new file(s), {reused} file(s) already in the store")
+    return True
+
+
+def write_binaries_zip(zipf, project_dir, files_to_zip, progress, max_progress):
+    policy = get_compression_policy()
+
+    def report(done_files, total_files, arc_name):
+        progress.report_progress(done_files / total_files * max_progress)
+
+    with sync_telemetry.span("compress", codec=policy.codec) as span:
+        stats = parallel_zip.write_files(
+            zipf,
+            [(file_path, file_path.relative_to(project_dir))
+             for file_path in files_to_zip],
+            policy,
+            progress_callback=report,
+            is_canceled=lambda: progress.canceled)
+        span.add(stats.input_bytes, stats.files)
+        span.attributes.update(compressed_bytes=stats.output_bytes)
+    print(stats)
+    progress.set_text(f"Zipped at {stats.throughput():.1f} MB/s")
+    return stats
+
+
+def stream_binaries_zip_to_s3(project_dir, backend, progress):
+    """
+    Compress the project's Binaries folders directly into a multipart upload,
+    without writing the archive to disk first. Uploading overlaps with compression.
+
+    Args:
+        project_dir (Path): Path to the project directory
+        backend (storage_backends.S3Backend): Bucket to upload to
+    """
+    ui = ap.UI()
+
+    progress.set_text("Searching for Binaries folders...")
+    all_binary_dirs, files_to_zip = find_binary_files(project_dir)
+    if not all_binary_dirs:
+        print("Warning: No binaries found to zip")
+        return False
+
+    commit_id = get_git_commit_id(project_dir)
+    zip_file_name = f"{commit_id}.zip"
+    print(
+        f"Streaming {len(files_to_zip)} files as {zip_file_name} to S3 bucket {backend.bucket_name}...")
+    progress.set_text(f"Zipping and uploading {len(files_to_zip)} files...")
+
+    writer = None
+    try:
+        writer = s3_transfer.S3MultipartWriter(
+            backend.s3_client, backend.bucket_name, zip_file_name,
+            backend.workers, backend.part_size)
+        with sync_telemetry.span("upload", streaming=True) as span:
+            with zipfile.ZipFile(writer, 'w') as zipf:
+                write_binaries_zip(zipf, project_dir, files_to_zip, progress, 0.95)
+            progress.set_text("Finishing upload...")
+            writer.close()
+            span.add(writer.tell(), len(files_to_zip))
+        progress.report_progress(1.0)
+        print(f"Successfully uploaded {zip_file_name} to S3.")
+        return True
+    except parallel_zip.CompressionCanceledException:
+        print("Upload cancelled by user")
+    except Exception as e:
+        print(f"Failed to upload to S3: {str(e)}", file=sys.stderr)
+        ui.show_error("S3 Upload Issue",
+                      "Check your S3 settings and permissions.")
+    if writer:
+        writer.abort()
+    return False
 
 
 def create_binaries_zip(project_dir, output_dir, progress, max_progress):
@@ -269,7 +304,7 @@ def create_binaries_zip(project_dir, output_dir, progress, max_progress):
 
     progress.set_text(f"Searching for Binaries folders...")
     # Find all Binaries directories
-    all_binary_dirs = find_all_binaries_dirs(project_dir)
+    all_binary_dirs, files_to_zip = find_binary_files(project_dir)
 
     if not all_binary_dirs:
         print("Warning: No binaries found to zip")
@@ -290,94 +325,82 @@ def create_binaries_zip(project_dir, output_dir, progress, max_progress):
     print(f"Found {len(all_binary_dirs)} Binaries folder(s)")
     print(f"Destination: {zip_path}")
 
-    # Files to exclude from the ZIP
-    excluded_extensions = {'.pdb', '.exp'}
-
-    # Gather all files to be zipped and count them
-    files_to_zip = []
-    for binary_dir in all_binary_dirs:
-        for file_path in binary_dir.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() not in excluded_extensions:
-                files_to_zip.append(file_path)
     total_files = len(files_to_zip)
     print(f"Total files to zip: {total_files}")
     progress.set_text(f"Zipping {total_files} files...")
 
+    # Write to a temporary name, so an interrupted push never leaves a
+    # truncated archive behind that looks complete to other users
+    temp_zip_path = f"{zip_path}.part"
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for idx, file_path in enumerate(files_to_zip, 1):
-                arc_name = file_path.relative_to(project_dir)
-                zipf.write(file_path, arc_name)
-                print(f"Added: {arc_name}")
-                progress.report_progress(idx / total_files * max_progress)
+        with zipfile.ZipFile(temp_zip_path, 'w') as zipf:
+            write_binaries_zip(zipf, project_dir, files_to_zip,
+                               progress, max_progress)
+        os.replace(temp_zip_path, zip_path)
         print(f"Successfully created ZIP archive: {zip_path}")
         return zip_path
 
+    except parallel_zip.CompressionCanceledException:
+        print("Zipping cancelled by user")
     except Exception as e:
         print(f"Error creating ZIP archive: {e}", file=sys.stderr)
+    if os.path.exists(temp_zip_path):
+        os.remove(temp_zip_path)
 
 
-def get_s3_credentials():
+def get_compression_policy():
     ctx = ap.get_context()
     shared_settings = aps.SharedSettings(
         ctx.workspace_id, "unreal_binary_sync")
 
-    access_key = shared_settings.get("access_key", "")
-    secret_key = shared_settings.get("secret_key", "")
-    endpoint_url = shared_settings.get("endpoint_url", "")
-    bucket_name = shared_settings.get("bucket_name", "")
-    if not all([access_key, secret_key, endpoint_url, bucket_name]):
-        return False
-    return access_key, secret_key, endpoint_url, bucket_name
-
-
-def upload_to_s3(zip_file_path, progress):
+    codec = shared_settings.get("compression_codec", "deflate")
+    if codec not in zip_codecs.CODECS:
+        print(f"Unknown compression codec {codec}, using deflate")
+        codec = "deflate"
+    try:
+        level = int(shared_settings.get("compression_level", ""))
+    except ValueError:
+        level = None
+    # A level of another codec, e.g. 19 for Zstandard with deflate, would fail during the push
+    clamped_level = zip_codecs.clamp_level(codec, level)
+    if level is not None and clamped_level != level:
+        print(f"Compression level {level} is not supported by {codec}, using "
+              f"{clamped_level if clamped_level is not None else 'the default'}")
+    level = clamped_level
+    store_extensions = shared_settings.get(
+        "store_extensions", parallel_zip.DEFAULT_STORE_EXTENSIONS)
+
+    policy = parallel_zip.CompressionPolicy(codec, level, store_extensions)
+    if policy.uses_zstandard():
+        try:
+            import zstandard  # noqa: F401 # pyright: ignore[reportMissingImports]
+        except ImportError:
+            ctx.install("zstandard")
+    print(f"Compressing with {codec}, level {level if level is not None else 'default'}")
+    return policy
+
+
+def upload_archive(zip_file_path, backend, progress):
     ui = ap.UI()
-    ctx = ap.get_context()
+    zip_file_name = os.path.basename(zip_file_path)
     try:
-        import boto3  # pyright: ignore[reportMissingImports]
-    except ImportError:
-        ctx.install("boto3")
-        import boto3  # pyright: ignore[reportMissingImports]
-
-    creds = get_s3_credentials()
-    if not creds:
-        ui.show_error("S3 Credentials Missing",
-                      "Please check your S3 settings in the action configuration.")
-        return False
-    access_key, secret_key, endpoint_url, bucket_name = creds
+        print(
+            f"Uploading {zip_file_name} to S3 bucket {backend.bucket_name} using {backend.workers} parallel transfers...")
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=endpoint_url
-    )
+        def upload_callback(bytes_uploaded, file_size):
+            percent = min(bytes_uploaded / file_size, 1.0) if file_size else 1.0
+            progress.report_progress(
+                0.6 + percent * 0.4)  # Scale to 60-100%
 
-    zip_file_name = os.path.basename(zip_file_path)
-    try:
-        print(f"Uploading {zip_file_name} to S3 bucket {bucket_name}...")
-        file_size = os.path.getsize(zip_file_path)
-        uploaded = 0
-        chunk_size = 1024 * 1024  # 1 MB
-
-        with open(zip_file_path, "rb") as f:
-            # Create a callback for progress tracking
-            def upload_callback(bytes_uploaded):
-                nonlocal uploaded
-                uploaded += bytes_uploaded
-                percent = min(uploaded / file_size, 1.0)
-                progress.report_progress(
-                    0.6 + percent * 0.4)  # Scale to 60-100%
-                if progress.canceled:
-                    raise Exception("Upload cancelled by user")
-
-            s3_client.upload_fileobj(
-                f, bucket_name, zip_file_name,
-                Callback=upload_callback
-            )
+        with sync_telemetry.span("upload") as span:
+            backend.upload_file(zip_file_name, zip_file_path,
+                                upload_callback, lambda: progress.canceled)
+            span.add(os.path.getsize(zip_file_path), 1)
         print(f"Successfully uploaded {zip_file_name} to S3.")
         return True
+    except s3_transfer.TransferCanceledException:
+        print("Upload cancelled by user, the upload continues on the next push")
+        return False
     except Exception as e:
         print(
             f"Failed to upload to S3: {str(e)}")
@@ -386,6 +409,70 @@ def upload_to_s3(zip_file_path, progress):
         return False
 
 
+def get_backend():
+    """Returns the backend of the binary location, None if the S3 credentials are missing"""
+    ctx = ap.get_context()
+    shared_settings = aps.SharedSettings(
+        ctx.workspace_id, "unreal_binary_sync")
+    # Pushes write to the binary location, the LAN cache is only used for reading
+    return storage_backends.create_backend(
+        shared_settings, aps.Settings(), ctx.project_path, ctx.install, use_cache=False)
+
+
+def get_build_fingerprint(engine_dir, project_dir, project_name, build_jobs, progress):
+    progress.set_text("Checking for source changes...")
+    try:
+        with sync_telemetry.span("fingerprint"):
+            return build_fingerprint.compute_fingerprint(
+                project_dir, project_dir / f"{project_name}.uproject", engine_dir, build_jobs)
+    except OSError as e:
+        print(f"Could not fingerprint the sources, building them: {str(e)}")
+        return None
+
+
+def reuse_published_binaries(store, fingerprint, storage_format, commit_id):
+    """
+    Point a commit at binaries that were published from the same sources before.
+
+    Returns:
+        str: Commit id of the published binaries, None if there are none
+    """
+    record = build_fingerprint.read_record(store, fingerprint)
+    if not record or record.get("format") != storage_format:
+        return None
+
+    published_commit = record["commit"]
+    if storage_format == "content_store":
+        # Manifests are small, the commit gets its own copy
+        manifest = store.get_bytes(
+            content_store.get_manifest_key(published_commit))
+        if manifest is None:
+            return None
+        if published_commit != commit_id:
+            store.put_bytes(content_store.get_manifest_key(commit_id), manifest)
+    else:
+        # Archives are large, the commit gets an alias to the published archive
+        if not store.exists(f"{published_commit}.zip"):
+            return None
+        if published_commit != commit_id:
+            build_fingerprint.write_alias(store, commit_id, published_commit)
+    return published_commit
+
+
+def record_build_fingerprint(store, fingerprint, commit_id, storage_format):
+    if not fingerprint:
+        return
+    try:
+        # A commit that pointed at other binaries before now has its own archive
+        alias_key = build_fingerprint.get_alias_key(commit_id)
+        if storage_format == "zip" and store.exists(alias_key):
+            build_fingerprint.write_alias(store, commit_id, commit_id)
+        build_fingerprint.write_record(
+            store, fingerprint, commit_id, storage_format)
+    except Exception as e:
+        print(f"Could not record the build fingerprint: {str(e)}")
+
+
 def delete_temp_zip(local_zip_file_path):
     try:
         if os.path.exists(local_zip_file_path):
@@ -395,20 +482,102 @@ def delete_temp_zip(local_zip_file_path):
         print(f"Failed to delete temp zip: {str(e)}")
 
 
-def push_binaries_async(engine_dir, project_dir, project_name, editor_target, output_dir, tag_pattern):
+def push_binaries_async(engine_dir, project_dir, project_name, build_jobs, output_dir, tag_pattern):
+    ctx = ap.get_context()
+    shared_settings = aps.SharedSettings(
+        ctx.workspace_id, "unreal_binary_sync")
+    sync_telemetry.start_run(
+        "push", location=shared_settings.get("binary_location_type", "folder"),
+        format=shared_settings.get("storage_format", "zip"), builds=len(build_jobs))
+    submitted = False
+    try:
+        submitted = submit_binaries(
+            engine_dir, project_dir, project_name, build_jobs, output_dir, tag_pattern)
+    finally:
+        sync_telemetry.finish_run("ok" if submitted else "failed")
+
+
+def submit_binaries(engine_dir, project_dir, project_name, build_jobs, output_dir, tag_pattern):
+    """Build and publish the binaries, returns True if they were submitted"""
     ui = ap.UI()
     ctx = ap.get_context()
-    progress = ap.Progress("Submitting Binaries",
-                           "Compiling...", infinite=True)
+    progress = sync_telemetry.ThrottledProgress(ap.Progress(
+        "Submitting Binaries", "Compiling...", infinite=True))
     progress.set_cancelable(True)
     shared_settings = aps.SharedSettings(
         ctx.workspace_id, "unreal_binary_sync")
 
     binary_location = shared_settings.get(
         "binary_location_type", "folder")
+    storage_format = shared_settings.get("storage_format", "zip")
+
+    backend = get_backend()
+    if not backend:
+        ui.show_error("S3 Credentials Missing",
+                      "Please check your S3 settings in the action configuration.")
+        progress.finish()
+        return False
+    commit_id = get_git_commit_id(project_dir)
+
+    # Binaries built from the same sources, engine and targets are not built again
+    fingerprint = None
+    if shared_settings.get("skip_unchanged_builds", True) and commit_id != "unknown":
+        fingerprint = get_build_fingerprint(
+            engine_dir, project_dir, project_name, build_jobs, progress)
+    if fingerprint:
+        try:
+            published_commit = reuse_published_binaries(
+                backend, fingerprint, storage_format, commit_id)
+        except Exception as e:
+            print(f"Could not look up published binaries: {str(e)}")
+            published_commit = None
+        if published_commit:
+            print(
+                f"Sources did not change since the binaries of {published_commit} were pushed, reusing them")
+            add_incremental_git_tag(project_dir, tag_pattern)
+            progress.finish()
+            ui.show_success("Binaries Submitted",
+                            "The sources did not change, the last pushed binaries were reused")
+            return True
+
     # Use Unreal Build Tool to compile the binaries, skipping if already built
-    compile_binaries(engine_dir, project_dir,
-                     project_name, editor_target, progress)
+    try:
+        compile_binaries(engine_dir, project_dir,
+                         project_name, build_jobs, progress)
+    except build_matrix.BuildFailedError as e:
+        print(f"Build failed: {str(e)}", file=sys.stderr)
+        ui.show_error("Cannot create the build",
+                      "Check the console for more information")
+        progress.finish()
+        return False
+
+    if storage_format == "content_store":
+        if not push_to_content_store(project_dir, backend, progress):
+            ui.show_error("Binary Push Failed",
+                          "The binaries could not be uploaded. Check the console for more information.")
+            progress.finish()
+            return False
+
+        record_build_fingerprint(backend, fingerprint, commit_id, storage_format)
+        add_incremental_git_tag(project_dir, tag_pattern)
+        progress.finish()
+        ui.show_success("Binaries Submitted")
+        return True
+
+    # Stream the archive into the upload, no temporary zip file needed
+    if binary_location == "s3" and shared_settings.get("s3_streaming_upload", True):
+        if not stream_binaries_zip_to_s3(project_dir, backend, progress):
+            ui.show_error("S3 Upload Failed",
+                          "The binaries could not be uploaded to S3. Check the console for more information.")
+            progress.finish()
+            return False
+
+        record_build_fingerprint(backend, fingerprint, commit_id, storage_format)
+        add_incremental_git_tag(project_dir, tag_pattern)
+        progress.finish()
+        ui.show_success("Binaries Submitted")
+        return True
+
     # Create the zip file
     if binary_location == "s3":
         zip_file_path = create_binaries_zip(
@@ -417,19 +586,27 @@ def push_binaries_async(engine_dir, project_dir, project_name, editor_target, ou
         zip_file_path = create_binaries_zip(
             project_dir, output_dir, progress, 1.0)
 
+    if not zip_file_path:
+        ui.show_error("Binary Push Failed",
+                      "The binaries could not be zipped. Check the console for more information.")
+        progress.finish()
+        return False
+
     if binary_location == "s3":
-        s3_upload = upload_to_s3(zip_file_path, progress)
+        s3_upload = upload_archive(zip_file_path, backend, progress)
         if not s3_upload:
             ui.show_error("S3 Upload Failed",
                           "The binaries could not be uploaded to S3. Check the console for more information.")
             progress.finish()
-            return
+            return False
         # Delete the temp zip after upload
         delete_temp_zip(zip_file_path)
 
+    record_build_fingerprint(backend, fingerprint, commit_id, storage_format)
     add_incremental_git_tag(project_dir, tag_pattern)
     progress.finish()
     ui.show_success("Binaries Submitted")
+    return True
 
 
 def main():
@@ -465,8 +642,12 @@ def main():
 
     project_dir = project_file.parent
     project_name = os.path.basename(project_file.stem)  # Name of your project
-    # Editor target to build, currently hardcoded
-    editor_target = f"{project_name}Editor"
+    # Targets and configurations to build, the editor target of the project by default
+    build_targets = build_matrix.parse_list(
+        shared_settings.get("build_targets", ""), [f"{project_name}Editor"])
+    build_configurations = build_matrix.parse_list(
+        shared_settings.get("build_configurations", ""), build_matrix.DEFAULT_CONFIGURATIONS)
+    build_jobs = build_matrix.get_build_jobs(build_targets, build_configurations)
     # Get desktop path
     output_dir = ""
     if binary_location == "folder":
@@ -485,7 +666,7 @@ def main():
 
     ui.show_console()
     ctx.run_async(push_binaries_async, engine_dir,
-                  project_dir, project_name, editor_target, output_dir, tag_pattern)
+                  project_dir, project_name, build_jobs, output_dir, tag_pattern)
 
 
 if __name__ == "__main__":
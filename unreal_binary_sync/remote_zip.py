@@ -0,0 +1,313 @@
+import bisect
+import concurrent.futures
+import os
+import threading
+import zipfile
+import parallel_unzip
+import s3_transfer
+
+# Extraction of a ZIP archive stored in S3 without downloading it first. The
+# central directory is read with a ranged GET on the end of the object. The
+# entries that have to be extracted are then grouped into contiguous byte ranges
+# of about one part size, and every worker downloads a range and extracts its
+# entries while the other workers are still downloading. Only the ranges of the
+# requested entries are transferred, so a delta pull downloads the changed files only.
+# Optionally the complete archive is downloaded and written to a local file while
+# extracting, e.g. to keep it in the archive cache.
+
+# The central directory usually fits into the end of the archive, so it is read with one request
+TAIL_SIZE = 1024 * 1024  # 1 MB
+# Ranges closer than this are downloaded together instead of with an additional request
+MAX_RANGE_GAP = 1024 * 1024  # 1 MB
+
+
+class _RangeFile:
+    """
+    Seekable read only file object over an S3 object. Reads are served from the
+    blocks that have been added, anything else is fetched with a ranged GET.
+    """
+
+    def __init__(self, fetch, size):
+        self._fetch = fetch
+        self._size = size
+        self._position = 0
+        self._blocks = []
+
+    def add_block(self, start, data):
+        self._blocks.append((start, data))
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("Negative seek position")
+        self._position = offset
+        return self._position
+
+    def read(self, size=-1):
+        end = self._size if size is None or size < 0 else min(
+            self._size, self._position + size)
+        if end <= self._position:
+            return b""
+        for start, data in self._blocks:
+            if start <= self._position and end <= start + len(data):
+                chunk = data[self._position - start:end - start]
+                break
+        else:
+            chunk = self._fetch(self._position, end - 1)
+            self.add_block(self._position, chunk)
+        self._position = end
+        return chunk
+
+    def close(self):
+        self._blocks = []
+
+
+class _StreamFile:
+    """
+    Forward only file object over the body of a ranged GET starting at offset.
+    Everything read is passed to the sink, if there is one.
+    """
+
+    def __init__(self, body, offset, sink=None):
+        self._body = body
+        self._position = offset
+        self._sink = sink
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence != os.SEEK_SET or offset < self._position:
+            raise ValueError("Stream can only seek forward")
+        while self._position < offset:
+            if not self.read(min(offset - self._position, s3_transfer.STREAM_CHUNK_SIZE)):
+                raise zipfile.BadZipFile("Unexpected end of archive data")
+        return self._position
+
+    def read(self, size=-1):
+        data = self._body.read(size if size is not None and size >= 0 else None)
+        if data and self._sink:
+            self._sink(self._position, data)
+        self._position += len(data)
+        return data
+
+    def drain(self):
+        while self.read(s3_transfer.STREAM_CHUNK_SIZE):
+            pass
+
+
+class RemoteZip:
+    """
+    ZIP archive in an S3 bucket.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket_name (str): Bucket of the archive
+        key (str): Object key of the archive
+    """
+
+    def __init__(self, s3_client, bucket_name, key):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+
+        head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        self.size = head["ContentLength"]
+        # Every range is requested with the ETag, so an archive that is replaced
+        # while extracting fails instead of mixing the data of two archives
+        self.etag = head["ETag"]
+
+        self._tail_start = max(0, self.size - TAIL_SIZE)
+        self._tail = self._fetch(self._tail_start, self.size - 1) if self.size else b""
+        with zipfile.ZipFile(self._open_reader()) as zip_file:
+            self._infos = zip_file.infolist()
+            # Start of the central directory, the end of the data of the last entry
+            self._data_end = zip_file.start_dir
+
+    def _get_range(self, start, end):
+        return self.s3_client.get_object(
+            Bucket=self.bucket_name, Key=self.key,
+            Range=f"bytes={start}-{end}", IfMatch=self.etag)
+
+    def _fetch(self, start, end):
+        return self._get_range(start, end)["Body"].read()
+
+    def _open_reader(self, block_start=None, block=None):
+        reader = _RangeFile(self._fetch, self.size)
+        reader.add_block(self._tail_start, self._tail)
+        if block is not None:
+            reader.add_block(block_start, block)
+        return reader
+
+    def infolist(self):
+        return list(self._infos)
+
+    def _get_entry_ranges(self, members):
+        """Returns {header_offset: end} with the exclusive end of the data of every entry"""
+        offsets = sorted({info.header_offset for info in self._infos})
+        ends = {}
+        for info in members:
+            index = bisect.bisect_right(offsets, info.header_offset)
+            ends[info.header_offset] = offsets[index] if index < len(
+                offsets) else self._data_end
+        return ends
+
+    def plan_ranges(self, members, part_size):
+        """
+        Group entries into byte ranges that are downloaded with one request each.
+
+        Returns:
+            list: (start, end, infos) with an exclusive end, entries ordered by offset
+        """
+        ends = self._get_entry_ranges(members)
+        ranges = []
+        for info in sorted(members, key=lambda info: info.header_offset):
+            start = info.header_offset
+            end = ends[start]
+            if ranges:
+                range_start, range_end, infos = ranges[-1]
+                if start - range_end <= MAX_RANGE_GAP and end - range_start <= part_size:
+                    ranges[-1] = (range_start, max(range_end, end), infos + [info])
+                    continue
+            ranges.append((start, end, [info]))
+        return ranges
+
+    def extract_members(self, output_dir, members=None, workers=None, part_size=None,
+                        progress_callback=None, is_canceled=None, archive_path=None):
+        """
+        Download and extract entries in parallel.
+
+        Args:
+            output_dir (str): Directory to extract to
+            members (list): ZipInfo objects to extract, all entries if None
+            workers (int): Number of parallel range downloads
+            part_size (int): Size of a range in bytes, larger entries are streamed on their own
+            progress_callback (callable): Called with (done_files, total_files, done_bytes, total_bytes)
+            is_canceled (callable): Returns True if the extraction should stop
+            archive_path (str): If set, the complete archive is downloaded and written
+                to this file while the members are extracted
+
+        Returns:
+            list: Names of the extracted entries
+        """
+        if members is None:
+            members = self.infolist()
+        workers = workers or s3_transfer.DEFAULT_WORKERS
+        part_size = part_size or s3_transfer.DEFAULT_PART_SIZE_MB * 1024 * 1024
+
+        directories = set()
+        files = []
+        for info in members:
+            target_path = parallel_unzip.get_target_path(output_dir, info.filename)
+            if info.is_dir():
+                directories.add(target_path)
+            else:
+                directories.add(os.path.dirname(target_path))
+                files.append(info)
+        for directory in sorted(directories):
+            os.makedirs(directory, exist_ok=True)
+
+        total_files = len(files)
+        total_bytes = sum(info.file_size for info in files)
+        done = [0, 0]
+        lock = threading.Lock()
+        cancel_event = threading.Event()
+        wanted = {info.header_offset for info in files}
+
+        archive_file = None
+        sink = None
+        if archive_path:
+            archive_file = open(archive_path, "wb")
+            archive_file.truncate(self.size)
+
+            def sink(offset, data):
+                with lock:
+                    archive_file.seek(offset)
+                    archive_file.write(data)
+
+        def extract_entries(fp, infos):
+            for info in infos:
+                if cancel_event.is_set():
+                    return
+                if info.header_offset not in wanted:
+                    continue
+                target_path = parallel_unzip.get_target_path(output_dir, info.filename)
+                with open(target_path, "wb") as target:
+                    parallel_unzip.extract_raw_entry(fp, info, target, cancel_event)
+                if cancel_event.is_set():
+                    os.remove(target_path)
+                    return
+                with lock:
+                    done[0] += 1
+                    done[1] += info.file_size
+
+        def process_range(start, end, infos):
+            if cancel_event.is_set():
+                return
+            if end - start > part_size:
+                # A single large entry, decompress it while the body is streaming in
+                body = self._get_range(start, end - 1)["Body"]
+                try:
+                    stream = _StreamFile(body, start, sink)
+                    extract_entries(stream, infos)
+                    if sink and not cancel_event.is_set():
+                        stream.drain()
+                finally:
+                    body.close()
+            else:
+                data = self._fetch(start, end - 1)
+                if sink:
+                    sink(start, data)
+                extract_entries(self._open_reader(start, data), infos)
+
+        if archive_file:
+            # Every byte of the archive is downloaded, the entries that are not
+            # extracted only go to the archive file
+            ranges = self.plan_ranges(self._infos, part_size)
+            first_offset = ranges[0][0] if ranges else self._data_end
+            if first_offset > 0:
+                ranges.append((0, first_offset, []))
+            if self._tail_start > self._data_end:
+                ranges.append((self._data_end, self._tail_start, []))
+            sink(self._tail_start, self._tail)
+        else:
+            ranges = self.plan_ranges(files, part_size)
+        # Download the largest ranges first, so a big entry does not end up last on a single thread
+        ranges.sort(key=lambda item: item[1] - item[0], reverse=True)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = {executor.submit(process_range, *item) for item in ranges}
+                try:
+                    while pending:
+                        finished, pending = concurrent.futures.wait(
+                            pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in finished:
+                            future.result()
+                        if progress_callback:
+                            with lock:
+                                progress_callback(done[0], total_files, done[1], total_bytes)
+                        if is_canceled and is_canceled():
+                            raise parallel_unzip.ExtractionCanceledException()
+                except BaseException:
+                    cancel_event.set()
+                    for future in pending:
+                        future.cancel()
+                    raise
+        finally:
+            if archive_file:
+                archive_file.close()
+
+        return [info.filename for info in members]
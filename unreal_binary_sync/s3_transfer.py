@@ -0,0 +1,471 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+
+# Parallel multipart transfers for S3. Uploads and downloads are split into parts
+# that are transferred concurrently. The state of a transfer is kept in a sidecar
+# JSON file next to the local file, so an interrupted transfer continues with the
+# missing parts on the next run instead of starting over. Completed transfers are
+# verified against the size and the ETag of the object.
+#
+# The ETag is only the MD5 of the content for objects without encryption or with
+# SSE-S3 (AES256), with SSE-KMS or SSE-C it is opaque and only the size is checked.
+# Multipart ETags depend on the part boundaries, so multipart uploads store their
+# part size in the object metadata and a download only compares the ETag if it
+# used the same part size.
+
+DEFAULT_WORKERS = 8
+DEFAULT_PART_SIZE_MB = 64
+# S3 requires every part except the last one to be at least 5 MB
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Object metadata with the part size of a multipart upload
+PART_SIZE_METADATA = "part-size"
+
+
+class TransferCanceledException(Exception):
+    pass
+
+
+class TransferVerificationError(Exception):
+    pass
+
+
+def parse_transfer_settings(workers_value, part_size_value):
+    """Returns (workers, part_size in bytes) from the values stored in the settings"""
+    try:
+        workers = max(1, int(workers_value))
+    except (TypeError, ValueError):
+        workers = DEFAULT_WORKERS
+    try:
+        part_size = max(MIN_PART_SIZE, int(part_size_value) * 1024 * 1024)
+    except (TypeError, ValueError):
+        part_size = DEFAULT_PART_SIZE_MB * 1024 * 1024
+    return workers, part_size
+
+
+def get_part_ranges(size, part_size):
+    """Returns a list of (part_number, start, end) with an inclusive end"""
+    # Grow the part size if the object would exceed the maximum part count
+    while size > part_size * MAX_PARTS:
+        part_size *= 2
+    ranges = []
+    start = 0
+    part_number = 1
+    while start < size:
+        end = min(start + part_size, size) - 1
+        ranges.append((part_number, start, end))
+        start = end + 1
+        part_number += 1
+    return ranges
+
+
+def get_multipart_etag(part_md5_digests):
+    combined = hashlib.md5(b"".join(part_md5_digests))
+    return f"{combined.hexdigest()}-{len(part_md5_digests)}"
+
+
+def has_md5_etag(response):
+    """True if the ETag of a put or head response is derived from the MD5 of the content"""
+    return response.get("ServerSideEncryption") in (None, "AES256")
+
+
+def get_stored_part_size(head):
+    """Returns the part size a multipart object was uploaded with, None if it is unknown"""
+    try:
+        return int(head.get("Metadata", {})[PART_SIZE_METADATA])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def file_md5(file_path):
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _read_state(state_path):
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(state_path, state):
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, state_path)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _run_parts(parts, transfer_part, workers, total_size, progress_callback, is_canceled, cancel_event):
+    """
+    Run transfer_part for every part on a thread pool. The calling thread only
+    waits for the workers, reports the progress and checks for cancellation.
+    """
+    transferred = [0]
+    lock = threading.Lock()
+
+    def on_bytes(count):
+        with lock:
+            transferred[0] += count
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(transfer_part, part, on_bytes) for part in parts}
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                if progress_callback:
+                    with lock:
+                        progress_callback(transferred[0], total_size)
+                if is_canceled and is_canceled():
+                    raise TransferCanceledException()
+        except BaseException:
+            cancel_event.set()
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def upload_file(s3_client, bucket_name, key, file_path, workers=DEFAULT_WORKERS,
+                part_size=DEFAULT_PART_SIZE_MB * 1024 * 1024, progress_callback=None, is_canceled=None):
+    """
+    Upload a file with concurrent multipart uploads. If a previous upload of the
+    same file was interrupted, only the missing parts are uploaded.
+
+    Args:
+        s3_client: boto3 S3 client, which is safe to share between threads
+        bucket_name (str): Target bucket
+        key (str): Target key
+        file_path (str): Local file to upload
+        workers (int): Number of parts that are uploaded at the same time
+        part_size (int): Size of a part in bytes
+        progress_callback (callable): Called with (bytes_done, bytes_total)
+        is_canceled (callable): Returns True if the transfer should stop
+
+    Returns:
+        str: ETag of the uploaded object
+    """
+    file_size = os.path.getsize(file_path)
+    parts = get_part_ranges(file_size, part_size)
+
+    if len(parts) <= 1:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        response = s3_client.put_object(Bucket=bucket_name, Key=key, Body=data)
+        if progress_callback:
+            progress_callback(file_size, file_size)
+        etag = response["ETag"].strip('"')
+        if has_md5_etag(response) and etag != hashlib.md5(data).hexdigest():
+            raise TransferVerificationError(f"ETag mismatch after uploading {key}")
+        return etag
+
+    state_path = f"{file_path}.upload.json"
+    fingerprint = {
+        "bucket": bucket_name,
+        "key": key,
+        "size": file_size,
+        "mtime": os.stat(file_path).st_mtime_ns,
+        "part_size": parts[0][2] + 1
+    }
+    state = _read_state(state_path)
+    completed = {}
+    if state and state.get("fingerprint") == fingerprint:
+        # Only reuse parts that S3 still knows about
+        try:
+            listed = {}
+            paginator = s3_client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=bucket_name, Key=key, UploadId=state["upload_id"]):
+                for part in page.get("Parts", []):
+                    listed[part["PartNumber"]] = part["ETag"].strip('"')
+            completed = {
+                int(number): info for number, info in state["parts"].items()
+                if listed.get(int(number)) == info["etag"]
+            }
+            upload_id = state["upload_id"]
+            print(f"Resuming upload of {key}, {len(completed)} of {len(parts)} parts already uploaded")
+        except Exception as e:
+            print(f"Cannot resume previous upload, starting over: {str(e)}")
+            state = None
+    else:
+        state = None
+
+    if state is None:
+        response = s3_client.create_multipart_upload(
+            Bucket=bucket_name, Key=key, Metadata={PART_SIZE_METADATA: str(fingerprint["part_size"])})
+        upload_id = response["UploadId"]
+        state = {"fingerprint": fingerprint, "upload_id": upload_id, "parts": {}}
+        _write_state(state_path, state)
+
+    state["parts"] = {str(number): info for number, info in completed.items()}
+    state_lock = threading.Lock()
+    cancel_event = threading.Event()
+
+    def upload_part(part, on_bytes):
+        part_number, start, end = part
+        if cancel_event.is_set():
+            return
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        response = s3_client.upload_part(
+            Bucket=bucket_name, Key=key, UploadId=upload_id,
+            PartNumber=part_number, Body=data)
+        info = {"etag": response["ETag"].strip('"'), "md5": hashlib.md5(data).hexdigest()}
+        with state_lock:
+            state["parts"][str(part_number)] = info
+            _write_state(state_path, state)
+        on_bytes(len(data))
+
+    missing = [part for part in parts if part[0] not in completed]
+    already_done = sum(end - start + 1 for number, start, end in parts if number in completed)
+
+    def report(done, total):
+        if progress_callback:
+            progress_callback(already_done + done, file_size)
+
+    _run_parts(missing, upload_part, workers, file_size, report, is_canceled, cancel_event)
+
+    ordered = [state["parts"][str(number)] for number, _, _ in parts]
+    response = s3_client.complete_multipart_upload(
+        Bucket=bucket_name, Key=key, UploadId=upload_id,
+        MultipartUpload={"Parts": [
+            {"PartNumber": number, "ETag": info["etag"]}
+            for (number, _, _), info in zip(parts, ordered)
+        ]})
+
+    # Verify the object against what was uploaded
+    head = s3_client.head_object(Bucket=bucket_name, Key=key)
+    etag = head["ETag"].strip('"')
+    if head["ContentLength"] != file_size:
+        raise TransferVerificationError(f"Size mismatch after uploading {key}")
+    expected_etag = get_multipart_etag([bytes.fromhex(info["md5"]) for info in ordered])
+    if has_md5_etag(head) and etag != expected_etag:
+        raise TransferVerificationError(f"ETag mismatch after uploading {key}")
+
+    _remove_file(state_path)
+    return etag
+
+
+def download_file(s3_client, bucket_name, key, target_path, workers=DEFAULT_WORKERS,
+                  part_size=DEFAULT_PART_SIZE_MB * 1024 * 1024, progress_callback=None, is_canceled=None):
+    """
+    Download an object with concurrent ranged requests. The data is written to
+    "<target_path>.part" and only renamed to the target path once it has been
+    verified, so a partial download is never mistaken for a complete one. An
+    interrupted download continues with the missing parts on the next run.
+
+    Args:
+        s3_client: boto3 S3 client, which is safe to share between threads
+        bucket_name (str): Source bucket
+        key (str): Source key
+        target_path (str): Local file to write
+        workers (int): Number of parts that are downloaded at the same time
+        part_size (int): Size of a part in bytes
+        progress_callback (callable): Called with (bytes_done, bytes_total)
+        is_canceled (callable): Returns True if the transfer should stop
+
+    Returns:
+        str: target_path
+    """
+    head = s3_client.head_object(Bucket=bucket_name, Key=key)
+    total_size = head["ContentLength"]
+    etag = head["ETag"].strip('"')
+    parts = get_part_ranges(total_size, part_size)
+
+    temp_path = f"{target_path}.part"
+    state_path = f"{temp_path}.json"
+    fingerprint = {
+        "bucket": bucket_name,
+        "key": key,
+        "size": total_size,
+        "etag": etag,
+        "part_size": parts[0][2] + 1 if parts else part_size
+    }
+    state = _read_state(state_path)
+    if not state or state.get("fingerprint") != fingerprint or not os.path.exists(temp_path):
+        state = {"fingerprint": fingerprint, "parts": {}}
+        with open(temp_path, "wb") as f:
+            f.truncate(total_size)
+        _write_state(state_path, state)
+    else:
+        print(f"Resuming download of {key}, {len(state['parts'])} of {len(parts)} parts already downloaded")
+
+    state_lock = threading.Lock()
+    cancel_event = threading.Event()
+
+    def download_part(part, on_bytes):
+        part_number, start, end = part
+        if cancel_event.is_set():
+            return
+        md5 = hashlib.md5()
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}", IfMatch=head["ETag"])
+        with open(temp_path, "r+b") as f:
+            f.seek(start)
+            for chunk in response["Body"].iter_chunks(STREAM_CHUNK_SIZE):
+                if cancel_event.is_set():
+                    return
+                f.write(chunk)
+                md5.update(chunk)
+                on_bytes(len(chunk))
+            if f.tell() != end + 1:
+                raise TransferVerificationError(f"Incomplete part {part_number} of {key}")
+        with state_lock:
+            state["parts"][str(part_number)] = md5.hexdigest()
+            _write_state(state_path, state)
+
+    missing = [part for part in parts if str(part[0]) not in state["parts"]]
+    already_done = sum(end - start + 1 for number, start, end in parts if str(number) in state["parts"])
+
+    def report(done, total):
+        if progress_callback:
+            progress_callback(already_done + done, total_size)
+
+    _run_parts(missing, download_part, workers, total_size, report, is_canceled, cancel_event)
+
+    # Verify the download against the object
+    if os.path.getsize(temp_path) != total_size:
+        raise TransferVerificationError(f"Size mismatch after downloading {key}")
+    verify_etag = has_md5_etag(head)
+    if verify_etag and "-" in etag:
+        # Multipart ETags can only be verified if the object was uploaded with the same part boundaries
+        if int(etag.split("-")[1]) == len(parts) and get_stored_part_size(head) == fingerprint["part_size"]:
+            digests = [bytes.fromhex(state["parts"][str(number)]) for number, _, _ in parts]
+            if get_multipart_etag(digests) != etag:
+                _remove_file(state_path)
+                raise TransferVerificationError(f"ETag mismatch after downloading {key}")
+    elif verify_etag and len(etag) == 32 and file_md5(temp_path) != etag:
+        _remove_file(state_path)
+        raise TransferVerificationError(f"ETag mismatch after downloading {key}")
+
+    os.replace(temp_path, target_path)
+    _remove_file(state_path)
+    return target_path
+
+
+class S3MultipartWriter:
+    """
+    Writable file object that uploads everything written to it as a multipart
+    upload. Parts are uploaded on a thread pool as soon as they are full, at most
+    `workers` parts are in flight, so writing blocks instead of buffering more
+    data when the uplink is slower than the producer. The object has no seek(),
+    which makes zipfile write an archive sequentially into it.
+
+    Call close() to complete the upload or abort() to discard it.
+    """
+
+    def __init__(self, s3_client, bucket_name, key, workers=DEFAULT_WORKERS,
+                 part_size=DEFAULT_PART_SIZE_MB * 1024 * 1024):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.bytes_uploaded = 0
+        self._position = 0
+        self._buffer = bytearray()
+        self._part_number = 0
+        self._parts = {}
+        self._futures = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._closed = False
+        response = s3_client.create_multipart_upload(
+            Bucket=bucket_name, Key=key, Metadata={PART_SIZE_METADATA: str(self.part_size)})
+        self._upload_id = response["UploadId"]
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def _raise_if_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception():
+                raise future.exception()
+
+    def _upload_part(self, part_number, data):
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=data)
+        with self._lock:
+            self._parts[part_number] = (
+                response["ETag"].strip('"'), hashlib.md5(data).digest())
+            self.bytes_uploaded += len(data)
+
+    def _submit(self, data):
+        self._raise_if_failed()
+        if self._part_number >= MAX_PARTS:
+            raise ValueError("Too many parts, increase the part size")
+        # Blocks while all workers are busy, this keeps the memory bounded
+        self._slots.acquire()
+        self._part_number += 1
+        future = self._executor.submit(self._upload_part, self._part_number, data)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def close(self):
+        """Upload the remaining data, complete the upload and return the ETag"""
+        if self._closed:
+            return None
+        if self._buffer or self._part_number == 0:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        concurrent.futures.wait(self._futures)
+        self._raise_if_failed()
+        self._executor.shutdown()
+        self._closed = True
+
+        numbers = sorted(self._parts)
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={"Parts": [
+                {"PartNumber": number, "ETag": self._parts[number][0]} for number in numbers
+            ]})
+
+        head = self.s3_client.head_object(Bucket=self.bucket_name, Key=self.key)
+        etag = head["ETag"].strip('"')
+        if head["ContentLength"] != self._position:
+            raise TransferVerificationError(f"Size mismatch after uploading {self.key}")
+        if has_md5_etag(head) and etag != get_multipart_etag([self._parts[number][1] for number in numbers]):
+            raise TransferVerificationError(f"ETag mismatch after uploading {self.key}")
+        return etag
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown()
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id)
+        except Exception as e:
+            print(f"Failed to abort the upload of {self.key}: {str(e)}")
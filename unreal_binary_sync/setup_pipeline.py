@@ -0,0 +1,166 @@
+import concurrent.futures
+import subprocess
+import threading
+
+# Scheduler for the project setup of engine source builds. Every step declares
+# the steps it depends on, and all steps whose dependencies are done run at the
+# same time, so the setup takes as long as its longest chain of steps. External
+# tools are waited on without polling in a loop and their output is read on
+# separate threads, so nothing is lost when a process exits.
+
+WAIT_INTERVAL = 0.25  # seconds between cancellation checks
+
+
+class SetupCanceledException(Exception):
+    pass
+
+
+class StepFailedError(Exception):
+    pass
+
+
+class StepSkippedError(Exception):
+    pass
+
+
+class Step:
+    """
+    A unit of the setup.
+
+    Args:
+        name (str): Unique name of the step
+        run (callable): Called with a threading.Event that is set when the setup is
+            canceled. Raises an exception if the step failed.
+        depends_on (list): Names of the steps that have to succeed before this step runs
+    """
+
+    def __init__(self, name, run, depends_on=None):
+        self.name = name
+        self.run = run
+        self.depends_on = list(depends_on or [])
+
+
+def _read_stream(stream, on_output):
+    # The pipe is drained to the end even if a callback fails, otherwise the
+    # process blocks once the pipe buffer is full
+    try:
+        for line in stream:
+            if not on_output:
+                continue
+            try:
+                on_output(line.rstrip("\n"))
+            except Exception as e:
+                print(f"Failed to handle process output: {str(e)}")
+    finally:
+        stream.close()
+
+
+def run_process(args, cwd, cancel_event, on_output=None, startupinfo=None):
+    """
+    Run a process and stream its output line by line.
+
+    Args:
+        args (list): Command line
+        cwd (str): Working directory
+        cancel_event (threading.Event): Terminates the process when set
+        on_output (callable): Called with every line of stdout and stderr, from a reader thread
+        startupinfo: Passed to subprocess.Popen, e.g. to hide the window on Windows
+
+    Returns:
+        int: Exit code of the process
+    """
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        # Undecodable bytes in the output of the tools must not stop the readers
+        encoding="utf-8",
+        errors="replace",
+        cwd=cwd,
+        startupinfo=startupinfo
+    )
+    readers = [
+        threading.Thread(target=_read_stream, args=(stream, on_output), daemon=True)
+        for stream in (process.stdout, process.stderr)
+    ]
+    for reader in readers:
+        reader.start()
+
+    while True:
+        try:
+            returncode = process.wait(timeout=WAIT_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel_event.is_set():
+                process.terminate()
+                process.wait()
+                raise SetupCanceledException()
+
+    # The readers finish once they reached the end of the output of the exited process
+    for reader in readers:
+        reader.join()
+    return returncode
+
+
+def run_steps(steps, is_canceled=None):
+    """
+    Run steps in parallel as soon as their dependencies succeeded.
+
+    Args:
+        steps (list): Step objects
+        is_canceled (callable): Returns True if the setup should stop
+
+    Returns:
+        dict: Step names mapped to None for succeeded steps or to the exception of
+        failed, canceled and skipped steps
+    """
+    names = {step.name for step in steps}
+    for step in steps:
+        unknown = [name for name in step.depends_on if name not in names]
+        if unknown:
+            raise ValueError(f"Step {step.name} depends on unknown steps {unknown}")
+
+    results = {}
+    waiting = list(steps)
+    running = {}
+    cancel_event = threading.Event()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(steps))) as executor:
+        while waiting or running:
+            # Repeat until nothing changes, a skipped step can skip further steps
+            scheduled = True
+            while scheduled:
+                scheduled = False
+                for step in list(waiting):
+                    failed = [name for name in step.depends_on
+                              if name in results and results[name] is not None]
+                    if failed:
+                        results[step.name] = StepSkippedError(
+                            f"Skipped because {', '.join(failed)} did not succeed")
+                    elif all(name in results for name in step.depends_on):
+                        running[executor.submit(step.run, cancel_event)] = step
+                    else:
+                        continue
+                    waiting.remove(step)
+                    scheduled = True
+
+            if not running:
+                if waiting:
+                    raise ValueError(
+                        f"Circular dependencies between {[step.name for step in waiting]}")
+                break
+
+            done, _ = concurrent.futures.wait(
+                running, timeout=WAIT_INTERVAL, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future).name] = future.exception()
+
+            if is_canceled and is_canceled() and not cancel_event.is_set():
+                # Running steps stop on their own, steps that did not start are dropped
+                cancel_event.set()
+                for step in waiting:
+                    results[step.name] = SetupCanceledException()
+                waiting.clear()
+
+    return results
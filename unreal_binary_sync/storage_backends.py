@@ -0,0 +1,498 @@
+import concurrent.futures
+import http.client
+import os
+import threading
+import urllib.parse
+import s3_transfer
+
+# Storage backends for the binary location. Push and pull only talk to a backend,
+# so they do not need to know where the binaries are stored:
+#   FolderBackend     a shared folder, e.g. a network share or Google Drive
+#   S3Backend         an S3 bucket
+#   HttpCacheBackend  a cache server in the local network in front of an S3 bucket,
+#                     see lan_cache_server.py. Everything is read from the cache
+#                     server, writes go to the bucket.
+#
+# Every backend offers the same methods on keys with forward slashes:
+# exists, exists_many, head, get_bytes, put_bytes, put_file, open_stream,
+# upload_file, download_file and local_path, and the number of parallel requests
+# of a transfer as workers.
+#
+# S3 clients are created once per credentials and reused, as a boto3 client keeps
+# a pool of open connections that is safe to share between threads.
+
+# Parallel requests of a batched existence check
+EXISTS_WORKERS = 16
+# Folders with more keys to check are listed instead of checking every key on its own
+LIST_THRESHOLD = 8
+HTTP_TIMEOUT = 30  # seconds
+# Parallel file copies of a transfer with many files on a shared folder
+FOLDER_WORKERS = 4
+
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def get_s3_credentials(shared_settings):
+    """Returns (access_key, secret_key, endpoint_url, bucket_name), None if one of them is not set"""
+    credentials = tuple(shared_settings.get(name, "") for name in (
+        "access_key", "secret_key", "endpoint_url", "bucket_name"))
+    if not all(credentials):
+        return None
+    return credentials
+
+
+def get_s3_client(access_key, secret_key, endpoint_url, max_connections=10, install=None):
+    """
+    Returns a boto3 S3 client, clients with the same credentials are reused.
+
+    Args:
+        install (callable): Called with the module name if boto3 has to be installed
+    """
+    try:
+        import boto3  # pyright: ignore[reportMissingImports]
+    except ImportError:
+        if not install:
+            raise
+        install("boto3")
+        import boto3  # pyright: ignore[reportMissingImports]
+    from botocore.config import Config  # pyright: ignore[reportMissingImports]
+
+    # Allow one pooled connection per parallel transfer
+    max_connections = max(10, max_connections)
+    client_key = (access_key, secret_key, endpoint_url, max_connections)
+    with _s3_clients_lock:
+        client = _s3_clients.get(client_key)
+        if client is None:
+            client = boto3.client(
+                "s3",
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                endpoint_url=endpoint_url,
+                config=Config(max_pool_connections=max_connections)
+            )
+            _s3_clients[client_key] = client
+        return client
+
+
+def create_backend(shared_settings, local_settings, project_path, install=None, use_cache=True):
+    """
+    Create the backend of the binary location configured in the settings.
+
+    Args:
+        shared_settings: Settings of the workspace
+        local_settings: Settings of this computer
+        project_path (str): Root of the Anchorpoint project, the prefix of local settings
+        install (callable): Called with a module name if it has to be installed
+        use_cache (bool): Read through the LAN cache server, if one is set
+
+    Returns:
+        Backend, None if the S3 credentials are missing
+    """
+    if shared_settings.get("binary_location_type", "folder") != "s3":
+        return FolderBackend(local_settings.get(project_path + "_binary_source", ""))
+
+    credentials = get_s3_credentials(shared_settings)
+    if not credentials:
+        return None
+    access_key, secret_key, endpoint_url, bucket_name = credentials
+    workers, part_size = s3_transfer.parse_transfer_settings(
+        shared_settings.get("s3_transfer_workers", s3_transfer.DEFAULT_WORKERS),
+        shared_settings.get("s3_part_size_mb", s3_transfer.DEFAULT_PART_SIZE_MB))
+    s3_client = get_s3_client(access_key, secret_key, endpoint_url, workers, install)
+    backend = S3Backend(s3_client, bucket_name, workers, part_size)
+
+    cache_url = str(local_settings.get(project_path + "_lan_cache_url", "")).strip()
+    if use_cache and cache_url:
+        return HttpCacheBackend(cache_url, backend)
+    return backend
+
+
+def _copy_with_progress(source, target, total_size, progress_callback, is_canceled):
+    done = 0
+    while chunk := source.read(s3_transfer.STREAM_CHUNK_SIZE):
+        if is_canceled and is_canceled():
+            raise s3_transfer.TransferCanceledException()
+        target.write(chunk)
+        done += len(chunk)
+        if progress_callback:
+            progress_callback(done, total_size)
+    return done
+
+
+class FolderBackend:
+    """Binary location on a shared folder"""
+
+    name = "folder"
+
+    def __init__(self, root, workers=FOLDER_WORKERS):
+        self.root = os.fspath(root)
+        self.workers = workers
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def local_path(self, key):
+        """Returns the path of the file, which can be read without downloading it"""
+        return self._path(key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def exists_many(self, keys):
+        return {key for key in keys if self.exists(key)}
+
+    def head(self, key):
+        try:
+            stat = os.stat(self._path(key))
+        except OSError:
+            return None
+        return {"size": stat.st_size, "etag": f"{stat.st_size}-{stat.st_mtime_ns}"}
+
+    def put_file(self, key, file_path):
+        self.upload_file(key, file_path)
+
+    def put_bytes(self, key, data):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+
+    def get_bytes(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def open_stream(self, key):
+        return open(self._path(key), "rb")
+
+    def upload_file(self, key, file_path, progress_callback=None, is_canceled=None):
+        target = self._path(key)
+        if os.path.abspath(target) == os.path.abspath(file_path):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Copy to a temporary name first, so that an interrupted push never leaves
+        # a truncated file behind that looks complete to other users
+        temp_target = f"{target}.part"
+        try:
+            with open(file_path, "rb") as source, open(temp_target, "wb") as f:
+                _copy_with_progress(source, f, os.path.getsize(file_path),
+                                    progress_callback, is_canceled)
+        except BaseException:
+            if os.path.exists(temp_target):
+                os.remove(temp_target)
+            raise
+        os.replace(temp_target, target)
+
+    def download_file(self, key, target_path, progress_callback=None, is_canceled=None):
+        source_path = self._path(key)
+        temp_target = f"{target_path}.part"
+        try:
+            with open(source_path, "rb") as source, open(temp_target, "wb") as f:
+                _copy_with_progress(source, f, os.path.getsize(source_path),
+                                    progress_callback, is_canceled)
+        except BaseException:
+            if os.path.exists(temp_target):
+                os.remove(temp_target)
+            raise
+        os.replace(temp_target, target_path)
+        return target_path
+
+
+class S3Backend:
+    """
+    Binary location in an S3 bucket.
+
+    Args:
+        s3_client: boto3 S3 client, see get_s3_client
+        bucket_name (str): Bucket of the binaries
+        workers (int): Number of parallel requests of a transfer
+        part_size (int): Part size of multipart transfers in bytes
+    """
+
+    name = "S3"
+
+    def __init__(self, s3_client, bucket_name, workers=s3_transfer.DEFAULT_WORKERS,
+                 part_size=s3_transfer.DEFAULT_PART_SIZE_MB * 1024 * 1024):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.part_size = part_size
+
+    def local_path(self, key):
+        return None
+
+    def _is_not_found(self, error):
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def head(self, key):
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        except self.s3_client.exceptions.ClientError as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        return {"size": response["ContentLength"], "etag": response["ETag"]}
+
+    def exists(self, key):
+        return self.head(key) is not None
+
+    def _list_existing(self, prefix, keys):
+        found = set()
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for item in page.get("Contents", []):
+                if item["Key"] in keys:
+                    found.add(item["Key"])
+        return found
+
+    def exists_many(self, keys):
+        """
+        Returns the subset of keys that exist. Keys in the same folder are checked
+        with one listing of the folder instead of a request per key.
+        """
+        folders = {}
+        for key in set(keys):
+            folders.setdefault(key.rpartition("/")[0], set()).add(key)
+
+        found = set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=EXISTS_WORKERS) as executor:
+            futures = []
+            for folder, folder_keys in folders.items():
+                if len(folder_keys) > LIST_THRESHOLD:
+                    prefix = f"{folder}/" if folder else ""
+                    futures.append(executor.submit(self._list_existing, prefix, folder_keys))
+                else:
+                    futures.extend(
+                        executor.submit(lambda key: {key} if self.exists(key) else set(), key)
+                        for key in folder_keys)
+            for future in futures:
+                found.update(future.result())
+        return found
+
+    def put_file(self, key, file_path):
+        self.s3_client.upload_file(file_path, self.bucket_name, key)
+
+    def put_bytes(self, key, data):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+
+    def get_bytes(self, key):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        except self.s3_client.exceptions.ClientError as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        return response["Body"].read()
+
+    def open_stream(self, key, etag=None):
+        """Returns the body of the object, the request fails if etag is given and does not match"""
+        if etag:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key, IfMatch=etag)
+        else:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        return response["Body"]
+
+    def upload_file(self, key, file_path, progress_callback=None, is_canceled=None):
+        return s3_transfer.upload_file(
+            self.s3_client, self.bucket_name, key, file_path,
+            self.workers, self.part_size, progress_callback, is_canceled)
+
+    def download_file(self, key, target_path, progress_callback=None, is_canceled=None):
+        return s3_transfer.download_file(
+            self.s3_client, self.bucket_name, key, target_path,
+            self.workers, self.part_size, progress_callback, is_canceled)
+
+
+class _HttpStream:
+    """Body of an HTTP response that gives the connection back when it is closed"""
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def read(self, size=-1):
+        return self._response.read(None if size is None or size < 0 else size)
+
+    def close(self):
+        # The connection can only be reused once the complete body was read
+        self._release(self._response.isclosed())
+
+
+class HttpCacheBackend:
+    """
+    Binary location behind a cache server in the local network. Reads are served
+    by the cache server, which fetches missing files from the bucket once for the
+    whole office. Writes and batched existence checks go to the upstream backend.
+    If the cache server cannot be reached, everything is read from upstream.
+
+    Args:
+        base_url (str): URL of the cache server, e.g. http://buildcache:8765
+        upstream: S3Backend the cache server reads from
+    """
+
+    name = "LAN cache"
+
+    def __init__(self, base_url, upstream):
+        if "://" not in base_url:
+            base_url = f"http://{base_url}"
+        url = urllib.parse.urlsplit(base_url)
+        self.upstream = upstream
+        self.workers = upstream.workers
+        self._https = url.scheme == "https"
+        self._netloc = url.netloc
+        self._base_path = url.path.rstrip("/")
+        self._local = threading.local()
+        self._available = True
+
+    def _connection(self):
+        # One keep-alive connection per thread, as http.client connections are not thread safe
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            connection = connection_class(self._netloc, timeout=HTTP_TIMEOUT)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _request(self, method, key, headers=None):
+        """Returns the response, None if the cache server is not available"""
+        if not self._available:
+            return None
+        path = f"{self._base_path}/{urllib.parse.quote(key)}"
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.request(method, path, headers=headers or {})
+                return connection.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                # A kept alive connection may have been closed by the server, retry once
+                self._drop_connection()
+                if attempt == 1:
+                    print(f"LAN cache {self._netloc} not available, using {self.upstream.name}: {str(e)}")
+                    self._available = False
+        return None
+
+    def _read_response(self, response):
+        data = response.read()
+        if response.getheader("Connection", "").lower() == "close":
+            self._drop_connection()
+        return data
+
+    def _check_status(self, response, key):
+        if response.status >= 400 and response.status != 404:
+            self._read_response(response)
+            raise OSError(f"LAN cache returned {response.status} {response.reason} for {key}")
+
+    def local_path(self, key):
+        return None
+
+    def head(self, key):
+        response = self._request("HEAD", key)
+        if response is None:
+            return self.upstream.head(key)
+        self._read_response(response)
+        self._check_status(response, key)
+        if response.status == 404:
+            return None
+        return {"size": int(response.getheader("Content-Length", 0)),
+                "etag": response.getheader("ETag", "")}
+
+    def exists(self, key):
+        return self.head(key) is not None
+
+    def exists_many(self, keys):
+        return self.upstream.exists_many(keys)
+
+    def put_file(self, key, file_path):
+        self.upstream.put_file(key, file_path)
+
+    def put_bytes(self, key, data):
+        self.upstream.put_bytes(key, data)
+
+    def upload_file(self, key, file_path, progress_callback=None, is_canceled=None):
+        return self.upstream.upload_file(key, file_path, progress_callback, is_canceled)
+
+    def get_bytes(self, key):
+        response = self._request("GET", key)
+        if response is None:
+            return self.upstream.get_bytes(key)
+        data = self._read_response(response)
+        self._check_status(response, key)
+        return None if response.status == 404 else data
+
+    def open_stream(self, key):
+        response = self._request("GET", key)
+        if response is None:
+            return self.upstream.open_stream(key)
+        self._check_status(response, key)
+        if response.status == 404:
+            self._read_response(response)
+            raise FileNotFoundError(f"{key} not found in the binary location")
+        # The connection stays busy until the stream is closed
+        connection = self._local.connection
+        self._local.connection = None
+
+        def release(reusable):
+            if reusable and getattr(self._local, "connection", None) is None:
+                self._local.connection = connection
+            else:
+                connection.close()
+
+        return _HttpStream(response, release)
+
+    def download_file(self, key, target_path, progress_callback=None, is_canceled=None):
+        """Download a file, an interrupted download is continued with a range request"""
+        head = self.head(key) if self._available else None
+        if not self._available:
+            return self.upstream.download_file(key, target_path, progress_callback, is_canceled)
+        if head is None:
+            raise FileNotFoundError(f"{key} not found in the binary location")
+
+        # The partial file is only continued if it belongs to the same version of the file
+        temp_path = f"{target_path}.part"
+        etag_path = f"{temp_path}.etag"
+        offset = 0
+        if os.path.exists(temp_path) and os.path.exists(etag_path):
+            with open(etag_path, "r", encoding="utf-8") as f:
+                if f.read() == head["etag"]:
+                    offset = min(os.path.getsize(temp_path), head["size"])
+        with open(etag_path, "w", encoding="utf-8") as f:
+            f.write(head["etag"])
+
+        headers = {"Range": f"bytes={offset}-", "If-Range": head["etag"]} if offset else {}
+        response = self._request("GET", key, headers)
+        if response is None:
+            return self.upstream.download_file(key, target_path, progress_callback, is_canceled)
+        self._check_status(response, key)
+        if response.status == 404:
+            self._read_response(response)
+            raise FileNotFoundError(f"{key} not found in the binary location")
+        if response.status != 206:
+            offset = 0
+
+        def report(done, total):
+            progress_callback(offset + done, total)
+
+        try:
+            with open(temp_path, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                done = _copy_with_progress(
+                    response, f, head["size"], report if progress_callback else None, is_canceled)
+        except BaseException:
+            # The partial file is kept for the next attempt, the connection is not reusable
+            self._drop_connection()
+            raise
+        if offset + done != head["size"]:
+            raise s3_transfer.TransferVerificationError(f"Incomplete download of {key}")
+        os.replace(temp_path, target_path)
+        os.remove(etag_path)
+        return target_path
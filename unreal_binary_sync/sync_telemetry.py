@@ -0,0 +1,245 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# Timing of the phases of a push or pull. A run is started when the action starts,
+# and every phase (scan, compile, compress, upload, download, extract, setup, ...)
+# is measured as a span with its duration, the processed bytes and files and
+# whether it succeeded. Spans are appended as JSON lines to a log file on this
+# computer, so a slow pull on an artist machine can be analyzed afterwards.
+# Without a started run, spans are measured but not written anywhere.
+#
+# ThrottledProgress wraps an ap.Progress and forwards at most a few updates per
+# second, as updating the UI for every file slows down large transfers.
+
+LOG_FILE_NAME = "binary_sync.jsonl"
+# The log is rotated to binary_sync.jsonl.1 when it grows beyond this size
+MAX_LOG_SIZE = 5 * 1024 * 1024  # 5 MB
+PROGRESS_INTERVAL = 0.2  # seconds between progress updates
+
+_lock = threading.Lock()
+_run = None
+
+
+def get_default_log_dir():
+    base_dir = os.environ.get("LOCALAPPDATA") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "Anchorpoint", "unreal_binary_sync", "logs")
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.bytes = 0
+        self.files = 0
+        self.status = "ok"
+        self.error = None
+        self.start_time = time.time()
+        self.seconds = 0.0
+
+    def add(self, num_bytes=0, files=0):
+        self.bytes += num_bytes
+        self.files += files
+
+    def fail(self, error=None):
+        """Mark the span as failed, for phases that report errors without raising"""
+        self.status = "error"
+        self.error = error
+
+    def throughput(self):
+        """Returns the processed data in MB per second"""
+        if not self.seconds:
+            return 0.0
+        return self.bytes / (1024 * 1024) / self.seconds
+
+    def to_dict(self):
+        record = {
+            "span": self.name,
+            "start": round(self.start_time, 3),
+            "seconds": round(self.seconds, 3),
+            "bytes": self.bytes,
+            "files": self.files,
+            "status": self.status
+        }
+        if self.error:
+            record["error"] = self.error
+        record.update(self.attributes)
+        return record
+
+
+class Run:
+    """
+    All spans of one push or pull.
+
+    Args:
+        operation (str): "push" or "pull"
+        log_path (str): JSON lines file the spans are appended to, None to not write them
+    """
+
+    def __init__(self, operation, log_path=None, **attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.operation = operation
+        self.log_path = log_path
+        self.attributes = attributes
+        self.start_time = time.perf_counter()
+        self.spans = []
+        # Outcome reported while the run was going on, see set_run_status
+        self.status = None
+
+    def write(self, record):
+        if not self.log_path:
+            return
+        record = {"run": self.id, "operation": self.operation, **record}
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > MAX_LOG_SIZE:
+                os.replace(self.log_path, f"{self.log_path}.1")
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Could not write the sync log: {str(e)}")
+
+    def add_span(self, span):
+        with _lock:
+            self.spans.append(span)
+            self.write(span.to_dict())
+
+    def finish(self, status="ok"):
+        seconds = time.perf_counter() - self.start_time
+        with _lock:
+            self.write({"span": self.operation, "seconds": round(seconds, 3),
+                        "status": status, **self.attributes})
+            spans = list(self.spans)
+        parts = []
+        for span in spans:
+            text = f"{span.name} {span.seconds:.1f}s"
+            if span.bytes and span.seconds:
+                text += f" ({span.bytes / (1024 * 1024):.1f} MB, {span.throughput():.1f} MB/s)"
+            if span.status != "ok":
+                text += f" [{span.status}]"
+            parts.append(text)
+        print(f"{self.operation.capitalize()} finished in {seconds:.1f}s: {', '.join(parts)}")
+
+
+def start_run(operation, log_dir=None, **attributes):
+    """Start measuring a push or pull, spans are written to the log in log_dir"""
+    global _run
+    log_path = os.path.join(log_dir or get_default_log_dir(), LOG_FILE_NAME)
+    run = Run(operation, log_path, **attributes)
+    with _lock:
+        _run = run
+    return run
+
+
+def set_run_status(status):
+    """
+    Record the outcome of the current run, e.g. "skipped" if there was nothing
+    to do or "canceled". It is used by finish_run instead of a failed status.
+    """
+    with _lock:
+        if _run:
+            _run.status = status
+
+
+def finish_run(status="ok"):
+    """Finish the current run, a failed run keeps the status set with set_run_status"""
+    global _run
+    with _lock:
+        run, _run = _run, None
+    if run:
+        run.finish(run.status if status == "failed" and run.status else status)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Measure a phase of the current run.
+
+        with sync_telemetry.span("extract", archive=name) as s:
+            ...
+            s.add(num_bytes, files)
+    """
+    current = Span(name, attributes)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "canceled" if type(e).__name__.endswith("CanceledException") else "error"
+        current.error = current.error or str(e) or type(e).__name__
+        raise
+    finally:
+        current.seconds = time.perf_counter() - start
+        with _lock:
+            run = _run
+        if run:
+            run.add_span(current)
+
+
+class ThrottledProgress:
+    """
+    Wraps an ap.Progress and drops updates that follow each other too closely.
+    A dropped text is shown once the interval has passed, even without another
+    update, and a complete progress is always shown.
+    """
+
+    def __init__(self, progress, interval=PROGRESS_INTERVAL):
+        self._progress = progress
+        self._interval = interval
+        self._last_text_time = 0.0
+        self._last_value_time = 0.0
+        self._shown_text = None
+        self._pending_text = None
+        self._timer = None
+        self._text_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._progress, name)
+
+    def _flush_text(self, now, force=False):
+        with self._text_lock:
+            if self._pending_text is None:
+                return
+            wait = self._interval - (now - self._last_text_time)
+            if not force and wait > 0:
+                # Show the text when the interval has passed, in case no further update comes
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._flush_pending)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            text, self._pending_text = self._pending_text, None
+            self._shown_text = text
+            self._last_text_time = now
+            self._progress.set_text(text)
+
+    def _flush_pending(self):
+        with self._text_lock:
+            self._timer = None
+        self._flush_text(time.monotonic(), force=True)
+
+    def set_text(self, text):
+        with self._text_lock:
+            if text == self._shown_text:
+                self._pending_text = None
+                return
+            self._pending_text = text
+        self._flush_text(time.monotonic())
+
+    def report_progress(self, value):
+        now = time.monotonic()
+        self._flush_text(now, value >= 1.0)
+        if value >= 1.0 or now - self._last_value_time >= self._interval:
+            self._last_value_time = now
+            self._progress.report_progress(value)
+
+    def finish(self):
+        with self._text_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._flush_text(time.monotonic(), force=True)
+        self._progress.finish()
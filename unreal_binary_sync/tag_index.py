@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import git_helper
+
+# Persistent index of the binary tags of a repository. Finding the binaries for
+# the current commit means finding the newest tag matching the tag pattern that
+# is reachable from HEAD. The matching tags are read with a single for-each-ref
+# and the answer is cached per HEAD commit in the .git folder. The cache is
+# fingerprinted with the tag refs on disk, so a pull without new commits or tags
+# does not spawn git at all. When tags change, only the added tags are checked
+# against the cached answer instead of resolving everything again.
+
+INDEX_FILE_NAME = "ap_binary_sync_tags.json"
+INDEX_VERSION = 1
+# Number of HEAD commits the answer is kept for, e.g. when switching branches
+MAX_RESOLVED_COMMITS = 100
+
+
+def get_index_path(common_dir):
+    return os.path.join(common_dir, INDEX_FILE_NAME)
+
+
+def get_refs_fingerprint(common_dir):
+    """Returns a fingerprint that changes whenever a tag is added, moved or deleted"""
+    entries = []
+    packed_refs = os.path.join(common_dir, "packed-refs")
+    if os.path.exists(packed_refs):
+        stat = os.stat(packed_refs)
+        entries.append(("packed-refs", stat.st_mtime_ns, stat.st_size))
+
+    # Loose tags are replaced through a rename, which updates their modification time
+    pending = [os.path.join(common_dir, "refs", "tags")]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        stat = entry.stat(follow_symlinks=False)
+                        entries.append((os.path.relpath(entry.path, common_dir),
+                                        stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            continue
+
+    entries.sort()
+    return hashlib.sha1(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+def list_matching_tags(project_path, tag_pattern, git_exe=None):
+    """
+    Returns the tags containing the tag pattern as [name, commit, commit date],
+    newest commit first. Annotated tags are resolved to the commit they point to.
+    """
+    output = git_helper.run_git(
+        ["for-each-ref",
+         "--format=%(refname)%09%(objectname)%09%(*objectname)%09%(committerdate:unix)%09%(*committerdate:unix)",
+         "refs/tags"],
+        project_path, git_exe).stdout
+
+    tags = []
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) != 5:
+            continue
+        ref, object_id, peeled_id, date, peeled_date = parts
+        name = ref[len("refs/tags/"):]
+        if tag_pattern not in name:
+            continue
+        tags.append([name, peeled_id or object_id, int(peeled_date or date or 0)])
+    tags.sort(key=lambda tag: (tag[2], tag[0]), reverse=True)
+    return tags
+
+
+def _get_merged_tags(project_path, head, git_exe):
+    output = git_helper.run_git(
+        ["for-each-ref", "--merged", head, "--format=%(refname)", "refs/tags"],
+        project_path, git_exe).stdout
+    return {line[len("refs/tags/"):] for line in output.splitlines() if line}
+
+
+def _is_ancestor(project_path, commit, head, git_exe):
+    if commit == head:
+        return True
+    result = git_helper.run_git(
+        ["merge-base", "--is-ancestor", commit, head], project_path, git_exe, check=False)
+    return result.returncode == 0
+
+
+def _resolve(project_path, head, tags, git_exe):
+    """Returns the newest tag reachable from head, all reachable tags are listed in one call"""
+    if not tags:
+        return None
+    merged = _get_merged_tags(project_path, head, git_exe)
+    return next((tag for tag in tags if tag[0] in merged), None)
+
+
+def _resolve_added_tags(project_path, head, cached, added_tags, git_exe):
+    # Only tags on newer commits than the cached answer can replace it
+    for tag in added_tags:
+        if cached and tag[2] < cached[2]:
+            break
+        if _is_ancestor(project_path, tag[1], head, git_exe):
+            return tag
+    return cached
+
+
+def _load_index(index_path, tag_pattern):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("tag_pattern") != tag_pattern:
+        return None
+    return index
+
+
+def _save_index(index_path, index):
+    temp_path = f"{index_path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        print(f"Could not write the tag index: {str(e)}")
+
+
+def find_matching_commit(project_path, tag_pattern, git_exe=None):
+    """
+    Find the newest commit reachable from HEAD that has a tag containing the tag pattern.
+
+    Returns:
+        tuple: (commit_id, tag) or (None, None) if no commit is tagged
+    """
+    head = git_helper.read_head_commit(project_path, git_exe)
+    git_dir = git_helper.get_git_dir(project_path)
+    if not git_dir:
+        tags = list_matching_tags(project_path, tag_pattern, git_exe)
+        match = _resolve(project_path, head, tags, git_exe)
+        return (match[1], match[0]) if match else (None, None)
+
+    common_dir = git_helper.get_common_dir(git_dir)
+    index_path = get_index_path(common_dir)
+    fingerprint = get_refs_fingerprint(common_dir)
+    index = _load_index(index_path, tag_pattern)
+
+    if index and index["fingerprint"] == fingerprint:
+        if head in index["resolved"]:
+            match = index["resolved"][head]
+            return (match[1], match[0]) if match else (None, None)
+        tags = index["tags"]
+        match = _resolve(project_path, head, tags, git_exe)
+        resolved = index["resolved"]
+    else:
+        tags = list_matching_tags(project_path, tag_pattern, git_exe)
+        resolved = {}
+        cached = index["resolved"].get(head, False) if index else False
+        current = {tag[0]: tag for tag in tags}
+        if cached is not False and (cached is None or current.get(cached[0]) == cached):
+            # The cached answer still exists, check whether a new tag is closer to HEAD
+            previous = {tag[0]: tag[1] for tag in index["tags"]}
+            added_tags = [tag for tag in tags if previous.get(tag[0]) != tag[1]]
+            match = _resolve_added_tags(project_path, head, cached, added_tags, git_exe)
+        else:
+            match = _resolve(project_path, head, tags, git_exe)
+
+    resolved.pop(head, None)
+    resolved[head] = match
+    while len(resolved) > MAX_RESOLVED_COMMITS:
+        resolved.pop(next(iter(resolved)))
+
+    _save_index(index_path, {
+        "version": INDEX_VERSION,
+        "tag_pattern": tag_pattern,
+        "fingerprint": fingerprint,
+        "tags": tags,
+        "resolved": resolved
+    })
+    return (match[1], match[0]) if match else (None, None)
@@ -0,0 +1,115 @@
+import shutil
+import struct
+import zipfile
+
+# Low level helpers to write and read ZIP entries whose data is compressed outside
+# of zipfile. This allows compressing entries on several threads and writing the
+# already compressed data to the archive afterwards, and it adds Zstandard
+# (method 93 of the ZIP specification) which zipfile only supports from Python 3.14.
+
+ZIP_ZSTANDARD = 93
+ZSTANDARD_VERSION = 63
+
+CODECS = {
+    "store": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "lzma": zipfile.ZIP_LZMA,
+    "zstd": ZIP_ZSTANDARD
+}
+
+# Compression levels every codec accepts, codecs without an entry have no levels
+LEVEL_RANGES = {
+    "deflate": (0, 9),
+    "zstd": (1, 22)
+}
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MB
+_LOCAL_HEADER_FORMAT = "<4s5H3L2H"
+_LOCAL_HEADER_SIZE = struct.calcsize(_LOCAL_HEADER_FORMAT)
+
+
+def _import_zstandard():
+    try:
+        import zstandard  # pyright: ignore[reportMissingImports]
+    except ImportError:
+        raise RuntimeError(
+            "Zstandard compressed archives require the zstandard module")
+    return zstandard
+
+
+def clamp_level(codec, level):
+    """Returns the level limited to the range of the codec, None if the codec has no levels"""
+    level_range = LEVEL_RANGES.get(codec)
+    if level is None or level_range is None:
+        return None
+    return min(max(level, level_range[0]), level_range[1])
+
+
+def get_compressor(compress_type, level=None):
+    """Returns a compressor with compress() and flush(), or None for stored entries"""
+    if compress_type == ZIP_ZSTANDARD:
+        zstandard = _import_zstandard()
+        return zstandard.ZstdCompressor(level=level if level is not None else 3).compressobj()
+    return zipfile._get_compressor(compress_type, level)
+
+
+def get_decompressor(compress_type):
+    """Returns a decompressor with decompress(), or None for stored entries"""
+    if compress_type == ZIP_ZSTANDARD:
+        zstandard = _import_zstandard()
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zipfile._get_decompressor(compress_type)
+
+
+def requires_zstandard(infos):
+    return any(info.compress_type == ZIP_ZSTANDARD for info in infos)
+
+
+def get_data_offset(fp, info):
+    """Returns the offset of the compressed data of an entry by reading its local header"""
+    fp.seek(info.header_offset)
+    header = fp.read(_LOCAL_HEADER_SIZE)
+    if len(header) != _LOCAL_HEADER_SIZE or header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    name_length, extra_length = struct.unpack("<2H", header[26:30])
+    return info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+
+
+def write_raw_entry(zip_file, zinfo, data_stream):
+    """
+    Write an entry with already compressed data to an archive opened for writing.
+
+    Args:
+        zip_file (ZipFile): Archive opened with mode "w", "x" or "a"
+        zinfo (ZipInfo): Entry with compress_type, CRC, file_size and compress_size set
+        data_stream: Readable file object with the compressed data
+    """
+    if zip_file.mode not in ("w", "x", "a") or not zip_file.fp:
+        raise ValueError("Archive is not open for writing")
+    if zip_file._writing:
+        raise ValueError("Can't write to the ZIP file while there is another write handle open on it")
+
+    zinfo.flag_bits = 0x00
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        # Compressed data includes an end-of-stream (EOS) marker
+        zinfo.flag_bits |= 0x02
+    if zinfo.compress_type == ZIP_ZSTANDARD:
+        zinfo.create_version = max(zinfo.create_version, ZSTANDARD_VERSION)
+        zinfo.extract_version = max(zinfo.extract_version, ZSTANDARD_VERSION)
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    if zip64 and not zip_file._allowZip64:
+        raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+
+    if zip_file._seekable:
+        zip_file.fp.seek(zip_file.start_dir)
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file._didModify = True
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    shutil.copyfileobj(data_stream, zip_file.fp, COPY_CHUNK_SIZE)
+    zip_file.start_dir = zip_file.fp.tell()
+
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
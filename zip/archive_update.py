@@ -0,0 +1,128 @@
+import os
+import shutil
+import struct
+import zipfile
+import zlib
+
+# Refreshing an existing archive. The central directories of the archive, or of
+# its volumes, tell which files were already added. A file whose size and
+# modification time match its entry is read once to compare the CRC-32, and if
+# that matches as well, the compressed data of the entry is copied into the new
+# archive as it is. Only new and modified files are compressed again, so
+# updating a large archive costs reading the files instead of deflating them.
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MB
+_LOCAL_HEADER_FORMAT = "<4s5H3L2H"
+_LOCAL_HEADER_SIZE = struct.calcsize(_LOCAL_HEADER_FORMAT)
+
+
+def get_archive_paths(output_path, get_volume_path):
+    """Returns the existing archive and its existing volumes"""
+    paths = [output_path] if os.path.isfile(output_path) else []
+    index = 1
+    while os.path.isfile(volume_path := get_volume_path(output_path, index)):
+        paths.append(volume_path)
+        index += 1
+    return paths
+
+
+def read_entries(archive_paths):
+    """
+    Read the central directories of existing archives.
+
+    Returns:
+        dict: Entry names mapped to (archive_path, ZipInfo)
+    """
+    entries = {}
+    for archive_path in archive_paths:
+        try:
+            with zipfile.ZipFile(archive_path, "r") as archive:
+                for info in archive.infolist():
+                    # Encrypted entries cannot be reused without the password
+                    if not info.is_dir() and not info.flag_bits & 0x01:
+                        entries[info.filename] = (archive_path, info)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"Cannot read the existing archive {archive_path}, it is not reused: {str(e)}")
+    return entries
+
+
+def get_file_crc(file_path):
+    crc = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(COPY_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def is_unchanged(info, file_path, arc_name):
+    """True if the file has the size, modification time and CRC-32 of the entry"""
+    current = zipfile.ZipInfo.from_file(file_path, arc_name)
+    # ZIP entries store the seconds of the modification time rounded down to even numbers
+    date_time = current.date_time[:5] + (current.date_time[5] // 2 * 2,)
+    if current.file_size != info.file_size or date_time != tuple(info.date_time):
+        return False
+    return get_file_crc(file_path) == info.CRC
+
+
+def get_data_offset(fp, info):
+    """Returns the offset of the compressed data of an entry by reading its local header"""
+    fp.seek(info.header_offset)
+    header = fp.read(_LOCAL_HEADER_SIZE)
+    if len(header) != _LOCAL_HEADER_SIZE or header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    name_length, extra_length = struct.unpack("<2H", header[26:30])
+    return info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+
+
+class _LimitedReader:
+    def __init__(self, fp, size):
+        self.fp = fp
+        self.remaining = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fp.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def copy_entry(zip_file, source_fp, info):
+    """
+    Copy the compressed data of an entry into an archive opened for writing,
+    without decompressing it.
+
+    Args:
+        zip_file (ZipFile): Archive opened with mode "w"
+        source_fp: Binary file object of the archive the entry is read from
+        info (ZipInfo): Entry of the source archive
+    """
+    if zip_file._writing:
+        raise ValueError("Can't write to the ZIP file while there is another write handle open on it")
+
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = info.compress_size
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    # Keep the compression options, e.g. the end-of-stream marker of LZMA entries
+    zinfo.flag_bits |= info.flag_bits & 0x06
+
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    data_offset = get_data_offset(source_fp, info)
+    source_fp.seek(data_offset)
+
+    zip_file.fp.seek(zip_file.start_dir)
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file._didModify = True
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    reader = _LimitedReader(source_fp, info.compress_size)
+    shutil.copyfileobj(reader, zip_file.fp, COPY_CHUNK_SIZE)
+    if reader.remaining:
+        raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+    zip_file.start_dir = zip_file.fp.tell()
+
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
@@ -1,92 +1,128 @@
 from typing import cast
 import anchorpoint as ap
 import apsync as aps
-import zipfile
+import concurrent.futures
+import itertools
 import os
-import re
-
-
-class ZippingCanceledException(Exception):
-    pass
-
-
-def zip_files(files, base_folder, output_path, ignore_extensions, ignore_folders, exclude_incremental_saves):
-    progress = ap.Progress("Creating ZIP Archive", infinite=False)
+import threading
+import time
+import directory_walker
+import ignore_rules
+import incremental_saves
+import volume_writer
+
+
+# Archives of separate folders that are written at the same time
+MAX_PARALLEL_ARCHIVES = 4
+# Settings store the volume size in GB, 0 writes a single archive
+GB = 1024 * 1024 * 1024
+# Minimum time between progress updates, every update is a call into Anchorpoint
+PROGRESS_INTERVAL = 0.2  # seconds
+
+
+def create_file_source(rules, selected_files, selected_folders, base_folder, exclude_incremental_saves):
+    """Returns (walker, number of selected files, files), files yields (file_path, arc_name) while the walker scans"""
+    def get_rule_path(path):
+        # Only rules with a slash need the path relative to the archive root
+        if not rules.matches_paths:
+            return None
+        return os.path.relpath(path, base_folder).replace(os.sep, "/")
+
+    # Ignored folders are not scanned at all, ignored files never reach the archive loop
+    walker = directory_walker.ParallelWalker(
+        selected_folders,
+        skip_directory=lambda path, name: rules.is_ignored_directory(name, get_rule_path(path)),
+        skip_file=lambda path, name: rules.is_ignored_file(name, get_rule_path(path)),
+        # Only the latest version of incremental saves is added, decided per folder listing
+        select_files=incremental_saves.get_latest_versions if exclude_incremental_saves else None)
+    selected_files = [
+        file for file in selected_files
+        if not rules.is_ignored_path(os.path.relpath(file, base_folder))]
+    if exclude_incremental_saves:
+        selected_files = incremental_saves.get_latest_versions(selected_files)
+    files = ((file, os.path.relpath(file, base_folder))
+             for file in itertools.chain(selected_files, walker))
+    return walker, len(selected_files), files
+
+
+def zip_files(selected_files, selected_folders, base_folder, output_path, ignore_extensions, ignore_folders,
+              exclude_incremental_saves, volume_size=0, archive_per_folder=False, update_existing=False):
+    """Returns the paths of the created archives, None if zipping failed or was canceled"""
+    # The folders are scanned while the archive is written, the total is known once the scan is done
+    progress = ap.Progress("Creating ZIP Archive", "Searching files...", infinite=True)
     progress.set_cancelable(True)
 
-    temp_output_path = f"{output_path}.part"
-    archive = None
+    rules = ignore_rules.IgnoreRules(ignore_extensions, ignore_folders)
 
-    ignore_extensions = [ext.lower() for ext in ignore_extensions]
-    ignore_folders = [folder.lower() for folder in ignore_folders]
+    # Every selected folder gets its own archive, loose files go to the named archive
+    jobs = []
+    if archive_per_folder and len(selected_folders) > 1:
+        output_dir = os.path.dirname(output_path)
+        for folder in selected_folders:
+            folder = os.path.normpath(folder)
+            jobs.append((os.path.join(output_dir, f"{os.path.basename(folder)}.zip"),
+                         [], [folder], os.path.dirname(folder)))
+        if selected_files:
+            jobs.append((output_path, selected_files, [], base_folder))
+    else:
+        jobs.append((output_path, selected_files, selected_folders, base_folder))
+
+    sources = [create_file_source(rules, files, folders, job_base_folder, exclude_incremental_saves)
+               for _, files, folders, job_base_folder in jobs]
+    walkers = [walker for walker, _, _ in sources]
+    lock = threading.Lock()
+    done_files = [0]
+    last_update = [0.0]
+
+    def report(arc_name):
+        with lock:
+            done_files[0] += 1
+            now = time.monotonic()
+            if now - last_update[0] < PROGRESS_INTERVAL:
+                return
+            last_update[0] = now
+            # The total is only known once all folders are scanned
+            if all(walker.finished for walker in walkers):
+                total_files = sum(walker.files_found + selected for walker, selected, _ in sources)
+                progress.set_text(f"Zipping {done_files[0]} of {total_files} files")
+                progress.report_progress(done_files[0] / max(total_files, 1))
+            else:
+                progress.set_text(f"Zipping {done_files[0]} files")
+
+    def write(job, source):
+        return volume_writer.write_volumes(
+            source[2], job[0], volume_size, progress_callback=report,
+            is_canceled=lambda: progress.canceled, update=update_existing)
 
     try:
-        archive = zipfile.ZipFile(temp_output_path, 'w', zipfile.ZIP_DEFLATED)
-        total_files = len(files)
-
-        # To keep track of the highest numbered files
-        incremental_files = {}
-
-        for index, file in enumerate(files):
-            if progress.canceled:
-                raise ZippingCanceledException
-
-            file_lower = file.lower()
-            if not any(file_lower.endswith(ext) for ext in ignore_extensions) and \
-               not any(ignored_folder in file_lower for ignored_folder in ignore_folders):
-                if exclude_incremental_saves:
-                    # Extract the base name and version number
-                    match = re.match(r"(.*)(_v\d+)(\.\w+)",
-                                     os.path.basename(file), re.IGNORECASE)
-                    if match:
-                        base_name = match.group(1)
-                        version = int(match.group(2)[2:])
-                        extension = match.group(3)
-                        key = (base_name.lower(), extension.lower())
-
-                        if key not in incremental_files or incremental_files[key][1] < version:
-                            incremental_files[key] = (file, version)
-                    else:
-                        # If not matching the incremental pattern, add it directly
-                        relative_path = os.path.relpath(file, base_folder)
-                        archive.write(file, relative_path)
-                        progress.set_text(f"Zipping {relative_path}")
-                        progress.report_progress((index + 1) / total_files)
-                else:
-                    relative_path = os.path.relpath(file, base_folder)
-                    archive.write(file, relative_path)
-                    progress.set_text(f"Zipping {relative_path}")
-                    progress.report_progress((index + 1) / total_files)
-
-        if exclude_incremental_saves:
-            for file, _ in incremental_files.values():
-                relative_path = os.path.relpath(file, base_folder)
-                archive.write(file, relative_path)
-
-        archive.close()
-        os.rename(temp_output_path, output_path)  # Rename to final output path
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(jobs), MAX_PARALLEL_ARCHIVES)) as executor:
+            results = list(executor.map(write, jobs, sources))
         progress.finish()
-        return True
+        return [path for output_paths in results for path in output_paths]
 
-    except ZippingCanceledException:
-        if archive is not None:
-            archive.close()  # Ensure the archive is closed properly
-        if os.path.exists(temp_output_path):
-            os.remove(temp_output_path)  # Delete the partially created archive
+    except volume_writer.VolumeCanceledException:
         progress.finish()
-        return False
+        return None
 
     except Exception as e:
-        if archive is not None:
-            archive.close()  # Ensure the archive is closed properly
-        if os.path.exists(temp_output_path):
-            os.remove(temp_output_path)  # Delete the partially created archive
+        print(f"Zipping failed: {str(e)}")
         progress.finish()
-        return False
+        return None
+
+    finally:
+        for walker in walkers:
+            walker.close()
 
 def run_action():
     main()
 
+def get_volume_size_gb(settings):
+    try:
+        return max(0.0, float(settings.get("volume_size_gb", 0) or 0))
+    except ValueError:
+        return 0.0
+
+
 def get_default_archive_name(selected_files, selected_folders):
     if len(selected_files) + len(selected_folders) == 1:
         path = selected_files[0] if selected_files else selected_folders[0]
@@ -113,6 +149,10 @@ def main():
     suggested_archive_name = get_default_archive_name(selected_files, selected_folders)
     exclude_incremental_saves = settings.get(
         "exclude_incremental_saves", False)
+    volume_size = int(get_volume_size_gb(settings) * GB)
+    archive_per_folder = settings.get("archive_per_folder", False)
+    # Unchanged files are copied from an existing archive instead of compressing them again
+    update_existing = settings.get("update_existing_archive", False)
 
     if selected_files:
         output_dir = os.path.dirname(selected_files[0])
@@ -125,41 +165,27 @@ def main():
     if not os.path.isdir(output_dir):
         output_dir = os.path.dirname(output_dir)
 
-    all_files = []
     base_folder = output_dir
 
-    if (selected_files or selected_folders):
-        for file in selected_files:
-            all_files.append(file)
+    # The folders are scanned in the async job, so the dialog opens immediately
+    if not (selected_files or selected_folders):
+        selected_folders = [ctx.path]
 
-        for folder in selected_folders:
-            for root, dirs, files in os.walk(folder):
-                # Remove ignored folders from the search
-                dirs[:] = [d for d in dirs if d.lower() not in ignore_folders]
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    all_files.append(full_path)
-
-            if folder and base_folder not in folder:
-                base_folder = os.path.commonpath([base_folder, folder])
-
-    else:
-        for root, dirs, files in os.walk(ctx.path):
-            # Remove ignored folders from the search
-            dirs[:] = [d for d in dirs if d.lower() not in ignore_folders]
-            for file in files:
-                full_path = os.path.join(root, file)
-                all_files.append(full_path)
-        if ctx.path and base_folder not in ctx.path:
-                base_folder = os.path.commonpath([base_folder, ctx.path])
+    for folder in selected_folders:
+        if folder and base_folder not in folder:
+            base_folder = os.path.commonpath([base_folder, folder])
 
     # Run the zipping process asynchronously
     def zip_and_notify(output_zip):
-        success = zip_files(all_files, base_folder, output_zip,
-                            ignore_extensions, ignore_folders, exclude_incremental_saves)
-        if success:
+        output_paths = zip_files(selected_files, selected_folders, base_folder, output_zip,
+                                 ignore_extensions, ignore_folders, exclude_incremental_saves,
+                                 volume_size, archive_per_folder, update_existing)
+        if output_paths and len(output_paths) > 1:
+            ui.show_success(f"{len(output_paths)} archives have been created",
+                            f"Take a look at {os.path.basename(output_paths[0])}")
+        elif output_paths:
             ui.show_success("Archive has been created",
-                            f"Take a look at {os.path.basename(output_zip)}")
+                            f"Take a look at {os.path.basename(output_paths[0])}")
         else:
             ui.show_error("Zipping Failed or Canceled",
                           "The archive could not be created.")
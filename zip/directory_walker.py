@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+
+# Multi threaded replacement for os.walk. Directories are listed with os.scandir
+# on a thread pool, which hides the latency of network drives where every listing
+# is a round trip. Found files are handed to the consumer through a bounded queue,
+# so archiving starts while the scan is still running and the scanner waits
+# instead of holding every path in memory. Like os.walk, symlinked directories are
+# not followed and directories that cannot be read are skipped.
+
+DEFAULT_WORKERS = 8
+MAX_QUEUED_FILES = 4096
+
+_DONE = object()
+
+
+class ParallelWalker:
+    """
+    Iterates the files below the given directories, in no particular order.
+
+    Args:
+        roots (list): Directories to scan
+        workers (int): Number of directories that are listed at the same time
+        max_queued_files (int): Found files that are buffered until the consumer takes them
+        skip_directory (callable): Called with (path, name) of every subdirectory,
+            returns True if the directory should not be scanned
+        skip_file (callable): Called with (path, name) of every file, returns True
+            if the file should not be returned
+        select_files (callable): Called with the paths of the remaining files of a
+            directory, returns the paths to return. Used for decisions that need
+            the whole listing, e.g. keeping only the latest incremental save.
+    """
+
+    def __init__(self, roots, workers=DEFAULT_WORKERS, max_queued_files=MAX_QUEUED_FILES,
+                 skip_directory=None, skip_file=None, select_files=None):
+        self.roots = list(roots)
+        self.workers = workers
+        self.skip_directory = skip_directory
+        self.skip_file = skip_file
+        self.select_files = select_files
+        # Number of files found so far, it is final once finished is True
+        self.files_found = 0
+        self.finished = False
+        self._files = queue.Queue(max_queued_files)
+        self._directories = queue.Queue()
+        self._pending_directories = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _put_file(self, item):
+        while not self._stop.is_set():
+            try:
+                self._files.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _scan(self, directory):
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if self._stop.is_set():
+                        return
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    if not is_dir:
+                        if not (self.skip_file and self.skip_file(entry.path, entry.name)):
+                            files.append(entry.path)
+                    elif not entry.is_symlink() and not (
+                            self.skip_directory and self.skip_directory(entry.path, entry.name)):
+                        with self._lock:
+                            self._pending_directories += 1
+                        self._directories.put(entry.path)
+        except OSError:
+            pass
+
+        # The files of a directory are passed on once it is listed completely
+        if self.select_files and files:
+            files = self.select_files(files)
+        with self._lock:
+            self.files_found += len(files)
+        for path in files:
+            self._put_file(path)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                directory = self._directories.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if directory is _DONE:
+                return
+            try:
+                self._scan(directory)
+            finally:
+                with self._lock:
+                    self._pending_directories -= 1
+                    finished = self._pending_directories == 0
+                if finished:
+                    # The last listed directory ends the scan
+                    self.finished = True
+                    for _ in self._threads:
+                        self._directories.put(_DONE)
+                    self._put_file(_DONE)
+
+    def __iter__(self):
+        if not self.roots:
+            self.finished = True
+            return
+        self._pending_directories = len(self.roots)
+        for root in self.roots:
+            self._directories.put(root)
+        self._threads = [
+            threading.Thread(target=self._work, name="zip-scan", daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        try:
+            while (path := self._files.get()) is not _DONE:
+                yield path
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the scan, e.g. when the consumer was canceled"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,104 @@
+import fnmatch
+import re
+
+# The ignore settings of the Zip action compiled into lookups that do not depend
+# on the number of rules. Plain entries are matched by exact name: "blend1"
+# ignores files with the extension .blend1 (also "tar.gz" style extensions), and
+# "temp" ignores every folder named temp, but not a folder named temp_renders.
+# Entries with wildcards are gitignore style globs, e.g. "*_backup" or
+# "renders/*.exr". Globs without a slash are matched against the name, globs with
+# a slash against the path relative to the archive root. All globs of a kind are
+# compiled into a single regular expression. Matching ignores the case.
+
+GLOB_CHARACTERS = ("*", "?", "[")
+
+
+def _is_glob(rule):
+    return any(character in rule for character in GLOB_CHARACTERS)
+
+
+def _compile(globs):
+    if not globs:
+        return None
+    return re.compile("|".join(fnmatch.translate(glob) for glob in globs))
+
+
+class IgnoreRules:
+    """
+    Args:
+        extensions (list): File extensions or file name globs to ignore
+        folders (list): Folder names or folder globs to ignore
+    """
+
+    def __init__(self, extensions=(), folders=()):
+        self.extensions = set()
+        self.folders = set()
+        file_name_globs, file_path_globs = [], []
+        folder_name_globs, folder_path_globs = [], []
+
+        for rule in extensions:
+            rule = rule.strip().lower().replace("\\", "/")
+            if not rule:
+                continue
+            if not _is_glob(rule):
+                self.extensions.add(rule.lstrip("."))
+            elif "/" in rule:
+                file_path_globs.append(rule.lstrip("/"))
+            else:
+                file_name_globs.append(rule)
+
+        for rule in folders:
+            rule = rule.strip().lower().replace("\\", "/").strip("/")
+            if not rule:
+                continue
+            if "/" in rule:
+                folder_path_globs.append(rule)
+            elif _is_glob(rule):
+                folder_name_globs.append(rule)
+            else:
+                self.folders.add(rule)
+
+        self._file_names = _compile(file_name_globs)
+        self._file_paths = _compile(file_path_globs)
+        self._folder_names = _compile(folder_name_globs)
+        self._folder_paths = _compile(folder_path_globs)
+        # Relative paths only have to be computed if a rule needs them
+        self.matches_paths = bool(file_path_globs or folder_path_globs)
+
+    def is_ignored_directory(self, name, relative_path=None):
+        """
+        Args:
+            name (str): Name of the folder
+            relative_path (str): Path below the archive root with forward slashes,
+                only needed if matches_paths is True
+        """
+        name = name.lower()
+        if name in self.folders:
+            return True
+        if self._folder_names and self._folder_names.match(name):
+            return True
+        return bool(self._folder_paths and relative_path is not None
+                    and self._folder_paths.match(relative_path.lower()))
+
+    def is_ignored_file(self, name, relative_path=None):
+        """Check a file by name, the folders it is in are not checked"""
+        name = name.lower()
+        if self.extensions:
+            # Every dot starts a possible extension, e.g. "gz" and "tar.gz"
+            position = name.find(".")
+            while position != -1:
+                if name[position + 1:] in self.extensions:
+                    return True
+                position = name.find(".", position + 1)
+        if self._file_names and self._file_names.match(name):
+            return True
+        return bool(self._file_paths and relative_path is not None
+                    and self._file_paths.match(relative_path.lower()))
+
+    def is_ignored_path(self, relative_path):
+        """Check a file and all folders above it, for files that were not found by a pruned scan"""
+        parts = relative_path.replace("\\", "/").split("/")
+        for index, folder in enumerate(parts[:-1]):
+            if folder not in ("", ".", "..") and self.is_ignored_directory(folder, "/".join(parts[:index + 1])):
+                return True
+        return self.is_ignored_file(parts[-1], "/".join(parts))
@@ -0,0 +1,69 @@
+import os
+import re
+
+# Incremental saves are files that carry a version number before the extension,
+# e.g. asset_v001.blend, asset_v002.blend. The versions of a file are grouped by
+# folder, base name and extension, case insensitive, so the latest version of every
+# file can be found from a directory listing without opening the files.
+
+VERSION_PATTERN = re.compile(r"(.*)_v(\d+)(\.\w+)", re.IGNORECASE)
+
+
+def parse_version(file_name):
+    """Returns (base_name, version, extension) of an incremental save, None for other files"""
+    match = VERSION_PATTERN.fullmatch(file_name)
+    if not match:
+        return None
+    return match.group(1), int(match.group(2)), match.group(3)
+
+
+def get_version_key(path):
+    """Returns the (folder, base_name, extension) the versions of a file share, None for other files"""
+    directory, file_name = os.path.split(path)
+    parsed = parse_version(file_name)
+    if parsed is None:
+        return None
+    base_name, _, extension = parsed
+    return os.path.normcase(directory), base_name.lower(), extension.lower()
+
+
+class VersionIndex:
+    """The versions of incremental saves, grouped by folder, base name and extension"""
+
+    def __init__(self, paths=()):
+        # Version key mapped to {version: path}
+        self._versions = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        """Add a file, returns False if it is not an incremental save"""
+        key = get_version_key(path)
+        if key is None:
+            return False
+        version = parse_version(os.path.basename(path))[1]
+        # The first file wins if two names have the same number, e.g. _v1 and _v001
+        self._versions.setdefault(key, {}).setdefault(version, path)
+        return True
+
+    def get_versions(self, path):
+        """Returns the paths of all versions of a file sorted by version, empty for other files"""
+        versions = self._versions.get(get_version_key(path), {})
+        return [versions[version] for version in sorted(versions)]
+
+    def get_latest(self, path):
+        """Returns the path of the latest version of a file, the file itself if it is not an incremental save"""
+        versions = self._versions.get(get_version_key(path))
+        if not versions:
+            return path
+        return versions[max(versions)]
+
+    def is_outdated(self, path):
+        """True if a later version of this file exists"""
+        return self.get_latest(path) != path
+
+
+def get_latest_versions(paths):
+    """Returns the given paths without incremental saves that have a later version, in their original order"""
+    index = VersionIndex(paths)
+    return [path for path in paths if not index.is_outdated(path)]
@@ -1,7 +1,7 @@
 import anchorpoint as ap
 import apsync as aps
-import zipfile
 import rarfile
+import parallel_unzip
 import os
 
 
@@ -11,17 +11,19 @@ def unzip_file(file_path, output_dir, delete_after_unpacking):
 
     try:
         if file_path.endswith('.zip'):
-            with zipfile.ZipFile(file_path, 'r') as archive:
-                file_list = archive.namelist()
-                total_files = len(file_list)
-                for index, file in enumerate(file_list):
-                    if progress.canceled:
-                        print("Unzipping process was canceled.")
-                        progress.finish()
-                        return False
-                    archive.extract(file, output_dir)
-                    progress.set_text(f"Unzipping {file}")
-                    progress.report_progress((index + 1) / total_files)
+            def report(done_files, total_files, done_bytes, total_bytes):
+                progress.set_text(f"Unzipping {done_files} of {total_files} files")
+                progress.report_progress(
+                    done_bytes / total_bytes if total_bytes else done_files / total_files)
+
+            try:
+                parallel_unzip.extract_members(
+                    file_path, output_dir, progress_callback=report,
+                    is_canceled=lambda: progress.canceled)
+            except parallel_unzip.ExtractionCanceledException:
+                print("Unzipping process was canceled.")
+                progress.finish()
+                return False
         elif file_path.endswith('.rar'):
             with rarfile.RarFile(file_path, 'r') as archive:
                 file_list = archive.namelist()
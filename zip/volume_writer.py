@@ -0,0 +1,208 @@
+import concurrent.futures
+import os
+import re
+import threading
+import zipfile
+import archive_update
+
+# Writes files into one ZIP archive or into numbered volumes of limited size,
+# e.g. delivery_001.zip, delivery_002.zip. Every volume is a complete archive
+# that can be uploaded and extracted on its own, which is why files are never
+# split across volumes. A file larger than the volume size gets a volume of its
+# own. Volumes are written by several threads at the same time, each thread
+# fills one volume at a time. zlib releases the GIL while compressing, so this
+# scales with the number of cores.
+#
+# Archives are written to .part files and renamed once all of them are complete,
+# so a canceled or failed run never leaves a partial set behind. When an existing
+# archive is updated, unchanged entries are copied from it without compressing
+# them again, see archive_update.
+#
+# Every written archive carries the name of its set in the ZIP comment. Only
+# archives with that mark are removed when a set shrinks or changes between a
+# single archive and volumes, files like shot_010.zip that were not written for
+# the set are never touched.
+
+DEFAULT_VOLUME_WORKERS = min(4, os.cpu_count() or 1)
+# Space reserved per entry for its local header, central directory record and
+# incompressible data that deflate stores with a small overhead
+ENTRY_OVERHEAD = 256
+SET_COMMENT_PREFIX = "Anchorpoint ZIP set "
+
+
+class VolumeCanceledException(Exception):
+    pass
+
+
+def get_volume_path(output_path, index):
+    base, extension = os.path.splitext(output_path)
+    return f"{base}_{index:03d}{extension}"
+
+
+def get_set_comment(output_path):
+    """Returns the ZIP comment that marks the archives written for output_path"""
+    return f"{SET_COMMENT_PREFIX}{os.path.basename(output_path)}".encode("utf-8")
+
+
+def is_written_for(archive_path, output_path):
+    """True if the archive was written by this writer for output_path"""
+    try:
+        with zipfile.ZipFile(archive_path, "r") as archive:
+            return archive.comment == get_set_comment(output_path)
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def estimate_entry_size(file_path, arc_name):
+    size = os.path.getsize(file_path)
+    return size + size // 1000 + ENTRY_OVERHEAD + 2 * len(arc_name.encode("utf-8"))
+
+
+def remove_stale_volumes(output_path, volume_count):
+    """Delete volumes with higher numbers that were written for output_path by a previous run"""
+    directory = os.path.dirname(output_path) or "."
+    base, extension = os.path.splitext(os.path.basename(output_path))
+    pattern = re.compile(re.escape(base) + r"_(\d{3,})" + re.escape(extension), re.IGNORECASE)
+    for name in os.listdir(directory):
+        match = pattern.fullmatch(name)
+        path = os.path.join(directory, name)
+        if match and int(match.group(1)) > volume_count and is_written_for(path, output_path):
+            print(f"Removing outdated volume {name}")
+            os.remove(path)
+
+
+def write_volumes(files, output_path, volume_size=0, workers=None,
+                  progress_callback=None, is_canceled=None, update=False):
+    """
+    Write files into a ZIP archive or into volumes of limited size.
+
+    Args:
+        files (iterable): (file_path, arc_name) tuples, can be a generator
+        output_path (str): Path of the archive, volumes get a number appended
+        volume_size (int): Maximum size of a volume in bytes, 0 for a single archive
+        workers (int): Number of volumes that are written at the same time
+        progress_callback (callable): Called with the arc_name of every written file
+        is_canceled (callable): Returns True if writing should stop
+        update (bool): Reuse the compressed data of unchanged files from the
+            existing archive or volumes at output_path
+
+    Returns:
+        list: Paths of the written archives
+    """
+    if not volume_size:
+        workers = 1
+    workers = workers or DEFAULT_VOLUME_WORKERS
+
+    previous_entries = {}
+    if update:
+        # Volumes are only reused if they belong to this set
+        previous_entries = archive_update.read_entries([
+            path for path in archive_update.get_archive_paths(output_path, get_volume_path)
+            if path == output_path or is_written_for(path, output_path)])
+    reused = [0, 0]  # copied and compressed entries
+
+    iterator = iter(files)
+    lock = threading.Lock()
+    cancel_event = threading.Event()
+    next_index = [1]
+    # Volume number mapped to the .part path it is written to
+    part_paths = {}
+
+    def next_file():
+        with lock:
+            return next(iterator, None)
+
+    def check_canceled():
+        if cancel_event.is_set() or (is_canceled and is_canceled()):
+            cancel_event.set()
+            raise VolumeCanceledException()
+
+    def add_file(archive, sources, file_path, arc_name):
+        previous = previous_entries.get(arc_name.replace(os.sep, "/"))
+        if previous and archive_update.is_unchanged(previous[1], file_path, arc_name):
+            source_path, info = previous
+            if source_path not in sources:
+                sources[source_path] = open(source_path, "rb")
+            archive_update.copy_entry(archive, sources[source_path], info)
+            counter = 0
+        else:
+            archive.write(file_path, arc_name)
+            counter = 1
+        with lock:
+            reused[counter] += 1
+
+    def write():
+        # File handles of the existing archives, every thread reads through its own
+        sources = {}
+        try:
+            write_files(sources)
+        finally:
+            for source in sources.values():
+                source.close()
+
+    def write_files(sources):
+        item = next_file()
+        while item is not None:
+            with lock:
+                index = next_index[0]
+                next_index[0] += 1
+                volume_path = get_volume_path(output_path, index) if volume_size else output_path
+                part_path = f"{volume_path}.part"
+                part_paths[index] = part_path
+
+            volume_bytes = 0
+            with zipfile.ZipFile(part_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.comment = get_set_comment(output_path)
+                while item is not None:
+                    check_canceled()
+                    file_path, arc_name = item
+                    estimate = estimate_entry_size(file_path, arc_name) if volume_size else 0
+                    # The file that does not fit starts the next volume of this thread
+                    if volume_bytes and volume_bytes + estimate > volume_size:
+                        break
+                    add_file(archive, sources, file_path, arc_name)
+                    volume_bytes += estimate
+                    if progress_callback:
+                        progress_callback(arc_name)
+                    item = next_file()
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(write) for _ in range(workers)]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except BaseException:
+                cancel_event.set()
+                raise
+    except BaseException:
+        for part_path in part_paths.values():
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        raise
+
+    if not part_paths:
+        # Nothing to archive, still create an empty archive like zipfile would
+        empty_path = get_volume_path(output_path, 1) if volume_size else output_path
+        with zipfile.ZipFile(f"{empty_path}.part", "w") as archive:
+            archive.comment = get_set_comment(output_path)
+        part_paths[1] = f"{empty_path}.part"
+
+    if previous_entries:
+        print(f"Copied {reused[0]} unchanged files from the existing archive, compressed {reused[1]} files")
+
+    output_paths = []
+    for index in sorted(part_paths):
+        part_path = part_paths[index]
+        volume_path = part_path[:-len(".part")]
+        os.replace(part_path, volume_path)
+        output_paths.append(volume_path)
+    # Files of the other layout would be read as the previous archive of the next update
+    if volume_size:
+        remove_stale_volumes(output_path, len(output_paths))
+        if os.path.exists(output_path) and is_written_for(output_path, output_path):
+            print(f"Removing outdated archive {os.path.basename(output_path)}")
+            os.remove(output_path)
+    else:
+        remove_stale_volumes(output_path, 0)
+    return output_paths
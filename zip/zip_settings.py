@@ -10,6 +10,9 @@ def store_settings(dialog, _):
     settings.set("archive_name", dialog.get_value("archive_name"))
     settings.set("exclude_incremental_saves",
                  dialog.get_value("exclude_incremental_saves"))
+    settings.set("volume_size_gb", dialog.get_value("volume_size_gb"))
+    settings.set("archive_per_folder", dialog.get_value("archive_per_folder"))
+    settings.set("update_existing_archive", dialog.get_value("update_existing_archive"))
     settings.store()
 
 def button_clicked(dialog):
@@ -25,6 +28,9 @@ def main():
         ctx.selected_files, ctx.selected_folders)
     exclude_incremental_saves = settings.get(
         "exclude_incremental_saves", False)
+    volume_size_gb = settings.get("volume_size_gb", "0")
+    archive_per_folder = settings.get("archive_per_folder", False)
+    update_existing_archive = settings.get("update_existing_archive", False)
 
     dialog = ap.Dialog()
     if ctx.icon:
@@ -34,12 +40,24 @@ def main():
         ignore_extensions, placeholder="txt", var="ignore_extensions", callback=store_settings)
     dialog.add_text("Ignore Folders \t").add_tag_input(
         ignore_folders, placeholder="temp", var="ignore_folders", callback=store_settings)
+    dialog.add_info(
+        "Folders are matched by their full name. Use wildcards for patterns, <br>e.g. *_backup, or a slash to match a path, e.g. renders/*.exr")
     dialog.add_text("Archive Name \t").add_input(
         archive_name, var="archive_name", callback=store_settings, width=300, placeholder="archive")
     dialog.add_switch(
         text="Exclude old incremental saves", var="exclude_incremental_saves", default=exclude_incremental_saves, callback=store_settings)
     dialog.add_info(
         "Adds only the latest version, e.g. asset_v023.blend, to the archive and <br>ignores incremental saves below it")
+    dialog.add_text("Volume Size (GB) \t").add_input(
+        str(volume_size_gb), var="volume_size_gb", callback=store_settings, width=80, placeholder="0")
+    dialog.add_info(
+        "Splits large archives into independent volumes, e.g. archive_001.zip, that can be <br>uploaded and extracted on their own. Use 0 for a single archive")
+    dialog.add_switch(
+        text="One archive per selected folder", var="archive_per_folder", default=archive_per_folder, callback=store_settings)
+    dialog.add_switch(
+        text="Update existing archive", var="update_existing_archive", default=update_existing_archive, callback=store_settings)
+    dialog.add_info(
+        "Copies unchanged files from an existing archive with the same name <br>and only compresses new and modified files")
     dialog.add_button("Zip", callback=button_clicked)
     dialog.show()
 